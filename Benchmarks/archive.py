@@ -0,0 +1,63 @@
+"""
+Archive Benchmark
+
+Stores synthetic maps as separate XML files and in one archive of DataInterfaces.MapArchive, then compares
+loading every map, loading one object type of every map, and random access to single maps. Every map read from
+the archive is checked against its XML file.
+
+Usage:
+    python -m Benchmarks.archive [map_count] [objects_per_map]
+"""
+from asyncio import run
+from os import path
+from random import Random
+from sys import argv
+from tempfile import TemporaryDirectory
+
+from Benchmarks.serialization import build_map, measure
+from DataInterfaces.MapIO import MapIO
+from DataInterfaces.MapObjects import Box
+
+
+async def load_xml_files(file_locations: list) -> list:
+    return [await MapIO.load_map_from_file_async(file_location) for file_location in file_locations]
+
+
+def main(map_count: int = 500, objects_per_map: int = 1000):
+    with TemporaryDirectory() as directory:
+        file_locations = []
+        maps = {}
+        for map_id in range(map_count):
+            map_instance = maps[map_id] = build_map(objects_per_map, seed=map_id)
+            file_locations.append(path.join(directory, f"{map_id}.xml"))
+            with open(file_locations[-1], "w") as f:
+                f.write(map_instance.to_xml_string())
+        archive_location = path.join(directory, "maps.pb2a")
+        MapIO.save_archive(maps, archive_location)
+        del maps
+
+        with MapIO.open_archive(archive_location) as archive:
+            for map_id, file_location in zip(archive, file_locations):
+                with open(file_location) as f:
+                    expected = f.read()
+                if archive.load(map_id).to_xml_string() != expected:
+                    raise AssertionError(f"Map {map_id} differs between the archive and its XML file.")
+
+            picks = Random(0).choices(list(archive), k=100)
+            xml_all = measure(lambda: run(load_xml_files(file_locations)), repeat=1)
+            archive_all = measure(lambda: list(archive.iter_maps()))
+            archive_boxes = measure(lambda: list(archive.iter_maps(types=(Box,))))
+            index_boxes = measure(lambda: archive.total_counts()[Box])
+            random_access = measure(lambda: [archive.load(map_id) for map_id in picks])
+            xml_size = sum(path.getsize(file_location) for file_location in file_locations)
+            print(f"maps: {map_count} x {objects_per_map} objects")
+            print(f"size:             xml files {xml_size / 2 ** 20:8.1f} MiB, "
+                  f"archive {path.getsize(archive_location) / 2 ** 20:8.1f} MiB")
+            print(f"load all:         xml files {xml_all * 1000:8.1f} ms,  archive {archive_all * 1000:8.1f} ms")
+            print(f"load boxes only:                          archive {archive_boxes * 1000:8.1f} ms")
+            print(f"count boxes:                              index   {index_boxes * 1000:8.3f} ms")
+            print(f"100 random maps:                          archive {random_access * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in argv[1:3]))
@@ -0,0 +1,61 @@
+"""
+Batch Conversion Benchmark
+
+Writes a directory of synthetic XML maps and converts it with DataInterfaces.MapBatch, first on one worker
+process and then on every core, and reports the speed-up. The output of both runs is checked to be identical.
+
+Usage:
+    python -m Benchmarks.batch [map_count] [objects_per_map] [workers]
+"""
+from os import cpu_count, makedirs, path
+from sys import argv
+from tempfile import TemporaryDirectory
+from time import perf_counter
+
+from Benchmarks.serialization import build_map
+from DataInterfaces.MapBatch import BatchSummary, convert_directory, find_map_files
+
+
+def timed_run(input_directory: str, output_directory: str, workers: int) -> float:
+    summary = BatchSummary()
+    start = perf_counter()
+    for result in convert_directory(input_directory, output_directory, workers=workers,
+                                    transform={"translate": (100, -50)}):
+        summary.add(result)
+    elapsed = perf_counter() - start
+    if summary.failed:
+        raise AssertionError(summary.report())
+    return elapsed
+
+
+def read(file_location: str) -> str:
+    with open(file_location) as f:
+        return f.read()
+
+
+def main(map_count: int = 64, objects_per_map: int = 5000, workers: int = None):
+    workers = workers or cpu_count() or 1
+    with TemporaryDirectory() as directory:
+        input_directory = path.join(directory, "in")
+        for map_id in range(map_count):
+            map_directory = path.join(input_directory, str(map_id % 4))
+            makedirs(map_directory, exist_ok=True)
+            with open(path.join(map_directory, f"{map_id}.xml"), "w") as f:
+                f.write(build_map(objects_per_map, seed=map_id).to_xml_string())
+
+        serial = timed_run(input_directory, path.join(directory, "serial"), 1)
+        parallel = timed_run(input_directory, path.join(directory, "parallel"), workers)
+        serial_directory = path.join(directory, "serial")
+        for file_location in find_map_files(serial_directory):
+            relative = path.relpath(file_location, serial_directory)
+            if read(file_location) != read(path.join(directory, "parallel", relative)):
+                raise AssertionError(f"{relative} differs between the serial and the parallel run.")
+
+        print(f"maps: {map_count} x {objects_per_map} objects")
+        print(f"1 worker:   {serial:8.2f} s, {map_count / serial:7.1f} maps/s")
+        print(f"{workers} workers: {parallel:8.2f} s, {map_count / parallel:7.1f} maps/s")
+        print(f"speed-up:   {serial / parallel:8.2f}x")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in argv[1:4]))
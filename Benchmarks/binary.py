@@ -0,0 +1,68 @@
+"""
+Binary Format Benchmark
+
+Saves a synthetic map in the binary format of DataInterfaces.MapBinary and in XML, checks that the map loaded
+from the binary form dumps to the same XML, and compares load times and sizes. Values the XML loader never
+produces (floats, None, big integers, mixed columns, escaped text) are added to exercise every column kind.
+
+Usage:
+    python -m Benchmarks.binary [object_count]
+"""
+from sys import argv
+
+from Benchmarks.serialization import build_map, measure
+from DataInterfaces.Map import Map
+from DataInterfaces.MapBinary import from_binary, read_directory, to_binary
+from DataInterfaces.MapObjects import Box, Decor, Lamp, Timer, Trigger
+
+
+def add_edge_cases(map_instance: Map):
+    map_instance.add_object(Box(x=0.5, y=-2 ** 70, w=10, h=1e300, m=None))
+    map_instance.add_object(Decor(uid="#décor ünïcode", x=1, y=2, model="stone", attach="#door9"))
+    map_instance.add_object(Lamp(uid="#lamp", x=3, y=4, power=0.4, flare=True))
+    map_instance.add_object(Timer(uid="#timer", enabled=True, target="#trigger", delay=30, maxcalls=-1))
+    trigger = map_instance.add_object(Trigger(uid="#long", maxcalls=2))
+    for i in range(9):
+        trigger.add_action(100, [f"v{i}", str(i)])
+    trigger.add_action(42, ["a \"quoted\" <text> & more", "#FF0000"])
+
+
+def check(map_instance: Map, data: bytes):
+    expected = map_instance.to_xml_string()
+    loaded = from_binary(data)
+    if loaded.to_xml_string() != expected:
+        raise AssertionError("The map loaded from its binary form dumps to different XML.")
+    if to_binary(loaded) != data:
+        raise AssertionError("Saving a loaded binary map gives different bytes.")
+    for obj_type, items in map_instance.objects.items():
+        if len(loaded.objects[obj_type]) != len(items):
+            raise AssertionError(f"Wrong number of {obj_type.__name__} objects.")
+    counts = {obj_type: rows for obj_type, (rows, _, _) in read_directory(data).items()}
+    if counts != {obj_type: len(items) for obj_type, items in map_instance.objects.items() if items}:
+        raise AssertionError("The section directory does not match the map.")
+    if from_binary(data, types=(Trigger,)).find_trigger_by_name("#long").actions[9].args[0] != \
+            'a "quoted" <text> & more':
+        raise AssertionError("Loading only triggers gives wrong actions.")
+
+
+def main(object_count: int = 100_000):
+    map_instance = build_map(object_count)
+    add_edge_cases(map_instance)
+    data = to_binary(map_instance)
+    check(map_instance, data)
+
+    xml = map_instance.to_xml_string()
+    wrapped = f"<root>{xml}</root>"
+    xml_load = measure(lambda: Map().from_xml(wrapped))
+    binary_load = measure(lambda: from_binary(data))
+    xml_dump = measure(map_instance.to_xml_string)
+    binary_dump = measure(lambda: to_binary(map_instance))
+    print(f"objects: {object_count}")
+    print(f"size:  xml {len(xml.encode()) / 1024:9.1f} KiB, binary {len(data) / 1024:9.1f} KiB")
+    print(f"load:  xml {xml_load * 1000:9.1f} ms,  binary {binary_load * 1000:9.1f} ms  "
+          f"({xml_load / binary_load:.1f}x)")
+    print(f"dump:  xml {xml_dump * 1000:9.1f} ms,  binary {binary_dump * 1000:9.1f} ms")
+
+
+if __name__ == "__main__":
+    main(int(argv[1]) if len(argv) > 1 else 100_000)
@@ -0,0 +1,80 @@
+"""
+Columnar Storage Benchmark
+
+Loads the same XML, whose Box, Bg and Decor fields mix ints, integral floats (10.0) and other floats (10.5), into
+a map keeping objects in lists and into a map keeping them in column stores. Checks that both maps have no
+differences and dump the XML they were loaded from, also after rows are removed and the stores compacted, then
+compares the memory taken by both maps and the time to dump them.
+
+Usage:
+    python -m Benchmarks.columnar [object_count]
+"""
+from random import Random
+from re import compile as compile_regex
+from sys import argv
+from tracemalloc import start, stop, take_snapshot
+
+from Benchmarks.generator import generate_map
+from Benchmarks.serialization import measure
+from DataInterfaces.ColumnStore import COLUMNAR_TYPES
+from DataInterfaces.Map import Map
+from DataInterfaces.MapObjects import Box, Bg, Decor
+
+NUMBER_ATTRIBUTE = compile_regex(r' (x|y|w|h|u|v|r|sx|sy)="(-?\d+)"')
+
+
+def float_map_xml(object_count: int, seed: int = 0) -> str:
+    # Turns a third of the numbers into integral floats and a third into other floats
+    rng = Random(seed)
+    suffixes = ("", ".0", ".5")
+    xml = generate_map({Box: object_count, Bg: object_count, Decor: object_count}, seed=seed).to_xml_string()
+    return NUMBER_ATTRIBUTE.sub(lambda match: f' {match[1]}="{match[2]}{rng.choice(suffixes)}"', xml)
+
+
+def load(xml: str, columnar_types: tuple = ()) -> Map:
+    map_instance = Map(columnar_types=columnar_types)
+    map_instance.from_xml(f"<root>{xml}</root>")
+    return map_instance
+
+
+def check_round_trip(listed: Map, columnar: Map):
+    if listed.diff(columnar):
+        raise AssertionError(f"Columnar map differs from the listed one: {listed.diff(columnar).summary()}")
+    if listed.to_xml_string() != columnar.to_xml_string():
+        raise AssertionError("Columnar map dumps a different XML.")
+
+
+def allocated_bytes(factory) -> tuple:
+    start()
+    before = take_snapshot()
+    result = factory()
+    after = take_snapshot()
+    stop()
+    return result, sum(stat.size_diff for stat in after.compare_to(before, "filename"))
+
+
+def main(object_count: int = 50_000):
+    xml = float_map_xml(object_count)
+    listed, listed_size = allocated_bytes(lambda: load(xml))
+    columnar, columnar_size = allocated_bytes(lambda: load(xml, COLUMNAR_TYPES))
+    if listed.to_xml_string() != xml:
+        raise AssertionError("Listed map does not dump the XML it was loaded from.")
+    check_round_trip(listed, columnar)
+
+    for map_instance in (listed, columnar):
+        for obj_type in COLUMNAR_TYPES:
+            for obj in list(map_instance.objects[obj_type])[::3]:
+                map_instance.remove_object(obj)
+    check_round_trip(listed, columnar)
+    for store in (columnar.objects[obj_type] for obj_type in COLUMNAR_TYPES):
+        store.compact()
+    check_round_trip(listed, columnar)
+
+    print(f"objects: {object_count * len(COLUMNAR_TYPES)}")
+    print(f"memory:   lists {listed_size / 2 ** 20:8.2f} MB, columns {columnar_size / 2 ** 20:8.2f} MB")
+    print(f"dump:     lists {measure(listed.to_xml_string) * 1000:8.1f} ms, "
+          f"columns {measure(columnar.to_xml_string) * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main(int(argv[1]) if len(argv) > 1 else 50_000)
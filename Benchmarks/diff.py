@@ -0,0 +1,64 @@
+"""
+Map Diff Benchmark
+
+Edits a copy of a synthetic map, then times Map.diff and Map.apply_patch at two scales to show that both grow
+linearly, and compares the size of the serialized patch with the size of the whole map. The patched map is
+checked to have no differences left with the edited one.
+
+Usage:
+    python -m Benchmarks.diff [object_count] [edits]
+"""
+from random import Random
+from sys import argv
+
+from Benchmarks.generator import generate_map
+from Benchmarks.serialization import measure
+from DataInterfaces.Map import Map
+from DataInterfaces.MapDiff import MapDiff
+from DataInterfaces.MapObjects import Box, Decor, Door, Enemy, Trigger
+
+
+def copy_map(map_instance: Map) -> Map:
+    copy = Map()
+    copy.from_binary(map_instance.to_binary())
+    return copy
+
+
+def edit(map_instance: Map, edits: int, seed: int = 0):
+    rng = Random(seed)
+    for _ in range(edits):
+        boxes = map_instance.objects[Box]
+        map_instance.remove_object(boxes[rng.randrange(len(boxes))])
+        map_instance.add_object(Box(x=rng.randrange(1000), y=rng.randrange(1000), w=50, h=50))
+        map_instance.objects[Door][rng.randrange(len(map_instance.objects[Door]))].vis = False
+        decor = map_instance.objects[Decor][rng.randrange(len(map_instance.objects[Decor]))]
+        decor.x += 10
+        map_instance.objects[Enemy][rng.randrange(len(map_instance.objects[Enemy]))].hea = 1
+    map_instance.objects[Trigger][0].add_action(100, ["edited", "1"])
+
+
+def run(object_count: int, edits: int) -> tuple:
+    old = generate_map(object_count // 18)
+    new = copy_map(old)
+    edit(new, edits)
+    patch = old.diff(new)
+    patched = copy_map(old)
+    patched.apply_patch(MapDiff.from_bytes(patch.to_bytes()))
+    if patched.diff(new):
+        raise AssertionError(f"Patched map still differs: {patched.diff(new).summary()}")
+
+    diff_time = measure(lambda: old.diff(new))
+    targets = [copy_map(old) for _ in range(3)]
+    apply_time = measure(lambda: targets.pop().apply_patch(patch))
+    return diff_time, apply_time, len(patch.to_bytes()), len(old.to_binary()), len(old.to_xml_string())
+
+
+def main(object_count: int = 50000, edits: int = 100):
+    for count in (object_count, object_count * 2):
+        diff_time, apply_time, patch_size, binary_size, xml_size = run(count, edits)
+        print(f"{count:8d} objects: diff {diff_time * 1000:8.1f} ms, apply {apply_time * 1000:7.1f} ms, "
+              f"patch {patch_size:7d} B (binary map {binary_size} B, XML {xml_size} B)")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in argv[1:3]))
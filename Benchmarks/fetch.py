@@ -0,0 +1,136 @@
+"""
+Fetch Benchmark
+
+Runs a local stand-in for the rq=cmap endpoint of server.php and downloads maps from it one by one with
+getMapByIdOnline-style blocking requests, then with the thread pool and asyncio backends of Utils.fetch.
+The stand-in answers with qpacked synthetic maps after a fixed latency and fails the first request for every
+fifth map with HTTP 503, so retries are exercised. Every downloaded map is checked against the expected payload
+and the number of requests sent for it, and both backends are checked to give up on a 404 at once and on a 503
+once their retries are spent. aiohttp is imported before the timings, its one-time import is not counted.
+
+Usage:
+    python -m Benchmarks.fetch [map_count] [concurrency] [latency_ms]
+"""
+from asyncio import run
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from importlib import import_module
+from sys import argv
+from threading import Lock, Thread
+from time import perf_counter, sleep
+from urllib.parse import parse_qs
+
+from Benchmarks.serialization import build_map
+from Utils.fetch import fetch_map_blocking, fetch_maps_async, fetch_maps_threaded, make_session
+from Utils.mapTools import MapTools
+
+
+class StandInServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # With the default backlog of 5, connections opened together beyond it have their SYN dropped and wait for
+    # the 1 s retransmit, which made the asyncio backend look no faster than serial downloads
+    request_queue_size = 128
+
+    def __init__(self, payloads: dict, latency: float):
+        super().__init__(("127.0.0.1", 0), StandInHandler)
+        self.payloads = payloads
+        self.latency = latency
+        self.failed_once = set()
+        self.lock = Lock()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_port}/pb2/server.php"
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        form = parse_qs(self.rfile.read(int(self.headers["Content-Length"])).decode())
+        sleep(self.server.latency)
+        if form.get("rq") != ["cmap"] or form.get("qpack") != ["1.0"]:
+            return self.reply(400, "")
+        mapid = int(form["cmap"][0])
+        payload = self.server.payloads.get(mapid)
+        if payload is None:
+            return self.reply(404, "")
+        with self.server.lock:
+            fail = mapid % 5 == 0 and mapid not in self.server.failed_once
+            self.server.failed_once.add(mapid)
+        if fail:
+            return self.reply(503, "")
+        self.reply(200, payload)
+
+    def reply(self, status: int, text: str):
+        body = text.encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "text/plain")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def check(results, payloads: dict, label: str, elapsed: float):
+    results = {result.mapid: result for result in results}
+    if set(results) != set(payloads):
+        raise AssertionError(f"{label}: missing maps.")
+    for mapid, result in results.items():
+        if result.payload != payloads[mapid]:
+            raise AssertionError(f"{label}: wrong payload for map {mapid} ({result.error}).")
+        if result.attempts != (2 if mapid % 5 == 0 else 1):
+            raise AssertionError(f"{label}: {result.attempts} requests sent for map {mapid}.")
+    retried = sum(result.attempts > 1 for result in results.values())
+    print(f"{label:>16}: {elapsed * 1000:8.1f} ms, {len(results) / elapsed:7.1f} maps/s, {retried} retried")
+
+
+async def collect_async(ids, concurrency: int, url: str, retries: int = 3) -> list:
+    return [result async for result in fetch_maps_async(ids, concurrency, url=url, retries=retries, backoff=0.01)]
+
+
+def check_failures(server: StandInServer, fetch, label: str):
+    # fetch(ids, retries) -> results
+    missing = fetch([-1], 3)[0]
+    if missing.payload is not None or missing.attempts != 1:
+        raise AssertionError(f"{label}: a 404 must fail without retrying.")
+    server.failed_once.clear()
+    unavailable = fetch([5], 0)[0]
+    if unavailable.payload is not None or unavailable.attempts != 1 or unavailable.error != "HTTP 503":
+        raise AssertionError(f"{label}: a 503 must fail once the retries are spent, got {unavailable!r}.")
+
+
+def main(map_count: int = 200, concurrency: int = 16, latency_ms: int = 20):
+    tools = MapTools()
+    payloads = {mapid: tools.qpack(build_map(50, seed=mapid).to_xml_string()) for mapid in range(1, map_count + 1)}
+    server = StandInServer(payloads, latency_ms / 1000)
+    Thread(target=server.serve_forever, daemon=True).start()
+    ids = list(payloads)
+    import_module("aiohttp")
+    try:
+        session = make_session(1)
+        start = perf_counter()
+        serial = [fetch_map_blocking(session, mapid, server.url, backoff=0.01) for mapid in ids]
+        check(serial, payloads, "serial", perf_counter() - start)
+
+        server.failed_once.clear()
+        start = perf_counter()
+        threaded = list(fetch_maps_threaded(ids, concurrency, url=server.url, backoff=0.01))
+        check(threaded, payloads, "thread pool", perf_counter() - start)
+
+        server.failed_once.clear()
+        start = perf_counter()
+        check(run(collect_async(ids, concurrency, server.url)), payloads, "asyncio", perf_counter() - start)
+
+        check_failures(server, lambda ids, retries: list(fetch_maps_threaded(ids, url=server.url, retries=retries)),
+                       "thread pool")
+        check_failures(server, lambda ids, retries: run(collect_async(ids, 1, server.url, retries)), "asyncio")
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in argv[1:4]))
@@ -0,0 +1,149 @@
+"""
+Synthetic Map Generator
+
+Builds deterministic maps of any size with every object type of a Map. Values look like the ones of real maps
+and like what Map.from_xml produces (integers where the XML holds integers, strings for colors, models and
+trigger arguments), named objects get unique uids, and regions, timers, characters and songs refer to triggers
+of the same map when the map has any.
+
+Functions:
+    generate_map(counts, seed, columnar_types) -> Map:
+        A map with the given number of objects of every type, the same for the same arguments.
+
+    generate_objects(obj_type, count, seed, trigger_uids) -> list:
+        Objects of one type.
+
+Usage Example:
+    from Benchmarks.generator import generate_map
+    from DataInterfaces.MapObjects import Box, Trigger
+
+    map_instance = generate_map({Box: 100_000, Trigger: 1000})
+    every_type = generate_map(1000)
+"""
+from random import Random
+
+from DataInterfaces.Entity import TriggersActionEntity
+from DataInterfaces.Map import Map
+from DataInterfaces.MapObjects import Door, Region, Timer, Vehicle, Box, Water, Decor, Song, Lamp, Barrel, Gun, \
+    Pushf, Bg, Enemy, Player, Inf, Trigger, Image
+
+GENERATED_TYPES = (Player, Pushf, Image, Bg, Water, Box, Door, Decor, Gun, Region, Trigger, Timer, Inf, Vehicle,
+                   Song, Lamp, Barrel, Enemy)
+
+WORLD_SIZE = 20000
+DECOR_MODELS = ("stone", "bush", "lamp_post", "crate", "pipe", "sign_exit")
+GUN_MODELS = ("gun_rifle", "gun_pistol", "gun_shotgun", "gun_rocket_launcher")
+BARREL_MODELS = ("bar_orange", "bar_red", "bar_blue")
+VEHICLE_MODELS = ("veh_jeep", "veh_walker", "veh_drone")
+COLORS = ("#FFFFFF", "#808080", "#FF0000", "#00FF00", "#0000FF", "")
+ENGINE_MARKS = ("sky", "shadowmap_size", "casual", "nobase", "meth", "marine_weapons")
+# opID -> argument makers of common trigger actions
+TRIGGER_ACTIONS = (
+    (100, lambda rng, i: [f"var{rng.randrange(50)}", str(rng.randrange(1000))]),
+    (102, lambda rng, i: [f"var{rng.randrange(50)}", str(rng.randrange(10))]),
+    (116, lambda rng, i: [f"var{rng.randrange(50)}", str(rng.randrange(5))]),
+    (123, lambda rng, i: [f"var{rng.randrange(50)}", str(rng.randrange(5))]),
+    (42, lambda rng, i: [f"Wave {i} cleared, {rng.randrange(100)} points", "#FFFF00"]),
+    (25, lambda rng, i: [f"#timer{rng.randrange(max(i, 1))}"]),
+    (0, lambda rng, i: [f"#door{rng.randrange(max(i, 1))}", f"#region{rng.randrange(max(i, 1))}"]),
+    (-1, lambda rng, i: []),
+)
+
+
+def coordinate(rng: Random) -> int:
+    return rng.randrange(-WORLD_SIZE, WORLD_SIZE)
+
+
+def reference(rng: Random, uids: list, chance: float = 0.5):
+    # A uid of uids, None (dumped as -1) otherwise
+    return uids[rng.randrange(len(uids))] if uids and rng.random() < chance else None
+
+
+def make_trigger(rng: Random, i: int) -> Trigger:
+    trigger = Trigger(uid=f"#trigger{i}", x=coordinate(rng), y=coordinate(rng), enabled=rng.random() < 0.7,
+                      maxcalls=rng.choice((1, 1, 10, -1)))
+    for _ in range(rng.randint(1, 10)):
+        op_id, make_args = TRIGGER_ACTIONS[rng.randrange(len(TRIGGER_ACTIONS))]
+        trigger.actions.append(TriggersActionEntity(op_id, make_args(rng, i)))
+    if trigger.actions[-1].opID == 123:
+        trigger.actions[-1] = TriggersActionEntity(-1, [])
+    return trigger
+
+
+def make_character(obj_type, rng: Random, i: int, trigger_uids: list):
+    health = rng.choice((100, 130, 200, 1000))
+    return obj_type(uid=f"#{obj_type.__name__.lower()}{i}", x=coordinate(rng), y=coordinate(rng), tox=0, toy=0,
+                    hea=health, hmax=health, team=rng.randrange(4), side=rng.choice((-1, 1)),
+                    char=rng.randrange(-1, 140), incar=None, botaction=rng.randrange(5),
+                    ondeath=reference(rng, trigger_uids, 0.2))
+
+
+def make_object(obj_type, rng: Random, i: int, trigger_uids: list):
+    x, y = coordinate(rng), coordinate(rng)
+    if obj_type is Box:
+        return Box(x=x, y=y, w=rng.randrange(10, 1000), h=rng.randrange(10, 1000), m=rng.randrange(12))
+    if obj_type is Bg:
+        return Bg(x=x, y=y, w=rng.randrange(10, 2000), h=rng.randrange(10, 2000), texX=rng.randrange(-50, 50),
+                  texY=rng.randrange(-50, 50), f=rng.randrange(3), s=rng.random() < 0.5, c=rng.choice(COLORS),
+                  m=str(rng.randrange(30)))
+    if obj_type is Decor:
+        return Decor(uid=f"#decor{i}", x=x, y=y, model=rng.choice(DECOR_MODELS), f=rng.randrange(3),
+                     u=rng.randrange(-20, 20), v=rng.randrange(-20, 20), r=rng.choice((0, 0, 90, 180, 45.5)),
+                     sx=rng.choice((1, 1, -1, 0.5)), sy=1)
+    if obj_type is Water:
+        return Water(x=x, y=y, w=rng.randrange(100, 2000), h=rng.randrange(100, 1000), damage=rng.randrange(3),
+                     friction=rng.random() < 0.5)
+    if obj_type is Door:
+        return Door(uid=f"#door{i}", x=x, y=y, w=rng.randrange(10, 300), h=rng.randrange(10, 300),
+                    maxspeed=rng.randrange(1, 20), tarx=x, tary=y - rng.randrange(500), vis=rng.random() < 0.9,
+                    moving=rng.random() < 0.2)
+    if obj_type is Region:
+        return Region(uid=f"#region{i}", x=x, y=y, w=rng.randrange(10, 500), h=rng.randrange(10, 500),
+                      use_target=reference(rng, trigger_uids, 0.8), use_on=rng.randrange(8))
+    if obj_type is Trigger:
+        return make_trigger(rng, i)
+    if obj_type is Timer:
+        return Timer(uid=f"#timer{i}", x=x, y=y, enabled=rng.random() < 0.5, target=reference(rng, trigger_uids, 0.9),
+                     delay=rng.choice((1, 30, 300)), maxcalls=rng.choice((1, 10, -1)))
+    if obj_type in (Player, Enemy):
+        return make_character(obj_type, rng, i, trigger_uids)
+    if obj_type is Pushf:
+        return Pushf(uid=f"#pushf{i}", x=x, y=y, w=rng.randrange(10, 300), h=rng.randrange(10, 300),
+                     tox=rng.randrange(-10, 10), toy=rng.randrange(-10, 10), stab=rng.randrange(2),
+                     damage=rng.randrange(100), attach="-1")
+    if obj_type is Image:
+        return Image(width=rng.randrange(16, 1024), height=rng.randrange(16, 1024), id=i)
+    if obj_type is Gun:
+        return Gun(uid=f"#gun{i}", x=x, y=y, model=rng.choice(GUN_MODELS), command=rng.randrange(3),
+                   upg=rng.randrange(4))
+    if obj_type is Inf:
+        return Inf(x=x, y=y, mark=rng.choice(ENGINE_MARKS), forteam=str(rng.randrange(-1, 2)))
+    if obj_type is Vehicle:
+        return Vehicle(uid=f"#vehicle{i}", x=x, y=y, side=rng.choice((-1, 1)), hpPercent=100,
+                       model=rng.choice(VEHICLE_MODELS))
+    if obj_type is Song:
+        return Song(uid=f"#song{i}", x=x, y=y, url=f"songs/track{rng.randrange(20)}.mp3", volume=1, loop="true",
+                    callback=reference(rng, trigger_uids, 0.1))
+    if obj_type is Lamp:
+        return Lamp(uid=f"#lamp{i}", x=x, y=y, power=rng.choice((0.2, 0.4, 1)), flare=rng.choice(("true", "false")))
+    if obj_type is Barrel:
+        return Barrel(uid=f"#barrel{i}", x=x, y=y, model=rng.choice(BARREL_MODELS), tox=0, toy=0)
+    raise ValueError(f"No generator for {obj_type.__name__}.")
+
+
+def generate_objects(obj_type, count: int, seed: int = 0, trigger_uids: list = ()) -> list:
+    # Every type has its own random stream, so the objects of a type do not depend on the other counts
+    rng = Random(f"{seed}:{obj_type.__name__}")
+    trigger_uids = list(trigger_uids)
+    return [make_object(obj_type, rng, i, trigger_uids) for i in range(count)]
+
+
+def generate_map(counts, seed: int = 0, columnar_types: tuple = ()) -> Map:
+    if isinstance(counts, int):
+        counts = dict.fromkeys(GENERATED_TYPES, counts)
+    map_instance = Map(columnar_types=columnar_types)
+    trigger_uids = [f"#trigger{i}" for i in range(counts.get(Trigger, 0))]
+    for obj_type in GENERATED_TYPES:
+        for obj in generate_objects(obj_type, counts.get(obj_type, 0), seed, trigger_uids):
+            map_instance.add_object(obj)
+    return map_instance
@@ -0,0 +1,63 @@
+"""
+get_objects Benchmark
+
+Compares the legacy MapTools.get_objects tokenizer (chained replace/split calls and a try/except int() per value)
+with tokenize_objects on the decoded XML of a synthetic map (mostly numeric values) and of
+trigger-heavy data (mostly text values), and checks that both return the same element dicts.
+
+Usage:
+    python -m Benchmarks.get_objects [object_count]
+"""
+from sys import argv
+
+from Benchmarks.serialization import build_map, measure
+from Utils.mapTools import tokenize_objects
+
+
+def legacy_get_objects(unpacked: str) -> list:
+    elements = []
+    for x in unpacked.replace(' />', '').replace('[eq]', '=').split('<')[1:]:
+        el = {'type': x.split()[0]}
+        for y in x.split()[1:]:
+            try:
+                kv = y.split('=')
+                v = kv[1].strip('"')
+            except Exception:
+                continue
+            try:
+                v = int(v)
+            except Exception:
+                pass
+            el[kv[0]] = v
+        elements.append(el)
+    return elements
+
+
+def build_triggers(trigger_count: int) -> str:
+    parts = []
+    for i in range(trigger_count):
+        actions = ' '.join(f'actions_{j}_type="{j * 7}" actions_{j}_targetA="#door{i + j}" actions_{j}_targetB="0"'
+                           for j in range(1, 11))
+        parts.append(f'<trigger uid="#trigger{i}" x="{i}" y="0" enabled="true" maxcalls="1" {actions} />')
+    return ''.join(parts)
+
+
+def compare(label: str, unpacked: str):
+    if legacy_get_objects(unpacked) != tokenize_objects(unpacked):
+        raise AssertionError("Tokenizer output differs from the legacy tokenizer.")
+
+    legacy = measure(lambda: legacy_get_objects(unpacked))
+    tokenizer = measure(lambda: tokenize_objects(unpacked))
+    print(f"{label}: {len(unpacked)} characters")
+    print(f"  legacy replace/split: {legacy * 1000:8.1f} ms")
+    print(f"  tokenizer:            {tokenizer * 1000:8.1f} ms")
+    print(f"  speed-up:             {legacy / tokenizer:8.2f}x")
+
+
+def main(object_count: int = 100_000):
+    compare(f"map, {object_count} objects", build_map(object_count).to_xml_string())
+    compare(f"triggers, {object_count // 10} triggers", build_triggers(object_count // 10))
+
+
+if __name__ == "__main__":
+    main(int(argv[1]) if len(argv) > 1 else 100_000)
@@ -0,0 +1,57 @@
+"""
+Instrumentation Benchmark
+
+Times loading and dumping a synthetic map with DataInterfaces.Instrumentation disabled and with a Recorder
+registered, and the cost of one disabled span and counter call. Prints the report of the instrumented runs.
+
+Usage:
+    python -m Benchmarks.instrumentation [object_count]
+"""
+from sys import argv
+from time import perf_counter
+
+from Benchmarks.serialization import build_map, measure
+from DataInterfaces import Instrumentation
+from DataInterfaces.Instrumentation import Recorder, instrumented
+from DataInterfaces.Map import Map
+
+CALLS = 1_000_000
+
+
+def disabled_call_cost() -> float:
+    # Seconds per span() plus count() call while no hook is registered
+    span, count = Instrumentation.span, Instrumentation.count
+    start = perf_counter()
+    for _ in range(CALLS):
+        with span("benchmark", type="Box"):
+            pass
+        count("benchmark", 1, type="Box")
+    return (perf_counter() - start) / CALLS
+
+
+def main(object_count: int = 50000):
+    map_instance = build_map(object_count)
+    xml = f"<root>{map_instance.to_xml_string()}</root>"
+
+    def load():
+        Map().from_xml(xml)
+
+    plain_load = measure(load)
+    plain_dump = measure(map_instance.to_xml_string)
+    recorder = Recorder()
+    with instrumented(recorder):
+        traced_load = measure(load)
+        traced_dump = measure(map_instance.to_xml_string)
+        if map_instance.to_xml_string() != xml[len("<root>"):-len("</root>")]:
+            raise AssertionError("Instrumented dump differs from the plain dump.")
+
+    print(f"objects: {object_count}")
+    print(f"load disabled: {plain_load * 1000:9.1f} ms, enabled: {traced_load * 1000:9.1f} ms")
+    print(f"dump disabled: {plain_dump * 1000:9.1f} ms, enabled: {traced_dump * 1000:9.1f} ms")
+    print(f"disabled span + count: {disabled_call_cost() * 1e9:.0f} ns per call site")
+    print()
+    print(recorder.report())
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in argv[1:2]))
@@ -0,0 +1,119 @@
+"""
+Map Cache Benchmark
+
+Has several processes store, read and remove maps in one Utils.cache.MapCache database at once. The cap is small
+enough for eviction to run on most stores, maps are re-stored with other content and maps share content. Then
+checks the database: every entry points to a blob, every blob is pointed to by an entry, the blobs fit in the cap
+and every entry reads back the payload and parsed form it was stored with. Also checks that re-storing a map
+with new content frees the blob of its old content. Prints the operations per second for one and for all
+processes.
+
+Usage:
+    python -m Benchmarks.map_cache [process_count] [operations]
+"""
+from multiprocessing import Pool
+from os import path
+from random import Random
+from sqlite3 import connect
+from sys import argv
+from tempfile import TemporaryDirectory
+from time import perf_counter
+
+from Benchmarks.serialization import build_map
+from Utils.cache import MapCache, payload_hash
+from Utils.mapTools import tokenize_objects
+
+MAP_IDS = 40
+PAYLOAD_COUNT = 60
+MAX_BYTES = 24 * 1024
+
+
+def build_payloads() -> list:
+    return [build_map(20, seed=seed).to_xml_string() for seed in range(PAYLOAD_COUNT)]
+
+
+def check_entry(cached, mapid):
+    if payload_hash(cached.payload) != cached.hash:
+        raise AssertionError(f"Map {mapid} reads back another payload than its hash.")
+    if cached.objects != tokenize_objects(cached.payload):
+        raise AssertionError(f"Map {mapid} reads back another parsed form than its payload.")
+
+
+def worker(database: str, seed: int, operations: int):
+    rng = Random(seed)
+    payloads = build_payloads()
+    with MapCache(database, max_bytes=MAX_BYTES) as cache:
+        for _ in range(operations):
+            mapid = rng.randrange(MAP_IDS)
+            action = rng.random()
+            if action < 0.6:
+                cache.store(mapid, rng.choice(payloads), tokenize_objects)
+            elif action < 0.9:
+                cached = cache.get(mapid)
+                if cached is not None:
+                    check_entry(cached, mapid)
+            else:
+                cache.remove(mapid)
+
+
+def check_database(database: str):
+    connection = connect(database)
+    try:
+        orphans = connection.execute("SELECT COUNT(*) FROM blobs WHERE NOT EXISTS "
+                                     "(SELECT 1 FROM entries WHERE entries.hash = blobs.hash)").fetchone()[0]
+        dangling = connection.execute("SELECT COUNT(*) FROM entries WHERE NOT EXISTS "
+                                      "(SELECT 1 FROM blobs WHERE blobs.hash = entries.hash)").fetchone()[0]
+        sizes = connection.execute("SELECT COUNT(*) FROM blobs WHERE "
+                                   "size != LENGTH(payload) + COALESCE(LENGTH(parsed), 0)").fetchone()[0]
+    finally:
+        connection.close()
+    if orphans or dangling or sizes:
+        raise AssertionError(f"{orphans} orphan blobs, {dangling} entries without blob, {sizes} wrong blob sizes.")
+    with MapCache(database, max_bytes=MAX_BYTES) as cache:
+        if cache.total_bytes > MAX_BYTES:
+            raise AssertionError(f"Blobs take {cache.total_bytes} bytes, over the cap of {MAX_BYTES}.")
+        for mapid in range(MAP_IDS):
+            cached = cache.get(mapid)
+            if cached is not None:
+                check_entry(cached, mapid)
+
+
+def check_replace(directory: str):
+    first, second = build_payloads()[:2]
+    database = path.join(directory, "replace.sqlite3")
+    with MapCache(database) as cache:
+        cache.store(1, first, tokenize_objects)
+        cache.store(1, second, tokenize_objects)
+        expected = cache.get(1).hash
+    connection = connect(database)
+    try:
+        hashes = [row[0] for row in connection.execute("SELECT hash FROM blobs")]
+    finally:
+        connection.close()
+    if hashes != [expected]:
+        raise AssertionError("Re-storing a map with new content left the blob of its old content.")
+
+
+def run(directory: str, process_count: int, operations: int) -> float:
+    database = path.join(directory, f"cache{process_count}.sqlite3")
+    # Creates the schema before the workers race for it
+    MapCache(database, max_bytes=MAX_BYTES).close()
+    with Pool(process_count) as pool:
+        start = perf_counter()
+        pool.starmap(worker, [(database, seed, operations) for seed in range(process_count)])
+        elapsed = perf_counter() - start
+    check_database(database)
+    return elapsed
+
+
+def main(process_count: int = 4, operations: int = 500):
+    with TemporaryDirectory() as directory:
+        check_replace(directory)
+        print(f"operations per process: {operations}, cap: {MAX_BYTES} bytes")
+        for count in sorted({1, process_count}):
+            elapsed = run(directory, count, operations)
+            print(f"{count:2d} processes: {elapsed * 1000:8.1f} ms, {count * operations / elapsed:8.1f} operations/s")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in argv[1:3]))
@@ -0,0 +1,60 @@
+"""
+Memory Benchmark
+
+Measures the memory taken by map objects with tracemalloc. Each slotted map object class is compared with
+a replica storing the same fields in a per-instance __dict__, which is how map objects were laid out before
+the entity hierarchy used __slots__.
+
+Usage:
+    python -m Benchmarks.memory [object_count]
+"""
+from sys import argv
+from tracemalloc import start, stop, take_snapshot
+
+from DataInterfaces.Entity import iter_fields
+from DataInterfaces.MapObjects import Box, Bg, Decor, Door, Region, Enemy, Trigger
+
+
+class DictRecord:
+    # Stand-in for a map object without __slots__
+    pass
+
+
+def allocated_bytes(factory, object_count: int) -> int:
+    start()
+    before = take_snapshot()
+    objects = [factory(i) for i in range(object_count)]
+    after = take_snapshot()
+    stop()
+    size = sum(stat.size_diff for stat in after.compare_to(before, "filename"))
+    del objects
+    return size
+
+
+def as_dict_record(obj) -> DictRecord:
+    record = DictRecord()
+    record.__dict__.update(iter_fields(obj))
+    return record
+
+
+def main(object_count: int = 100_000):
+    factories = {
+        Box: lambda i: Box(x=i, y=i, w=100, h=20, m=1),
+        Bg: lambda i: Bg(x=i, y=i, w=100, h=20, c="#FFFFFF", m="1"),
+        Decor: lambda i: Decor(x=i, y=i, uid=f"#decor{i}", model="stone"),
+        Door: lambda i: Door(uid=f"#door{i}", x=i, y=i, w=100, h=20),
+        Region: lambda i: Region(uid=f"#region{i}", x=i, y=i, w=100, h=20),
+        Enemy: lambda i: Enemy(x=i, y=i, uid=f"#enemy{i}"),
+        Trigger: lambda i: Trigger(uid=f"#trigger{i}"),
+    }
+    print(f"objects per type: {object_count}")
+    print(f"{'type':<10}{'__dict__ MB':>14}{'__slots__ MB':>14}{'saved B/object':>16}")
+    for obj_type, factory in factories.items():
+        dict_size = allocated_bytes(lambda i: as_dict_record(factory(i)), object_count)
+        slots_size = allocated_bytes(factory, object_count)
+        print(f"{obj_type.__name__:<10}{dict_size / 2 ** 20:>14.2f}{slots_size / 2 ** 20:>14.2f}"
+              f"{(dict_size - slots_size) / object_count:>16.1f}")
+
+
+if __name__ == "__main__":
+    main(int(argv[1]) if len(argv) > 1 else 100_000)
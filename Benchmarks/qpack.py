@@ -0,0 +1,80 @@
+"""
+qpack Benchmark
+
+Checks that MapTools.un_qpack (single-scan QpackDecoder) gives exactly the output of the reference decoder
+applying every pattern replacement in turn, on random payloads built from codes, partial expansions and
+special sequences, then times both decoders on a synthetic map payload.
+Also checks that both modes of MapTools.qpack round-trip random texts and reports their speed and compression
+ratio on the same map.
+
+Usage:
+    python -m Benchmarks.qpack [object_count] [fuzz_cases]
+"""
+from random import Random
+from sys import argv
+from time import perf_counter
+
+from Benchmarks.serialization import build_map, measure
+from Utils.mapTools import MapTools
+
+
+def fuzz_atoms(tools: MapTools) -> list:
+    pattern = tools.qpack_pattern
+    atoms = [pattern[i][1] for i in range(tools.qpack_pattern_length)]
+    atoms += ['^', '^', '[', ']', '<', 'q', '.', '"', ' ', '0', 'x', 'T', 'm', 'L', '(']
+    for i in range(1, tools.qpack_pattern_length - 1):
+        atoms += [pattern[i][0][:1], pattern[i][0][:3], pattern[i][0][-2:]]
+    return atoms
+
+
+def check_equivalence(tools: MapTools, cases: int, seed: int = 0):
+    rng = Random(seed)
+    atoms = fuzz_atoms(tools)
+    for _ in range(cases):
+        data = ''.join(rng.choice(atoms) for _ in range(rng.randint(0, 16)))
+        if tools.un_qpack(data) != tools.un_qpack_sequential(data):
+            raise AssertionError(f"Decoders disagree on {data!r}")
+
+
+def check_round_trip(tools: MapTools, cases: int, seed: int = 0):
+    rng = Random(seed)
+    atoms = [tools.qpack_pattern[i][0] for i in range(tools.qpack_pattern_length - 1)]
+    atoms += ['^', '[^]', '<q.', '<', 'q.', '[', ']', '"', ' ', '0', '1', 'L', 's']
+    for _ in range(cases):
+        data = ''.join(rng.choice(atoms) for _ in range(rng.randint(0, 12)))
+        for optimal in (False, True):
+            if tools.un_qpack(tools.qpack(data, optimal)) != data:
+                raise AssertionError(f"qpack(optimal={optimal}) does not round-trip {data!r}")
+
+
+def main(object_count: int = 20_000, fuzz_cases: int = 100_000):
+    tools = MapTools()
+    start = perf_counter()
+    check_equivalence(tools, fuzz_cases)
+    print(f"equivalence: {fuzz_cases} random payloads in {perf_counter() - start:.1f} s")
+    start = perf_counter()
+    check_round_trip(tools, fuzz_cases // 2)
+    print(f"round trip: {fuzz_cases // 2} random texts in {perf_counter() - start:.1f} s")
+
+    xml = build_map(object_count).to_xml_string()
+    for optimal in (False, True):
+        packed, ratio = tools.qpack_ratio(xml, optimal)
+        if tools.un_qpack(packed) != xml:
+            raise AssertionError("qpack does not round-trip the map payload.")
+        elapsed = measure(lambda: tools.qpack(xml, optimal))
+        print(f"qpack {'optimal' if optimal else 'greedy '}: {elapsed * 1000:8.1f} ms, "
+              f"{len(xml)} -> {len(packed)} characters, ratio {ratio:.3f}")
+
+    payload = tools.qpack(xml)
+    if tools.un_qpack(payload) != tools.un_qpack_sequential(payload):
+        raise AssertionError("Decoders disagree on the map payload.")
+    sequential = measure(lambda: tools.un_qpack_sequential(payload))
+    single_scan = measure(lambda: tools.un_qpack(payload))
+    print(f"payload: {len(payload)} characters")
+    print(f"sequential replaces: {sequential * 1000:8.1f} ms")
+    print(f"single scan:         {single_scan * 1000:8.1f} ms")
+    print(f"speed-up:            {sequential / single_scan:8.2f}x")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in argv[1:3]))
@@ -0,0 +1,77 @@
+"""
+Serialization Benchmark
+
+Compares the former Map.to_xml path (one generate_item_xml coroutine per object, awaited with gather)
+with the synchronous template serializer of DataInterfaces.MapSerializer on a synthetic map, and checks
+that both produce the same XML.
+
+Usage:
+    python -m Benchmarks.serialization [object_count]
+"""
+from asyncio import gather, run
+from random import Random
+from sys import argv
+from time import perf_counter
+
+from DataInterfaces.Map import Map
+from DataInterfaces.MapObjects import Box, Bg, Decor, Door, Region, Trigger, Enemy
+
+
+def build_map(object_count: int, seed: int = 0) -> Map:
+    rng = Random(seed)
+    map_instance = Map()
+    for i in range(object_count):
+        kind = i % 10
+        x, y = rng.randint(-10000, 10000), rng.randint(-10000, 10000)
+        if kind < 4:
+            map_instance.add_object(Box(x=x, y=y, w=rng.randint(10, 500), h=rng.randint(10, 500)))
+        elif kind < 6:
+            map_instance.add_object(Bg(x=x, y=y, w=rng.randint(10, 500), h=rng.randint(10, 500), c="#FFFFFF", m=1))
+        elif kind < 8:
+            map_instance.add_object(Decor(x=x, y=y, uid=f"#decor{i}", model="stone", sx=1, sy=1))
+        elif kind == 8:
+            map_instance.add_object(Region(uid=f"#region{i}", x=x, y=y, w=100, h=100, use_target=f"#trigger{i}"))
+        else:
+            if i % 20 == 9:
+                map_instance.add_object(Door(uid=f"#door{i}", x=x, y=y, w=100, h=20, tarx=x, tary=y - 100))
+            else:
+                map_instance.add_object(Enemy(x=x, y=y, uid=f"#enemy{i}", hea=130, hmax=130, side=1))
+    trigger = map_instance.add_object(Trigger(uid="#trigger", enabled=True, maxcalls=1))
+    trigger.add_action(100, ["a", "1"])
+    return map_instance
+
+
+async def generate_item_xml(item):
+    # The former per-object coroutine of Map.to_xml
+    return f'{item.to_xml}'
+
+
+async def legacy_to_xml(map_instance: Map) -> str:
+    tasks = [generate_item_xml(item) for items in map_instance.objects.values() for item in items]
+    return ''.join(await gather(*tasks))
+
+
+def measure(function, repeat: int = 3) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = perf_counter()
+        function()
+        best = min(best, perf_counter() - start)
+    return best
+
+
+def main(object_count: int = 100_000):
+    map_instance = build_map(object_count)
+    if run(legacy_to_xml(map_instance)) != map_instance.to_xml_string():
+        raise AssertionError("Template serializer output differs from the legacy serializer.")
+
+    legacy = measure(lambda: run(legacy_to_xml(map_instance)))
+    template = measure(map_instance.to_xml_string)
+    print(f"objects: {object_count}")
+    print(f"legacy gather:      {legacy * 1000:9.1f} ms")
+    print(f"template serializer: {template * 1000:8.1f} ms")
+    print(f"speed-up:           {legacy / template:9.2f}x")
+
+
+if __name__ == "__main__":
+    main(int(argv[1]) if len(argv) > 1 else 100_000)
@@ -0,0 +1,239 @@
+"""
+Benchmark Suite
+
+Times the hot paths of the package on synthetic maps of Benchmarks.generator, one object type at a time and at
+several scales, and records the peak memory of every case with tracemalloc. Results are written as JSON and can be
+compared with the results of an earlier run.
+
+Operations:
+    load:    Map.from_xml of the dumped map.
+    dump:    Map.to_xml_string, for triggers as for every other type.
+    lookup:  Map.find_object_by_uid of LOOKUP_COUNT random uids, through the uid index.
+    scan:    find_object_by_name of SCAN_COUNT random uids, scanning the object list.
+    unqpack: MapTools.un_qpack of the qpacked dump.
+
+Every case is timed `repeat` times and the best time is kept, the peak memory comes from one more run with
+tracemalloc on, so tracing does not slow the timed runs down.
+
+Usage:
+    python -m Benchmarks.suite [--scales 1000,10000] [--types Box,Trigger] [--operations load,dump]
+                               [--repeat 3] [--no-memory] [--output results.json] [--compare baseline.json]
+
+    # Only compare two result files
+    python -m Benchmarks.suite --compare baseline.json --against results.json
+"""
+from argparse import ArgumentParser
+from datetime import datetime, timezone
+from gc import collect
+from json import dump, load
+from platform import platform, python_version
+from random import Random
+from time import perf_counter
+from tracemalloc import get_traced_memory, start, stop
+
+from Benchmarks.generator import GENERATED_TYPES, generate_map
+from DataInterfaces.Entity import NamedMapObjectEntity
+from DataInterfaces.Map import Map, find_object_by_name
+from Utils.mapTools import MapTools
+
+RESULTS_VERSION = 1
+DEFAULT_SCALES = (1000, 10000)
+OPERATIONS = ("load", "dump", "lookup", "scan", "unqpack")
+LOOKUP_COUNT = 10000
+SCAN_COUNT = 10
+# Ratio of new to old time above which compare flags a case
+DEFAULT_THRESHOLD = 1.10
+
+
+def best_time(function, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        collect()
+        start_time = perf_counter()
+        function()
+        best = min(best, perf_counter() - start_time)
+    return best
+
+
+def peak_memory(function) -> int:
+    # Bytes allocated at the peak of one run, above what was allocated before it
+    collect()
+    start()
+    try:
+        function()
+        return get_traced_memory()[1]
+    finally:
+        stop()
+
+
+class Case:
+    """
+    One map of one object type at one scale, with the data every operation needs.
+
+    Attributes:
+        obj_type (type): The object type.
+        count (int): Number of objects.
+        map_instance (Map): The generated map.
+        xml (str): Its dump, wrapped into a root element for loading.
+    """
+
+    __slots__ = ("obj_type", "count", "map_instance", "xml", "_tools", "_packed", "_uids")
+
+    def __init__(self, obj_type, count: int):
+        self.obj_type = obj_type
+        self.count = count
+        self.map_instance = generate_map({obj_type: count})
+        self.xml = f"<root>{self.map_instance.to_xml_string()}</root>"
+        self._tools = None
+        self._packed = None
+        self._uids = None
+
+    @property
+    def named(self) -> bool:
+        return issubclass(self.obj_type, NamedMapObjectEntity)
+
+    def uids(self, count: int) -> list:
+        if self._uids is None:
+            self._uids = [item.uid for item in self.map_instance.objects[self.obj_type]]
+        return Random(0).choices(self._uids, k=count)
+
+    def operation(self, name: str):
+        # The function timed for an operation, None when it does not apply to the object type
+        map_instance = self.map_instance
+        obj_type = self.obj_type
+        if name == "load":
+            return lambda: Map().from_xml(self.xml)
+        if name == "dump":
+            return map_instance.to_xml_string
+        if name == "lookup" and self.named:
+            uids = self.uids(LOOKUP_COUNT)
+            find = map_instance.find_object_by_uid
+            return lambda: [find(obj_type, uid) for uid in uids]
+        if name == "scan" and self.named:
+            uids = self.uids(SCAN_COUNT)
+            items = map_instance.objects[obj_type]
+            return lambda: [find_object_by_name(items, obj_type.__name__, uid) for uid in uids]
+        if name == "unqpack":
+            if self._packed is None:
+                self._tools = MapTools()
+                self._packed = self._tools.qpack(self.xml)
+            tools, packed = self._tools, self._packed
+            return lambda: tools.un_qpack(packed)
+        return None
+
+
+def run_suite(scales=DEFAULT_SCALES, types=GENERATED_TYPES, operations=OPERATIONS, repeat: int = 3,
+              memory: bool = True, report=print) -> dict:
+    results = []
+    for count in scales:
+        for obj_type in types:
+            case = Case(obj_type, count)
+            for name in operations:
+                function = case.operation(name)
+                if function is None:
+                    continue
+                seconds = best_time(function, repeat)
+                units = LOOKUP_COUNT if name == "lookup" else SCAN_COUNT if name == "scan" else count
+                result = {
+                    "case": f"{name}/{obj_type.__name__}/{count}",
+                    "operation": name,
+                    "type": obj_type.__name__,
+                    "count": count,
+                    "seconds": seconds,
+                    "per_unit_us": seconds / units * 1e6,
+                    "peak_bytes": peak_memory(function) if memory else None,
+                    "xml_bytes": len(case.xml),
+                }
+                results.append(result)
+                if report is not None:
+                    report(format_result(result))
+    return {
+        "version": RESULTS_VERSION,
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": python_version(),
+        "platform": platform(),
+        "repeat": repeat,
+        "results": results,
+    }
+
+
+def format_result(result: dict) -> str:
+    peak = result["peak_bytes"]
+    peak = f"{peak / 2 ** 20:9.1f} MiB" if peak is not None else " " * 13
+    return f"{result['case']:<28} {result['seconds'] * 1000:10.2f} ms {result['per_unit_us']:10.3f} us/unit {peak}"
+
+
+def compare(baseline: dict, current: dict, threshold: float = DEFAULT_THRESHOLD, report=print) -> list:
+    # Prints the time ratio of every case found in both runs and returns the cases slower than the threshold
+    old = {result["case"]: result for result in baseline["results"]}
+    regressions = []
+    for result in current["results"]:
+        previous = old.get(result["case"])
+        if previous is None:
+            continue
+        ratio = result["seconds"] / previous["seconds"] if previous["seconds"] else float("inf")
+        flag = ""
+        if ratio > threshold:
+            flag = "  SLOWER"
+            regressions.append(result["case"])
+        elif ratio < 1 / threshold:
+            flag = "  faster"
+        memory = ""
+        if result["peak_bytes"] and previous["peak_bytes"]:
+            memory = f"  memory {result['peak_bytes'] / previous['peak_bytes']:6.2f}x"
+        report(f"{result['case']:<28} {previous['seconds'] * 1000:10.2f} -> {result['seconds'] * 1000:10.2f} ms "
+               f"{ratio:6.2f}x{memory}{flag}")
+    return regressions
+
+
+def read_results(file_location: str) -> dict:
+    with open(file_location) as f:
+        results = load(f)
+    if results.get("version") != RESULTS_VERSION:
+        raise ValueError(f"{file_location} holds results of an unsupported version.")
+    return results
+
+
+def main(argv: list = None):
+    parser = ArgumentParser(description="Benchmark load, dump, lookup and qpack on synthetic maps.")
+    parser.add_argument("--scales", default=",".join(map(str, DEFAULT_SCALES)),
+                        help="Comma-separated object counts, e.g. 1000,10000,100000,1000000")
+    parser.add_argument("--types", default=None, help="Comma-separated object type names, all by default")
+    parser.add_argument("--operations", default=",".join(OPERATIONS), help="Comma-separated operations")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--no-memory", action="store_true", help="Skip the tracemalloc runs")
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    parser.add_argument("--compare", help="Compare with the results of this JSON file")
+    parser.add_argument("--against", help="With --compare, compare this JSON file instead of running")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    args = parser.parse_args(argv)
+
+    if args.against is not None:
+        if args.compare is None:
+            parser.error("--against needs --compare")
+        return 1 if compare(read_results(args.compare), read_results(args.against), args.threshold) else 0
+
+    types_by_name = {obj_type.__name__.lower(): obj_type for obj_type in GENERATED_TYPES}
+    try:
+        types = GENERATED_TYPES if args.types is None else \
+            tuple(types_by_name[name.strip().lower()] for name in args.types.split(","))
+    except KeyError as e:
+        parser.error(f"unknown object type {e}")
+    operations = tuple(name.strip() for name in args.operations.split(","))
+    unknown = set(operations) - set(OPERATIONS)
+    if unknown:
+        parser.error(f"unknown operations {', '.join(sorted(unknown))}")
+    scales = tuple(int(scale) for scale in args.scales.split(","))
+
+    results = run_suite(scales, types, operations, args.repeat, not args.no_memory)
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            dump(results, f, indent=1)
+    if args.compare is not None:
+        print()
+        return 1 if compare(read_results(args.compare), results, args.threshold) else 0
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,46 @@
+"""
+Map Transform Benchmark
+
+Applies the same transforms to a map keeping Box, Bg and Decor in lists and to one keeping them in column stores,
+both loaded from XML mixing ints, integral floats and other floats (see Benchmarks.columnar). Checks that both
+maps have no differences and dump the same XML after every transform, and prints the time each layout takes.
+
+Usage:
+    python -m Benchmarks.transform [object_count]
+"""
+from sys import argv
+
+from Benchmarks.columnar import float_map_xml, load
+from Benchmarks.serialization import measure
+from DataInterfaces.ColumnStore import COLUMNAR_TYPES
+
+TRANSFORMS = (
+    {"translate": (100, -50)},
+    {"translate": (0.5, 0)},
+    {"scale": 1.5},
+    {"scale": (2, 0.5), "origin": (10, 10)},
+    {"mirror": 0},
+    {"mirror": 12.5},
+    {"crop": (-5000, -5000, 10000, 10000.5)},
+    {"crop": (-3000, -3000, 6000, 6000)},
+)
+
+
+def main(object_count: int = 50_000):
+    xml = float_map_xml(object_count)
+    listed, columnar = load(xml), load(xml, COLUMNAR_TYPES)
+    print(f"objects: {object_count * len(COLUMNAR_TYPES)}")
+    for transform in TRANSFORMS:
+        listed.transform(**transform)
+        columnar.transform(**transform)
+        if listed.diff(columnar) or listed.to_xml_string() != columnar.to_xml_string():
+            raise AssertionError(f"Lists and column stores differ after {transform}.")
+        # Timed on fresh copies, the checked maps go on to the next transform
+        listed_copy, columnar_copy = load(xml), load(xml, COLUMNAR_TYPES)
+        listed_time = measure(lambda: listed_copy.transform(**transform), repeat=1)
+        columnar_time = measure(lambda: columnar_copy.transform(**transform), repeat=1)
+        print(f"{str(transform):<45} lists {listed_time * 1000:8.1f} ms, columns {columnar_time * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main(int(argv[1]) if len(argv) > 1 else 50_000)
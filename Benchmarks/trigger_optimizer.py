@@ -0,0 +1,44 @@
+"""
+Trigger Optimizer Benchmark
+
+Runs Map.optimize_triggers on synthetic maps, prints the report of the pass and its time, and checks with
+TriggerVM that the optimized maps leave the same variables, chat messages and world effects as the original
+ones after a simulation.
+
+Usage:
+    python -m Benchmarks.trigger_optimizer [map_count] [ticks]
+"""
+from sys import argv
+
+from Benchmarks.generator import generate_map
+from Benchmarks.serialization import measure
+from Benchmarks.vm import MAP_COUNTS, simulate
+from DataInterfaces.Map import Map
+
+
+def copy_map(map_instance: Map) -> Map:
+    copy = Map()
+    copy.from_binary(map_instance.to_binary())
+    return copy
+
+
+def main(map_count: int = 20, ticks: int = 30 * 60):
+    maps = [generate_map(MAP_COUNTS, seed=seed) for seed in range(map_count)]
+    for seed, map_instance in enumerate(maps):
+        optimized = copy_map(map_instance)
+        report = optimized.optimize_triggers()
+        if seed == 0:
+            print(report)
+        original_vm = simulate(map_instance, ticks)
+        optimized_vm = simulate(optimized, ticks)
+        for name in ("variables", "chat", "effects"):
+            if getattr(original_vm, name) != getattr(optimized_vm, name):
+                raise AssertionError(f"Map {seed} has different {name} once optimized.")
+
+    copies = [copy_map(map_instance) for map_instance in maps for _ in range(3)]
+    elapsed = measure(lambda: [copies.pop().optimize_triggers() for _ in range(map_count)])
+    print(f"maps: {map_count}, pass: {elapsed / map_count * 1000:.2f} ms/map")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in argv[1:3]))
@@ -0,0 +1,118 @@
+"""
+Trigger Serialization Benchmark
+
+Compares Trigger.to_xml with the former ElementTree-based implementation on synthetic triggers of 1 to 10 actions
+and on values needing escaping, checks that both give byte-identical output, and times both.
+
+Then splits long triggers with skip-next actions, checks that the chained triggers hold the original actions in
+order with no skip-next action before a link, and compares their number with the fixed 9-action slices of the
+former chunk(), which also repeated actions.
+
+Usage:
+    python -m Benchmarks.triggers [trigger_count]
+"""
+from random import Random
+from sys import argv
+from xml.etree.ElementTree import Element, tostring
+
+from Benchmarks.generator import generate_objects
+from Benchmarks.serialization import measure
+from DataInterfaces.Entity import DO_NOTHING
+from DataInterfaces.MapObjects import EXECUTE_TRIGGER, MAX_TRIGGER_ACTIONS, SKIP_NEXT, Trigger
+
+ESCAPED_VALUES = ('a & b', '<b>bold</b>', 'say "hi"', "line\nbreak", "tab\there", "cr\rlf", "&amp; already", "")
+
+
+def legacy_to_xml(trigger: Trigger) -> str:
+    # Trigger.to_xml before the string-building emitter, for triggers of at most 10 actions
+    element = Element("trigger")
+    attribs = {
+        "uid": trigger.uid,
+        "x": str(trigger.x),
+        "y": str(trigger.y),
+        "enabled": str(trigger.enabled).lower(),
+        "maxcalls": str(trigger.maxcalls)
+    }
+    for i in range(10):
+        action = DO_NOTHING
+        if i < len(trigger.actions):
+            action = trigger.actions[i]
+        args = action.args
+        attribs[f"actions_{i + 1}_type"] = str(action.opID)
+        if len(args) > 0:
+            attribs[f"actions_{i + 1}_targetA"] = args[0]
+        if len(args) > 1:
+            attribs[f"actions_{i + 1}_targetB"] = args[1]
+    element.attrib = attribs
+    return tostring(element, encoding="unicode")
+
+
+def escaping_triggers() -> list:
+    triggers = []
+    for i, value in enumerate(ESCAPED_VALUES):
+        trigger = Trigger(uid=f"#trigger{value}", x=i, y=-i, enabled=True, maxcalls=1)
+        trigger.add_action(42, [value, "#FFFFFF"])
+        trigger.add_action(100, ["var", value])
+        trigger.add_action(156, [value])
+        triggers.append(trigger)
+    return triggers
+
+
+def legacy_chunk(actions):
+    # The former slicing of long triggers, kept to count what it emitted
+    return [actions[i:i + 9] for i in range(0, len(actions), 9)] + [actions[(len(actions) % 9):]]
+
+
+def long_triggers(count: int) -> list:
+    rng = Random(0)
+    triggers = []
+    for i in range(count):
+        trigger = Trigger(uid=f"#long{i}", enabled=True, maxcalls=1)
+        for j in range(rng.randint(11, 60)):
+            op_id = rng.choice((SKIP_NEXT, 116, 100, 100, 42))
+            trigger.add_action(op_id, [f"var{j}", str(j)])
+        triggers.append(trigger)
+    return triggers
+
+
+def check_split(trigger: Trigger) -> int:
+    parts = trigger.split()
+    actions = []
+    for index, part in enumerate(parts):
+        if len(part.actions) > MAX_TRIGGER_ACTIONS:
+            raise AssertionError(f"{part.uid} has {len(part.actions)} actions.")
+        part_actions = part.actions
+        if index + 1 < len(parts):
+            link = part_actions[-1]
+            if link.opID != EXECUTE_TRIGGER or link.args != [parts[index + 1].uid]:
+                raise AssertionError(f"{part.uid} does not end with a link to {parts[index + 1].uid}.")
+            part_actions = part_actions[:-1]
+            if part_actions[-1].opID == SKIP_NEXT:
+                raise AssertionError(f"{part.uid} skips its link.")
+        actions.extend(part_actions)
+    if actions != trigger.actions:
+        raise AssertionError(f"{trigger.uid} lost or reordered actions.")
+    return len(parts)
+
+
+def main(trigger_count: int = 20000):
+    triggers = generate_objects(Trigger, trigger_count) + escaping_triggers()
+    for trigger in triggers:
+        if trigger.to_xml != legacy_to_xml(trigger):
+            raise AssertionError(f"{trigger.uid}:\n{trigger.to_xml}\n{legacy_to_xml(trigger)}")
+
+    legacy = measure(lambda: [legacy_to_xml(trigger) for trigger in triggers])
+    current = measure(lambda: [trigger.to_xml for trigger in triggers])
+    print(f"triggers: {len(triggers)}")
+    print(f"ElementTree: {legacy * 1000:9.1f} ms, {legacy / len(triggers) * 1e6:6.2f} us/trigger")
+    print(f"emitter:     {current * 1000:9.1f} ms, {current / len(triggers) * 1e6:6.2f} us/trigger")
+    print(f"speed-up:    {legacy / current:9.1f}x")
+
+    triggers = long_triggers(trigger_count // 10)
+    split = sum(check_split(trigger) for trigger in triggers)
+    sliced = sum(sum(1 for group in legacy_chunk(trigger.actions) if group) for trigger in triggers)
+    print(f"long triggers: {len(triggers)}, emitted as {split} chained triggers, chunk() sliced them into {sliced}")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in argv[1:2]))
@@ -0,0 +1,76 @@
+"""
+Trigger VM Benchmark
+
+Simulates synthetic maps with TriggerVM the way a CI job would: every region is entered once, every character
+dies once, then the timers run for the given number of ticks. Prints the time spent compiling and running and the
+simulated ticks per second.
+
+Also checks that long triggers give the same variables as the chained triggers they are dumped as, by running
+a map with long triggers before and after an XML round trip.
+
+Usage:
+    python -m Benchmarks.vm [map_count] [ticks]
+"""
+from sys import argv
+from time import perf_counter
+
+from Benchmarks.generator import generate_map
+from Benchmarks.triggers import long_triggers
+from DataInterfaces.Map import Map
+from DataInterfaces.MapObjects import Enemy, Player, Region, Timer, Trigger
+from DataInterfaces.TriggerVM import TriggerVM
+
+MAP_COUNTS = {Trigger: 300, Timer: 60, Region: 60, Player: 8, Enemy: 40}
+
+
+def simulate(map_instance: Map, ticks: int, seed: int = 0) -> TriggerVM:
+    vm = TriggerVM(map_instance, seed=seed)
+    for uid in vm.regions:
+        vm.enter_region(uid)
+    for uid in vm.characters:
+        vm.kill(uid)
+    vm.run(ticks)
+    return vm
+
+
+def check_split_equivalence(trigger_count: int = 200):
+    map_instance = Map()
+    for trigger in long_triggers(trigger_count):
+        trigger.maxcalls = -1
+        map_instance.add_object(trigger)
+    reloaded = Map()
+    reloaded.from_xml(f"<root>{map_instance.to_xml_string()}</root>")
+    if len(reloaded.objects[Trigger]) <= trigger_count:
+        raise AssertionError("Long triggers were not split.")
+    original = TriggerVM(map_instance)
+    split = TriggerVM(reloaded)
+    for trigger in map_instance.objects[Trigger]:
+        for vm in (original, split):
+            vm.variables.update((f"var{i}", i % 3) for i in range(60))
+            vm.execute(trigger.uid)
+        if original.variables != split.variables or original.chat != split.chat:
+            raise AssertionError(f"{trigger.uid} runs differently once split.")
+
+
+def main(map_count: int = 100, ticks: int = 30 * 60 * 10):
+    check_split_equivalence()
+
+    maps = [generate_map(MAP_COUNTS, seed=seed) for seed in range(map_count)]
+    start = perf_counter()
+    vms = [TriggerVM(map_instance, seed=0) for map_instance in maps]
+    compile_time = perf_counter() - start
+    start = perf_counter()
+    vms = [simulate(map_instance, ticks) for map_instance in maps]
+    run_time = perf_counter() - start - compile_time
+
+    actions = sum(vm.actions_run for vm in vms)
+    executions = sum(vm.executions for vm in vms)
+    print(f"maps: {map_count}, ticks per map: {ticks}")
+    print(f"compile: {compile_time * 1000:9.1f} ms, {compile_time / map_count * 1000:7.2f} ms/map")
+    print(f"run:     {run_time * 1000:9.1f} ms, {run_time / map_count * 1000:7.2f} ms/map, "
+          f"{map_count * ticks / run_time:,.0f} ticks/s")
+    print(f"trigger runs: {executions}, actions: {actions}, {actions / run_time:,.0f} actions/s")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in argv[1:3]))
@@ -0,0 +1,48 @@
+"""
+XML Cache Benchmark
+
+Dumps a synthetic map repeatedly, as an editor does after every edit, with and without the XML fragment
+cache of Map(cache_xml=True), and checks that both dumps stay identical after the edits.
+
+Usage:
+    python -m Benchmarks.xml_cache [object_count] [edits_per_dump]
+"""
+from random import Random
+from sys import argv
+
+from Benchmarks.serialization import build_map, measure
+from DataInterfaces.MapObjects import Box, Decor
+
+
+def edit(map_instance, rng: Random, edits: int):
+    boxes = map_instance.objects[Box]
+    decors = map_instance.objects[Decor]
+    for _ in range(edits):
+        boxes[rng.randrange(len(boxes))].x += 1
+        decors[rng.randrange(len(decors))].model = rng.choice(("stone", "bush"))
+
+
+def main(object_count: int = 50000, edits: int = 10):
+    map_instance = build_map(object_count)
+    uncached = measure(map_instance.to_xml_string)
+
+    map_instance.cache_xml = True
+    first = measure(map_instance.to_xml_string, repeat=1)
+    unchanged = measure(map_instance.to_xml_string)
+    rng = Random(0)
+    edited = measure(lambda: (edit(map_instance, rng, edits), map_instance.to_xml_string()))
+
+    cached_xml = map_instance.to_xml_string()
+    map_instance.cache_xml = False
+    if cached_xml != map_instance.to_xml_string():
+        raise AssertionError("Cached dump differs from the uncached dump.")
+
+    print(f"objects: {object_count}")
+    print(f"uncached dump:          {uncached * 1000:9.2f} ms")
+    print(f"first cached dump:      {first * 1000:9.2f} ms")
+    print(f"unchanged cached dump:  {unchanged * 1000:9.2f} ms ({uncached / unchanged:.1f}x)")
+    print(f"dump after {edits * 2:4d} edits:  {edited * 1000:9.2f} ms ({uncached / edited:.1f}x)")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in argv[1:3]))
@@ -0,0 +1,312 @@
+"""
+ColumnStore Module
+
+This module provides an optional columnar storage for the map object types that make up the bulk of a map
+(Box, Bg and Decor). Numeric fields live in parallel array('d') columns and the other fields in plain lists,
+one entry per object, instead of one Python object per map object.
+
+Rows are exposed through lightweight views: instances of a generated subclass of the stored class (e.g. BoxView
+for Box) whose fields are properties reading and writing the columns. Views pass isinstance checks, support
+to_xml and attribute access like the original classes, and compare equal when they point at the same row.
+
+Classes:
+    ColumnStore:
+        A list-like container keeping objects of one map object type in columns.
+
+Functions:
+    map_object_type(obj) -> type:
+        Returns the map object class of an object or of a view.
+
+Note:
+    Numbers are stored as doubles with a flag per row telling whether they were floats, so 10 reads back as
+    10 and 10.0 as 10.0, and both dump as they were loaded. Values written through a NumPy view keep the flag
+    of their row, an integral value in an int row reads back as int until mark_floats is called. Values that
+    are not numbers (None, booleans, strings, ints too large for a double) in numeric fields are kept aside and
+    read back unchanged.
+    Removed rows are only marked as removed, so existing views stay valid until compact() is called.
+    A column cannot grow while a NumPy view of it is alive, drop the view before appending rows.
+
+Usage Example:
+    # Import the class
+    from DataInterfaces.ColumnStore import ColumnStore
+
+    boxes = ColumnStore(Box)
+    box = boxes.append(Box(x=10, y=20, w=100, h=50))
+    box.x += 5
+    print(box.to_xml)
+
+    # Zero-copy NumPy view of a column
+    xs = boxes.numpy_column("x")
+"""
+from array import array
+from math import nan
+from typing import Iterator
+
+from DataInterfaces.Entity import field_names
+from DataInterfaces.MapObjects import Box, Bg, Decor
+from DataInterfaces.MapSerializer import XML_TEMPLATES
+
+# Map object class -> fields stored in array('d') columns
+NUMERIC_COLUMNS = {
+    Box: ("x", "y", "w", "h", "m"),
+    Bg: ("x", "y", "w", "h", "u", "v", "f"),
+    Decor: ("x", "y", "u", "v", "r", "sx", "sy", "f"),
+}
+
+COLUMNAR_TYPES = tuple(NUMERIC_COLUMNS)
+
+_view_classes = {}
+
+
+def map_object_type(obj) -> type:
+    obj_class = type(obj)
+    return getattr(obj_class, "map_object_type", obj_class)
+
+
+# Ints beyond this magnitude do not survive a round trip through a double
+MAX_EXACT_INT = 2 ** 53
+
+
+def read_number(store, name: str, row: int):
+    value = store.columns[name][row]
+    if store.floats[name][row]:
+        return value
+    if value != value:
+        # NaN in an int row marks a value kept aside
+        return store.overrides[name][row]
+    return int(value) if value.is_integer() else value
+
+
+def read_numbers(values, floats) -> Iterator:
+    return (value if is_float or not value.is_integer() else int(value) for value, is_float in zip(values, floats))
+
+
+def _numeric_property(name: str) -> property:
+    def getter(self):
+        return read_number(self._store, name, self._row)
+
+    def setter(self, value):
+        self._store.set_number(name, self._row, value)
+
+    return property(getter, setter)
+
+
+def _object_property(name: str) -> property:
+    def getter(self):
+        return self._store.columns[name][self._row]
+
+    def setter(self, value):
+        self._store.columns[name][self._row] = value
+
+    return property(getter, setter)
+
+
+def _view_eq(self, other):
+    return type(other) is type(self) and other._store is self._store and other._row == self._row
+
+
+def _view_hash(self):
+    return hash((id(self._store), self._row))
+
+
+def get_view_class(obj_type) -> type:
+    view_class = _view_classes.get(obj_type)
+    if view_class is not None:
+        return view_class
+
+    numeric = NUMERIC_COLUMNS[obj_type]
+    namespace = {
+        "__slots__": ("_store", "_row"),
+        "map_object_type": obj_type,
+        "__eq__": _view_eq,
+        "__hash__": _view_hash,
+    }
+    for name in field_names(obj_type):
+        namespace[name] = _numeric_property(name) if name in numeric else _object_property(name)
+    view_class = _view_classes[obj_type] = type(f"{obj_type.__name__}View", (obj_type,), namespace)
+    return view_class
+
+
+def make_view(view_class, store, row: int):
+    # Views skip the __init__ of the stored class
+    view = object.__new__(view_class)
+    object.__setattr__(view, "_store", store)
+    object.__setattr__(view, "_row", row)
+    return view
+
+
+class ColumnStore:
+    """
+    A list-like container keeping objects of one map object type in columns.
+
+    Attributes:
+        obj_type (type): The stored map object class.
+        numeric (tuple): Names of the fields stored in array('d') columns.
+        columns (dict): Field name -> array('d') or list, one entry per row.
+        floats (dict): Numeric field name -> bytearray, 1 for rows holding a float, 0 for rows holding an int.
+        overrides (dict): Numeric field name -> {row: value} of values that are not numbers.
+        alive (bytearray): 1 for live rows, 0 for removed rows.
+
+    Methods:
+        append(obj): Copies an object into a new row and returns its view.
+        remove(obj): Marks the row of a view as removed.
+        remove_rows(rows): Marks rows as removed by their index.
+        column(name): Returns the raw column of a field.
+        numpy_column(name): Returns a zero-copy NumPy view of a numeric column.
+        mark_floats(name): Flags as floats the int rows a raw or NumPy write left non-integral.
+        compact(): Drops removed rows, invalidating existing views.
+        iter_xml(): Yields the XML fragment of every live row straight from the columns.
+    """
+
+    def __init__(self, obj_type, objects=()):
+        if obj_type not in NUMERIC_COLUMNS:
+            raise ValueError(f"{obj_type.__name__} has no columnar storage.")
+        self.obj_type = obj_type
+        self.view_class = get_view_class(obj_type)
+        self.numeric = NUMERIC_COLUMNS[obj_type]
+        self.columns = {name: array('d') if name in self.numeric else [] for name in field_names(obj_type)}
+        self.floats = {name: bytearray() for name in self.numeric}
+        self.overrides = {name: {} for name in self.numeric}
+        self.alive = bytearray()
+        self.removed_count = 0
+        for obj in objects:
+            self.append(obj)
+
+    def __len__(self):
+        return len(self.alive) - self.removed_count
+
+    def __bool__(self):
+        return len(self) > 0
+
+    def __iter__(self) -> Iterator:
+        view_class = self.view_class
+        if not self.removed_count:
+            return (make_view(view_class, self, row) for row in range(len(self.alive)))
+        return (make_view(view_class, self, row) for row, alive in enumerate(self.alive) if alive)
+
+    def __getitem__(self, position: int):
+        rows = range(len(self.alive)) if not self.removed_count else \
+            [row for row, alive in enumerate(self.alive) if alive]
+        return make_view(self.view_class, self, rows[position])
+
+    def __contains__(self, obj):
+        return isinstance(obj, self.view_class) and obj._store is self and self.alive[obj._row] == 1
+
+    def set_number(self, name: str, row: int, value):
+        overrides = self.overrides[name]
+        is_float = isinstance(value, float)
+        is_int = isinstance(value, int) and not isinstance(value, bool) and -MAX_EXACT_INT <= value <= MAX_EXACT_INT
+        if is_float or is_int:
+            self.columns[name][row] = value
+            self.floats[name][row] = is_float
+            if overrides:
+                overrides.pop(row, None)
+        else:
+            self.columns[name][row] = nan
+            self.floats[name][row] = 0
+            overrides[row] = value
+
+    def append(self, obj):
+        row = len(self.alive)
+        numeric = self.numeric
+        for name, column in self.columns.items():
+            value = getattr(obj, name)
+            if name in numeric:
+                column.append(0.0)
+                self.floats[name].append(0)
+                self.set_number(name, row, value)
+            else:
+                column.append(value)
+        self.alive.append(1)
+        return make_view(self.view_class, self, row)
+
+    def extend(self, objects):
+        for obj in objects:
+            self.append(obj)
+
+    def remove(self, obj):
+        if obj not in self:
+            raise ValueError(f"{obj!r} is not in the column store.")
+        self.alive[obj._row] = 0
+        self.removed_count += 1
+
+    def remove_rows(self, rows):
+        # Marks rows as removed, rows removed already are skipped
+        alive = self.alive
+        for row in rows:
+            if alive[row]:
+                alive[row] = 0
+                self.removed_count += 1
+
+    def column(self, name: str):
+        return self.columns[name]
+
+    def numpy_column(self, name: str):
+        # Shares memory with the array('d') column, writes go straight to the store
+        from numpy import frombuffer, float64
+        return frombuffer(self.columns[name], dtype=float64)
+
+    def mark_floats(self, name: str):
+        # Flags as floats the int rows left holding a non-integral value by writes to the raw or NumPy column,
+        # so that they stay floats once a later write makes them integral again
+        column = self.columns[name]
+        floats = self.floats[name]
+        if not column:
+            return
+        try:
+            from numpy import floor, frombuffer, float64, isnan, uint8
+        except ImportError:
+            for row, value in enumerate(column):
+                if not floats[row] and value == value and not value.is_integer():
+                    floats[row] = 1
+            return
+        values = frombuffer(column, dtype=float64)
+        frombuffer(floats, dtype=uint8)[(values != floor(values)) & ~isnan(values)] = 1
+
+    def live_rows(self):
+        if not self.removed_count:
+            return range(len(self.alive))
+        return [row for row, alive in enumerate(self.alive) if alive]
+
+    def compact(self):
+        if not self.removed_count:
+            return
+        rows = self.live_rows()
+        for name, column in self.columns.items():
+            kept = [column[row] for row in rows]
+            self.columns[name] = array('d', kept) if name in self.numeric else kept
+        for name, floats in self.floats.items():
+            self.floats[name] = bytearray(floats[row] for row in rows)
+        new_rows = {old: new for new, old in enumerate(rows)}
+        for name, overrides in self.overrides.items():
+            self.overrides[name] = {new_rows[row]: value for row, value in overrides.items() if row in new_rows}
+        self.alive = bytearray(b"\x01" * len(rows))
+        self.removed_count = 0
+
+    def iter_values(self, name: str) -> Iterator:
+        column = self.columns[name]
+        rows = self.live_rows() if self.removed_count else None
+        if name not in self.numeric:
+            return iter(column) if rows is None else (column[row] for row in rows)
+        if self.overrides[name]:
+            if rows is None:
+                rows = range(len(column))
+            return (read_number(self, name, row) for row in rows)
+        floats = self.floats[name]
+        if rows is not None:
+            return read_numbers((column[row] for row in rows), (floats[row] for row in rows))
+        if 1 not in floats:
+            return (int(value) if value.is_integer() else value for value in column)
+        return read_numbers(column, floats)
+
+    def iter_xml(self) -> Iterator[str]:
+        template, fields = XML_TEMPLATES[self.obj_type]
+        fill = template.format
+        value_columns = []
+        for field in fields:
+            if isinstance(field, str):
+                value_columns.append(self.iter_values(field))
+            else:
+                value_columns.append(map(field[1], self.iter_values(field[0])))
+        for values in zip(*value_columns):
+            yield fill(*values)
@@ -22,6 +22,21 @@ Constants:
     DO_NOTHING:
         A core action used in PB2 Triggers that represents doing nothing.
 
+Functions:
+    field_names(obj_type) -> tuple:
+        Returns the names of all public fields of a slotted entity class, base class fields first.
+
+    iter_fields(entity) -> Iterator[tuple]:
+        Yields (name, value) of every assigned field of an entity.
+
+    referenced_uid(value):
+        Returns the uid an object reference points to, None when unset.
+
+Note:
+    All entities use __slots__ instead of a per-instance __dict__, so only the declared fields
+    can be assigned. Map objects and images also have a private _xml slot, used by
+    DataInterfaces.MapSerializer to cache their XML fragment.
+
 Usage Example:
     # Import the classes and constant
     from game_entities import (
@@ -41,6 +56,33 @@ Usage Example:
     # Use the DO_NOTHING action
     trigger_action = DO_NOTHING
 """
+from typing import Iterator
+
+_field_names = {}
+
+
+def field_names(obj_type) -> tuple:
+    names = _field_names.get(obj_type)
+    if names is None:
+        names = []
+        for cls in reversed(obj_type.__mro__):
+            for name in cls.__dict__.get("__slots__", ()):
+                if name not in names and not name.startswith("_"):
+                    names.append(name)
+        names = _field_names[obj_type] = tuple(names)
+    return names
+
+
+def iter_fields(entity) -> Iterator[tuple]:
+    for name in field_names(type(entity)):
+        if hasattr(entity, name):
+            yield name, getattr(entity, name)
+
+
+def referenced_uid(value):
+    # Object references are uids, or map objects given instead of their uid, "-1" when unset
+    value = getattr(value, "uid", value)
+    return None if value == "-1" else value
 
 
 class NamelessMapObjectEntity:
@@ -51,13 +93,14 @@ class NamelessMapObjectEntity:
         x (int): The X-coordinate of the map object.
         y (int): The Y-coordinate of the map object.
     """
+    __slots__ = ("x", "y", "_xml")
 
     def __init__(self, x=0, y=0):
         self.x = x
         self.y = y
 
     def print_all_fields(self):
-        print(", ".join([f"{key}: {value}" for key, value in self.__dict__.items()]))
+        print(", ".join([f"{key}: {value}" for key, value in iter_fields(self)]))
 
 
 class ImageEntity:
@@ -69,6 +112,7 @@ class ImageEntity:
         height (int): The height of the image.
         id (int): The ID of the image.
     """
+    __slots__ = ("width", "height", "id", "_xml")
 
     def __init__(self, width=0, height=0, id=0):
         self.width = width
@@ -76,7 +120,7 @@ class ImageEntity:
         self.id = id
 
     def print_all_fields(self):
-        print(", ".join([f"{key}: {value}" for key, value in self.__dict__.items()]))
+        print(", ".join([f"{key}: {value}" for key, value in iter_fields(self)]))
 
 
 class NamedMapObjectEntity(NamelessMapObjectEntity):
@@ -88,13 +132,14 @@ class NamedMapObjectEntity(NamelessMapObjectEntity):
         y (int): The Y-coordinate of the map object.
         uid (str): The unique identifier of the map object.
     """
+    __slots__ = ("uid",)
 
     def __init__(self, x=0, y=0, uid=""):
         super().__init__(x, y)
         self.uid = uid
 
     def print_all_fields(self):
-        print(", ".join([f"{key}: {value}" for key, value in self.__dict__.items()]))
+        print(", ".join([f"{key}: {value}" for key, value in iter_fields(self)]))
 
 
 class TriggersActionEntity:
@@ -105,6 +150,7 @@ class TriggersActionEntity:
         opID (int): The operation ID of the action.
         args (list): The list of arguments for the action.
     """
+    __slots__ = ("opID", "args")
 
     def __init__(self, opID=0, args=None):
         if args is None:
@@ -0,0 +1,236 @@
+"""
+Instrumentation Module
+
+This module provides opt-in timing spans and counters for the loading and dumping paths of Map and MapIO.
+Nothing is measured until a hook is registered: span() then hands out a shared no-op context manager and count()
+returns at once, so the instrumented code pays one attribute check per call site. Call sites are per file or per
+object type, never per object.
+
+Spans:
+    MapIO.read_file:       MapIO.read_file_async, attributes: file.
+    MapIO.write_file:      MapIO.write_to_file_async and MapIO.dump_map_async, attributes: file.
+    MapIO.load_binary:     MapIO.load_binary, attributes: file.
+    MapIO.save_binary:     MapIO.save_binary, attributes: file.
+    MapIO.stream_map:      MapIO.stream_map_from_file_async, attributes: file.
+    Map.fromstring:        Parsing of the XML text into an element tree, attributes: chars.
+    Map.parse_object:      Building the objects of one type from their elements, attributes: type, objects.
+    Map.to_xml:            Serializing the objects of one type, attributes: type, objects.
+
+Counters:
+    bytes_read, bytes_written:      Per file, attributes: file.
+    objects_loaded, objects_dumped: Per object type, attributes: type.
+
+Classes:
+    InstrumentationHook:
+        Base class of hooks, receives every finished span and every counter increment.
+
+    CallbackHook:
+        A hook calling plain functions.
+
+    Recorder:
+        A hook summing span durations and counters, with a text report.
+
+Functions:
+    add_hook(hook), remove_hook(hook):
+        Registers or unregisters a hook.
+
+    instrumented(hook):
+        Context manager registering a hook for the duration of a block.
+
+    span(name, **attributes):
+        Context manager timing a block and reporting it to the hooks.
+
+    count(name, value, **attributes):
+        Reports a counter increment to the hooks.
+
+    is_enabled() -> bool:
+        True while at least one hook is registered.
+
+Usage Example:
+    from DataInterfaces.Instrumentation import Recorder, instrumented
+
+    recorder = Recorder()
+    with instrumented(recorder):
+        map_instance = await MapIO.load_map_from_file_async("map.xml")
+        await MapIO.dump_map_async(map_instance, "out.xml")
+    print(recorder.report())
+"""
+from contextlib import contextmanager
+from threading import Lock
+from time import perf_counter
+from typing import Callable, Optional
+
+# Registered hooks, replaced as a whole so that reporting never sees a list being modified
+_hooks = ()
+_hooks_lock = Lock()
+
+
+class InstrumentationHook:
+    """
+    Base class of hooks, receives every finished span and every counter increment.
+
+    Methods:
+        on_span(name, seconds, attributes): Called when a span ends, also when its block raised.
+        on_count(name, value, attributes): Called for every counter increment.
+    """
+
+    def on_span(self, name: str, seconds: float, attributes: dict):
+        pass
+
+    def on_count(self, name: str, value: int, attributes: dict):
+        pass
+
+
+class CallbackHook(InstrumentationHook):
+    """
+    A hook calling plain functions.
+
+    Attributes:
+        span_callback: Called as span_callback(name, seconds, attributes), None to ignore spans.
+        count_callback: Called as count_callback(name, value, attributes), None to ignore counters.
+    """
+
+    def __init__(self, span_callback: Optional[Callable] = None, count_callback: Optional[Callable] = None):
+        self.span_callback = span_callback
+        self.count_callback = count_callback
+
+    def on_span(self, name: str, seconds: float, attributes: dict):
+        if self.span_callback is not None:
+            self.span_callback(name, seconds, attributes)
+
+    def on_count(self, name: str, value: int, attributes: dict):
+        if self.count_callback is not None:
+            self.count_callback(name, value, attributes)
+
+
+class Recorder(InstrumentationHook):
+    """
+    A hook summing span durations and counters, with a text report.
+
+    Spans and counters are keyed by their name and, when they have one, their type attribute.
+
+    Attributes:
+        spans (dict): Key -> [number of spans, total seconds].
+        counters (dict): Key -> total value.
+
+    Methods:
+        report(): Multi-line text of the spans and counters, slowest spans first.
+        clear(): Forgets everything recorded.
+    """
+
+    def __init__(self):
+        self.spans = {}
+        self.counters = {}
+        self._lock = Lock()
+
+    @staticmethod
+    def key(name: str, attributes: dict) -> str:
+        obj_type = attributes.get("type")
+        return name if obj_type is None else f"{name}[{obj_type}]"
+
+    def on_span(self, name: str, seconds: float, attributes: dict):
+        key = self.key(name, attributes)
+        with self._lock:
+            totals = self.spans.get(key)
+            if totals is None:
+                self.spans[key] = [1, seconds]
+            else:
+                totals[0] += 1
+                totals[1] += seconds
+
+    def on_count(self, name: str, value: int, attributes: dict):
+        key = self.key(name, attributes)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def clear(self):
+        with self._lock:
+            self.spans.clear()
+            self.counters.clear()
+
+    def report(self) -> str:
+        with self._lock:
+            spans = sorted(self.spans.items(), key=lambda item: -item[1][1])
+            counters = sorted(self.counters.items())
+        lines = [f"{key:<36} {calls:7d} x {seconds * 1000:11.3f} ms" for key, (calls, seconds) in spans]
+        lines.extend(f"{key:<36} {value:21d}" for key, value in counters)
+        return "\n".join(lines)
+
+
+class _Span:
+    # Times a block for the hooks registered when it was opened
+
+    __slots__ = ("name", "attributes", "hooks", "started")
+
+    def __init__(self, name: str, attributes: dict, hooks: tuple):
+        self.name = name
+        self.attributes = attributes
+        self.hooks = hooks
+        self.started = 0.0
+
+    def __enter__(self):
+        self.started = perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        seconds = perf_counter() - self.started
+        if exc_type is not None:
+            self.attributes["error"] = exc_type.__name__
+        for hook in self.hooks:
+            hook.on_span(self.name, seconds, self.attributes)
+
+
+class _NullSpan:
+    # Shared by every span opened while no hook is registered
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        return None
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def is_enabled() -> bool:
+    return bool(_hooks)
+
+
+def add_hook(hook: InstrumentationHook):
+    global _hooks
+    with _hooks_lock:
+        if hook not in _hooks:
+            _hooks = _hooks + (hook,)
+
+
+def remove_hook(hook: InstrumentationHook):
+    global _hooks
+    with _hooks_lock:
+        _hooks = tuple(registered for registered in _hooks if registered is not hook)
+
+
+@contextmanager
+def instrumented(hook: InstrumentationHook):
+    add_hook(hook)
+    try:
+        yield hook
+    finally:
+        remove_hook(hook)
+
+
+def span(name: str, **attributes):
+    hooks = _hooks
+    if not hooks:
+        return _NULL_SPAN
+    return _Span(name, attributes, hooks)
+
+
+def count(name: str, value: int = 1, **attributes):
+    hooks = _hooks
+    if not hooks:
+        return
+    for hook in hooks:
+        hook.on_count(name, value, attributes)
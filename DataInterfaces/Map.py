@@ -1,16 +1,27 @@
-from asyncio import gather
+from math import inf
 from traceback import format_exc
-from typing import Union
+from typing import Optional, Union
 from xml.etree.ElementTree import fromstring
 
-from DataInterfaces.Entity import TriggersActionEntity
+from DataInterfaces import Instrumentation
+from DataInterfaces.ColumnStore import ColumnStore, COLUMNAR_TYPES, map_object_type
+from DataInterfaces.Entity import TriggersActionEntity, NamedMapObjectEntity
 from DataInterfaces.MapObjectSpecials import EngineMarks
 from DataInterfaces.MapObjects import Door, Region, Timer, Vehicle, Box, Water, Decor, Song, Lamp, Barrel, Gun, \
     Pushf, Bg, Enemy, Player, Inf, Trigger, Image
+from DataInterfaces.MapBinary import from_binary, to_binary
+from DataInterfaces.MapDiff import MapDiff, apply_patch, diff_maps
+from DataInterfaces.MapTransform import transform_map
+from DataInterfaces.MapSerializer import objects_to_xml, iter_objects_xml
+from DataInterfaces.SpatialIndex import SpatialGrid
+from DataInterfaces.TriggerOptimizer import TriggerOptimizationReport, optimize_triggers
+
+# Map object types with x, y, w and h, kept in the spatial index
+SPATIAL_TYPES = (Box, Region, Door, Water, Pushf, Bg)
 
 
 class Map:
-    def __init__(self):
+    def __init__(self, check_duplicate_uids=False, spatial_cell_size=256, columnar_types=(), cache_xml=False):
         self.objects = {
             Player: [],
             Pushf: [],
@@ -31,10 +42,147 @@ class Map:
             Barrel: [],
             Enemy: [],
         }
+        # Raise on insertion of an object whose uid is already used by the same type
+        self.check_duplicate_uids = check_duplicate_uids
+        # uid -> object, per type and map-wide, the first inserted object wins on duplicates
+        self.uid_index = {obj_type: {} for obj_type in self.objects}
+        self.global_uid_index = {}
+        # Uids ever given to more than one named object, the only ones to look up again when their indexed
+        # object is removed
+        self.duplicated_uids = set()
+        # Built on the first spatial query, then kept up to date by add_object/remove_object/move_object.
+        # Objects whose x, y, w or h are assigned directly are missed by queries of their new area until
+        # update_object_bounds is called, see DataInterfaces.SpatialIndex
+        self.spatial_cell_size = spatial_cell_size
+        self._spatial_index = None
+        # Keep the XML fragment of every dumped object, later dumps only serialize the objects changed since
+        self.cache_xml = cache_xml
+        if columnar_types:
+            self.use_columnar_storage(columnar_types)
+
+    def use_columnar_storage(self, types: tuple = COLUMNAR_TYPES):
+        # Moves the objects of the given types into column stores, objects are then handed out as views
+        for obj_type in types:
+            items = self.objects[obj_type]
+            if not isinstance(items, ColumnStore):
+                self.objects[obj_type] = ColumnStore(obj_type, items)
+        self.rebuild_uid_index()
+        self.rebuild_spatial_index()
+
+    @property
+    def spatial_index(self) -> SpatialGrid:
+        if self._spatial_index is None:
+            self._spatial_index = SpatialGrid(
+                self.spatial_cell_size,
+                (item for obj_type in SPATIAL_TYPES for item in self.objects[obj_type]))
+        return self._spatial_index
+
+    def add_object(self, obj):
+        obj_type = map_object_type(obj)
+        named = isinstance(obj, NamedMapObjectEntity)
+        # A rejected object is not inserted anywhere
+        if named and self.check_duplicate_uids and obj.uid in self.uid_index[obj_type]:
+            raise ValueError(f"{obj_type.__name__} with name '{obj.uid}' already exists.")
+        items = self.objects[obj_type]
+        if isinstance(items, ColumnStore):
+            obj = items.append(obj)
+        else:
+            items.append(obj)
+        if named:
+            if obj.uid in self.global_uid_index:
+                self.duplicated_uids.add(obj.uid)
+            else:
+                self.global_uid_index[obj.uid] = obj
+            self.uid_index[obj_type].setdefault(obj.uid, obj)
+        if self._spatial_index is not None and obj_type in SPATIAL_TYPES:
+            self._spatial_index.insert(obj)
+        return obj
+
+    def remove_object(self, obj):
+        obj_type = map_object_type(obj)
+        self.objects[obj_type].remove(obj)
+        if self._spatial_index is not None and obj in self._spatial_index:
+            self._spatial_index.remove(obj)
+        if isinstance(obj, NamedMapObjectEntity):
+            type_index = self.uid_index[obj_type]
+            if type_index.get(obj.uid) == obj:
+                del type_index[obj.uid]
+            if self.global_uid_index.get(obj.uid) == obj:
+                del self.global_uid_index[obj.uid]
+            if obj.uid in self.duplicated_uids:
+                self.reindex_uid(obj.uid)
+
+    def remove_object_by_uid(self, obj_type, name: str):
+        obj = self.find_object_by_uid(obj_type, name)
+        if obj is not None:
+            self.remove_object(obj)
+        return obj
+
+    def rebuild_uid_index(self):
+        # Needed only after self.objects lists or uids were modified directly
+        self.uid_index = {obj_type: {} for obj_type in self.objects}
+        self.global_uid_index = {}
+        self.duplicated_uids = set()
+        for obj_type, items in self.objects.items():
+            type_index = self.uid_index[obj_type]
+            for item in items:
+                if isinstance(item, NamedMapObjectEntity):
+                    if item.uid in self.global_uid_index:
+                        self.duplicated_uids.add(item.uid)
+                    else:
+                        self.global_uid_index[item.uid] = item
+                    type_index.setdefault(item.uid, item)
+
+    def reindex_uid(self, uid):
+        # Points the index entries of a duplicated uid at the first remaining objects, as rebuild_uid_index would
+        remaining = 0
+        for obj_type, items in self.objects.items():
+            if not issubclass(obj_type, NamedMapObjectEntity):
+                continue
+            for item in items:
+                if item.uid == uid:
+                    self.uid_index[obj_type].setdefault(uid, item)
+                    self.global_uid_index.setdefault(uid, item)
+                    remaining += 1
+        if remaining < 2:
+            self.duplicated_uids.discard(uid)
+
+    def move_object(self, obj, x=None, y=None, w=None, h=None):
+        if x is not None:
+            obj.x = x
+        if y is not None:
+            obj.y = y
+        if w is not None:
+            obj.w = w
+        if h is not None:
+            obj.h = h
+        self.update_object_bounds(obj)
+
+    def rebuild_spatial_index(self):
+        # Needed only after self.objects lists were modified directly
+        self._spatial_index = None
+
+    def update_object_bounds(self, obj):
+        # Call after editing x, y, w or h of an object directly
+        if self._spatial_index is not None and map_object_type(obj) in SPATIAL_TYPES:
+            self._spatial_index.update(obj)
+
+    def query_rect(self, x, y, w, h, types: tuple = SPATIAL_TYPES) -> list:
+        return self.spatial_index.query_rect(x, y, w, h, types)
+
+    def query_point(self, x, y, types: tuple = SPATIAL_TYPES) -> list:
+        return self.spatial_index.query_point(x, y, types)
+
+    def nearest(self, x, y, types: tuple = SPATIAL_TYPES, max_distance: float = inf):
+        return self.spatial_index.nearest(x, y, types, max_distance)
+
+    def transform(self, translate: tuple = None, scale=None, origin: tuple = (0, 0), mirror: float = None,
+                  crop: tuple = None, types: tuple = None):
+        # Applied in the order translate, scale (around origin), mirror (around the vertical line x = mirror), crop
+        transform_map(self, translate, scale, origin, mirror, crop, types)
 
     def new_object(self, obj_type, **kwargs):
-        result = obj_type(**kwargs)
-        self.objects[obj_type].append(result)
+        return self.add_object(obj_type(**kwargs))
 
     def new_movable(self, name, x, y, w, h, tarx, tary=0, speed=10, visible=True, moving=False, attach=None):
         self.new_object(Door, name=name, x=x, y=y, w=w, h=h, tarx=tarx, tary=tary, speed=speed, visible=visible,
@@ -94,300 +242,163 @@ class Map:
         self.new_object(Inf, x=x, y=y, modifier=modifier, parameter=parameter)
 
     def parse_trigger(self, trigger_elem):
-        trigger = Trigger()
-
-        if trigger_elem.get("uid") is None:
-            raise ValueError("Trigger name cannot be empty or missing!")
-        trigger.uid = str(trigger_elem.get("uid")) or ""
-
-        trigger.x = int(trigger_elem.get("x")) if trigger_elem.get("x") is not None else 0
-        trigger.y = int(trigger_elem.get("y")) if trigger_elem.get("y") is not None else 0
-        trigger.enabled = trigger_elem.get("enabled") == "true"
-        trigger.maxcalls = int(trigger_elem.get("maxcalls")) if trigger_elem.get("maxcalls") is not None else 0
-
-        for action_elem in trigger_elem.iter("action"):
-            action = TriggersActionEntity()
-            action.opID = int(action_elem.get("opID")) if action_elem.get("opID") is not None else 0
-            action.args = action_elem.get("args").split(",") if action_elem.get("args") else ["0", "0"]
-            trigger.actions.append(action)
-
-        self.objects[Trigger].append(trigger)
+        self.add_object(parse_named_element(Trigger, "Trigger", trigger_elem))
 
     def parse_timer(self, timer_elem):
-        timer = Timer()
-
-        timer_name = timer_elem.get("uid")
-        if timer_name is None:
-            raise ValueError("Timer name cannot be empty or missing!")
-        timer.uid = str(timer_name)
-
-        timer.x = int(timer_elem.get("x")) if timer_elem.get("x") is not None else 0
-        timer.y = int(timer_elem.get("y")) if timer_elem.get("y") is not None else 0
-        timer.enabled = bool(timer_elem.get("enabled") == "true")
-        timer.maxcalls = int(timer_elem.get("maxcalls")) if timer_elem.get("maxcalls") is not None else 0
-        timer.target = timer_elem.get("target") or ""
-        timer.delay = float(timer_elem.get("delay")) if timer_elem.get("delay") is not None else 0.0
-
-        self.objects[Timer].append(timer)
+        self.add_object(parse_named_element(Timer, "Timer", timer_elem))
 
     def parse_enemy(self, enemy_elem):
-        enemy_name = enemy_elem.get("uid")
-        if enemy_name is None:
-            raise ValueError("Enemy name cannot be empty or missing!")
-        enemy = parse_map_object(Enemy,
-                                 **fill_character_kwargs(enemy_name, enemy_elem))
-        self.objects[Enemy].append(enemy)
+        self.add_object(parse_named_element(Enemy, "Enemy", enemy_elem))
 
     def parse_player(self, player_elem):
-        player_name = player_elem.get("uid")
-        if player_name is None:
-            raise ValueError("Player name cannot be empty or missing!")
-        player = parse_map_object(Player,
-                                  **fill_character_kwargs(player_name, player_elem))
-        self.objects[Player].append(player)
+        self.add_object(parse_named_element(Player, "Player", player_elem))
 
     def parse_door(self, door_elem):
-        door = Door()
-
-        door_name = str(door_elem.get("uid"))
-        if door_name is None:
-            raise ValueError("Door name cannot be empty or missing!")
-        door.uid = str(door_name)
-
-        door.w = int(door_elem.get("w")) if door_elem.get("w") is not None else 0
-        door.h = int(door_elem.get("h")) if door_elem.get("h") is not None else 0
-        door.y = int(door_elem.get("y")) if door_elem.get("y") is not None else 0
-        door.x = int(door_elem.get("x")) if door_elem.get("x") is not None else 0
-        door.maxspeed = float(door_elem.get("maxspeed")) if door_elem.get("maxspeed") is not None else 0.0
-        door.vis = bool(door_elem.get("vis") == "true")
-        door.attach = str(door_elem.get("attach")) if door_elem.get("attach") is not None else "-1"
-
-        self.objects[Door].append(door)
+        self.add_object(parse_named_element(Door, "Door", door_elem))
 
     def parse_decoration(self, decoration_elem):
-        decoration = Decor()
-
-        decoration_name = decoration_elem.get("uid")
-        if decoration_name is None:
-            raise ValueError("Decoration name cannot be empty or missing!")
-        decoration.uid = str(decoration_name)
-
-        decoration.model = str(decoration_elem.get("model"))
-
-        decoration.x = int(decoration_elem.get("x")) if decoration_elem.get("x") is not None else 0
-        decoration.y = int(decoration_elem.get("y")) if decoration_elem.get("y") is not None else 0
-        decoration.f = str(decoration_elem.get("f")) or ""
-
-        decoration.r = float(decoration_elem.get("r")) if decoration_elem.get("r") is not None else 0.0
-        decoration.sx = float(decoration_elem.get("sx")) if decoration_elem.get("sx") is not None else 0.0
-        decoration.sy = float(decoration_elem.get("sy")) if decoration_elem.get("sy") is not None else 0.0
-        decoration.u = float(decoration_elem.get("u")) if decoration_elem.get("u") is not None else 0.0
-        decoration.v = float(decoration_elem.get("v")) if decoration_elem.get("v") is not None else 0.0
-
-        decoration.attach = str(decoration_elem.get("attach")) if decoration_elem.get("attach") is not None else "-1"
-
-        self.objects[Decor].append(decoration)
+        self.add_object(parse_named_element(Decor, "Decoration", decoration_elem))
 
     def parse_region(self, region_elem):
-        region = Region()
-
-        region_name = region_elem.get("uid")
-        if region_name is None:
-            raise ValueError("Region name cannot be empty or missing!")
-        region.uid = str(region_name)
-
-        region.x = int(region_elem.get("x")) if region_elem.get("x") is not None else 0
-        region.y = int(region_elem.get("y")) if region_elem.get("y") is not None else 0
-        region.h = int(region_elem.get("h")) if region_elem.get("h") is not None else 0
-        region.w = int(region_elem.get("w")) if region_elem.get("w") is not None else 0
-
-        region.use_on = int(region_elem.get("use_on")) if region_elem.get("use_on") is not None else 0
-        region.use_target = region_elem.get("use_target") if region_elem.get("use_target") is not None else ""
-
-        region.attach = str(region_elem.get("attach")) if region_elem.get("attach") is not None else "-1"
-
-        self.objects[Region].append(region)
+        self.add_object(parse_named_element(Region, "Region", region_elem))
 
     def parse_song(self, song_elem):
-        song = Song()
-
-        song_name = song_elem.get("uid")
-        if song_name is None:
-            raise ValueError("Song name cannot be empty or missing!")
-        song.uid = str(song_name)
-
-        song.x = int(song_elem.get("x")) if song_elem.get("x") is not None else 0
-        song.y = int(song_elem.get("y")) if song_elem.get("y") is not None else 0
-
-        song.loop = bool(song_elem.get("loop") == "true")
-
-        song.url = str(song_elem.get("url"))
-        song.volume = float(song_elem.get("volume")) if song_elem.get("volume") is not None else 0.0
-
-        song.callback = str(song_elem.get("callback"))
-
-        self.objects[Song].append(song)
+        self.add_object(parse_named_element(Song, "Song", song_elem))
 
     def parse_lamp(self, lamp_elem):
-        lamp = Lamp()
-
-        lamp_name = lamp_elem.get("uid")
-        if lamp_name is None:
-            raise ValueError("Lamp name cannot be empty or missing!")
-        lamp.uid = str(lamp_name)
-
-        lamp.x = int(lamp_elem.get("x")) if lamp_elem.get("x") is not None else 0
-        lamp.y = int(lamp_elem.get("y")) if lamp_elem.get("y") is not None else 0
-
-        lamp.power = float(lamp_elem.get("power")) if lamp_elem.get("power") is not None else 0.0
-
-        lamp.flare = bool(lamp_elem.get("flare") == "true")
-
-        self.objects[Lamp].append(lamp)
+        self.add_object(parse_named_element(Lamp, "Lamp", lamp_elem))
 
     def parse_barrel(self, barrel_elem):
-        barrel = Barrel()
-
-        barrel_name = barrel_elem.get("uid")
-        if barrel_name is None:
-            raise ValueError("Barrel name cannot be empty or missing!")
-        barrel.uid = str(barrel_name)
-
-        barrel.x = int(barrel_elem.get("x")) if barrel_elem.get("x") is not None else 0
-        barrel.y = int(barrel_elem.get("y")) if barrel_elem.get("y") is not None else 0
-        barrel.tox = float(barrel_elem.get("tox")) if barrel_elem.get("tox") is not None else 0.0
-        barrel.toy = float(barrel_elem.get("toy")) if barrel_elem.get("toy") is not None else 0.0
-
-        barrel.model = str(barrel_elem.get("model")) if barrel_elem.get("model") is not None else "bar_orange"
-
-        self.objects[Barrel].append(barrel)
+        self.add_object(parse_named_element(Barrel, "Barrel", barrel_elem))
 
     def parse_gun(self, gun_elem):
-        gun = Gun()
-
-        weapon_name = gun_elem.get("uid")
-        if weapon_name is None:
-            raise ValueError("Gun name cannot be empty or missing!")
-        gun.uid = str(weapon_name)
-
-        gun.x = int(gun_elem.get("x")) if gun_elem.get("x") is not None else 0
-        gun.y = int(gun_elem.get("y")) if gun_elem.get("y") is not None else 0
-        gun.command = int(gun_elem.get("command")) if gun_elem.get("command") is not None else 0
-        gun.upg = int(gun_elem.get("upg")) if gun_elem.get("upg") is not None else 0
-
-        gun.model = str(gun_elem.get("model"))
-
-        self.objects[Gun].append(gun)
+        self.add_object(parse_named_element(Gun, "Gun", gun_elem))
 
     def parse_pusher(self, pusher_elem):
-        pusher = Pushf()
-
-        pusher_name = pusher_elem.get("uid")
-        if pusher_name is None:
-            raise ValueError("Pusher name cannot be empty or missing!")
-        pusher.uid = str(pusher_name)
-
-        pusher.x = int(pusher_elem.get("x")) if pusher_elem.get("x") is not None else 0
-        pusher.y = int(pusher_elem.get("y")) if pusher_elem.get("y") is not None else 0
-        pusher.h = int(pusher_elem.get("h")) if pusher_elem.get("h") is not None else 0
-        pusher.w = int(pusher_elem.get("w")) if pusher_elem.get("w") is not None else 0
-        pusher.tox = float(pusher_elem.get("tox")) if pusher_elem.get("tox") is not None else 0.0
-        pusher.toy = float(pusher_elem.get("toy")) if pusher_elem.get("toy") is not None else 0.0
-        pusher.attach = str(pusher_elem.get("attach")) if pusher_elem.get("attach") is not None else "-1"
-        pusher.damage = float(pusher_elem.get("damage")) if pusher_elem.get("damage") is not None else 0.0
-        pusher.stab = float(pusher_elem.get("stab")) if pusher_elem.get("stab") is not None else 0.0
-
-        self.objects[Pushf].append(pusher)
+        self.add_object(parse_named_element(Pushf, "Pusher", pusher_elem))
 
     def parse_vehicle(self, vehicle_elem):
-        vehicle = Vehicle()
-
-        vehicle_name = vehicle_elem.get("uid")
-        if vehicle_name is None:
-            raise ValueError("Vehicle name cannot be empty or missing!")
-        vehicle.uid = str(vehicle_name)
-
-        vehicle.x = int(vehicle_elem.get("x")) if vehicle_elem.get("x") is not None else 0
-        vehicle.y = int(vehicle_elem.get("y")) if vehicle_elem.get("y") is not None else 0
-        vehicle.side = int(vehicle_elem.get("side")) if vehicle_elem.get("side") is not None else 0
+        self.add_object(parse_named_element(Vehicle, "Vehicle", vehicle_elem))
 
-        vehicle.model = str(vehicle_elem.get("model")) if vehicle_elem.get("model") is not None else "veh_jeep"
-
-        vehicle.hpPercent = float(vehicle_elem.get("hpp")) if vehicle_elem.get("hpp") is not None else 0.0
-        vehicle.tox = float(vehicle_elem.get("tox")) if vehicle_elem.get("tox") is not None else 0.0
-        vehicle.toy = float(vehicle_elem.get("toy")) if vehicle_elem.get("toy") is not None else 0.0
+    def parse_water(self, water_elem):
+        self.add_object(get_converter(Water)(water_elem))
 
-        self.objects[Vehicle].append(vehicle)
+    def parse_box(self, box_elem):
+        self.add_object(get_converter(Box)(box_elem))
 
-    def parse_water(self, water_elem):
-        water_name = water_elem.get("uid")
-        if water_name is None:
-            raise ValueError("Water name cannot be empty or missing!")
-        water = parse_map_object(Water,
-                                 **fill_water_object_kwargs(water_name, water_elem))
+    def parse_background(self, bg_elem):
+        self.add_object(get_converter(Bg)(bg_elem))
 
-        self.objects[Water].append(water)
+    def parse_engine_mark(self, inf_elem):
+        self.add_object(get_converter(Inf)(inf_elem))
 
-    def parse_box(self, box_elem):
-        self.objects[Box].append(parse_map_object(Box, **fill_box_object_kwargs(box_elem)))
+    def parse_image(self, image_elem):
+        self.add_object(get_converter(Image)(image_elem))
 
     def parse_object(self, elem, obj_type):
         try:
-            kwargs = {k: v for k, v in elem.attrib.items() if k != "type"}
-            self.new_object(obj_type, **kwargs)
-        except KeyError as e:
+            self.add_object(get_converter(obj_type)(elem))
+        except (KeyError, ValueError) as e:
             print(f'Parsing error: {format_exc()}')
-            # key = str(e)  # Get the key that caused the KeyError
-            key_attempted = e.args[0]  # Get the specific key that was attempted
-            value = elem.attrib.get(key_attempted, "N/A")  # Get the corresponding value or "N/A"
-            print(f"Error creating object of type {obj_type}: KeyError for key '{key_attempted}' with value '{value}'")
+            print(f"Error creating object of type {obj_type}: {e}")
             print(f"Element attributes: {elem.attrib}")
 
+    def element_parsers(self) -> dict:
+        # Tag -> bound parse_* method, the single dispatch point for every XML element
+        return {element_tag(obj_type): getattr(self, method_name) for obj_type, method_name in ELEMENT_PARSERS.items()}
+
     def from_xml(self, xml_string: str):
-        root = fromstring(xml_string)
-        for object_type in self.objects.keys():
-            for item in root.iter(object_type.__name__.lower()):
-                self.parse_object(item, object_type)
+        # One walk over the tree groups the elements by tag, then each type is parsed in one step, timed as a
+        # Map.parse_object span while DataInterfaces.Instrumentation has a hook. Types are parsed in the order of
+        # self.objects, so duplicated uids resolve in the map-wide index as in rebuild_uid_index.
+        with Instrumentation.span("Map.fromstring", chars=len(xml_string)):
+            root = fromstring(xml_string)
+        parsers = self.element_parsers()
+        elements = {tag: [] for tag in parsers}
+        for item in root.iter():
+            group = elements.get(item.tag)
+            if group is not None:
+                group.append(item)
+        for obj_type in ELEMENT_PARSERS:
+            tag = element_tag(obj_type)
+            items = elements[tag]
+            if items:
+                parser = parsers[tag]
+                with Instrumentation.span("Map.parse_object", type=obj_type.__name__, objects=len(items)):
+                    for item in items:
+                        parser(item)
+                Instrumentation.count("objects_loaded", len(items), type=obj_type.__name__)
+
+    def from_binary(self, data, types: tuple = None):
+        # Fills the map from the binary format of DataInterfaces.MapBinary, optionally with only some types
+        from_binary(data, self, types)
+
+    def to_binary(self) -> bytes:
+        return to_binary(self)
+
+    def diff(self, other: "Map") -> MapDiff:
+        # Objects added, removed and modified from self to other, see DataInterfaces.MapDiff
+        return diff_maps(self, other)
+
+    def apply_patch(self, patch: MapDiff):
+        apply_patch(self, patch)
+
+    def optimize_triggers(self, roots=()) -> TriggerOptimizationReport:
+        # Removes dead triggers and timers, no-ops and chained triggers, see DataInterfaces.TriggerOptimizer
+        return optimize_triggers(self, roots)
 
     def find_trigger_by_name(self, name: str) -> Trigger:
-        return find_object_by_name(self.objects[Trigger], "Trigger", name)
+        return self.get_object_by_uid(Trigger, "Trigger", name)
 
     def find_movable_by_name(self, name: str) -> Door:
-        return find_object_by_name(self.objects[Door], "Door", name)
+        return self.get_object_by_uid(Door, "Door", name)
 
     def find_region_by_name(self, name: str) -> Region:
-        return find_object_by_name(self.objects[Region], "Region", name)
+        return self.get_object_by_uid(Region, "Region", name)
 
     def find_pusher_by_name(self, name: str) -> Pushf:
-        return find_object_by_name(self.objects[Pushf], "Pusher", name)
+        return self.get_object_by_uid(Pushf, "Pusher", name)
 
     def find_enemy_by_name(self, name: str) -> Enemy:
-        return find_object_by_name(self.objects[Enemy], "Enemy", name)
+        return self.get_object_by_uid(Enemy, "Enemy", name)
 
     def find_player_by_name(self, name: str) -> Player:
-        return find_object_by_name(self.objects[Player], "Player", name)
+        return self.get_object_by_uid(Player, "Player", name)
 
     def find_vehicle_by_name(self, name: str) -> Vehicle:
-        return find_object_by_name(self.objects[Vehicle], "Vehicle", name)
+        return self.get_object_by_uid(Vehicle, "Vehicle", name)
 
     def find_decoration_by_name(self, name: str) -> Decor:
-        return find_object_by_name(self.objects[Decor], "Decoration", name)
+        return self.get_object_by_uid(Decor, "Decoration", name)
 
     def find_gun_by_name(self, name: str) -> Gun:
-        return find_object_by_name(self.objects[Gun], "Gun", name)
+        return self.get_object_by_uid(Gun, "Gun", name)
 
-    async def to_xml(self) -> str:
-        # Convert the Map object to an XML string representation
-        tasks = []
+    def find_object_by_uid(self, obj_type, name: str) -> Optional[NamedMapObjectEntity]:
+        # None when no object of obj_type has that uid, the index is kept up to date by add_object/remove_object
+        return self.uid_index[obj_type].get(name)
 
-        for object_type, items in self.objects.items():
-            for item in items:
-                tasks.append(generate_item_xml(item))  # , object_type.__name__.lower()))
+    def get_object_by_uid(self, obj_type, obj_type_str: str, name: str) -> NamedMapObjectEntity:
+        # Same lookup as find_object_by_uid, raising like find_object_by_name when nothing has that uid
+        obj = self.uid_index[obj_type].get(name)
+        if obj is None:
+            raise Exception(f"{obj_type_str} with name '{name}' not found.")
+        return obj
+
+    def find_any_by_uid(self, name: str) -> Optional[NamedMapObjectEntity]:
+        return self.global_uid_index.get(name)
 
-        results = await gather(*tasks)
-        xml_content = ''.join(results)
+    def iter_xml(self):
+        # XML fragments of every object, in dump order
+        return iter_objects_xml(self.objects, self.cache_xml)
 
-        return xml_content
+    def to_xml_string(self) -> str:
+        # Convert the Map object to an XML string representation
+        return objects_to_xml(self.objects, self.cache_xml)
+
+    async def to_xml(self) -> str:
+        # Async wrapper kept for compatibility, serialization itself is synchronous
+        return self.to_xml_string()
 
 
 def find_object_by_name(obj_list, obj_type_str, name):
@@ -397,101 +408,175 @@ def find_object_by_name(obj_list, obj_type_str, name):
     raise Exception(f"{obj_type_str} with name '{name}' not found.")
 
 
-# Example of the generate_item_xml function (you need to define this function)
-async def generate_item_xml(item):  # , field_name):
-    return f'{item.to_xml}'
-    # Logic to generate XML for the given item
-    # Return the XML string representation of the item
-    # return f'<{field_name}>{item.to_xml}</{field_name}>'
-
-
-def parse_map_object(map_object: Union[type(Player), type(Enemy), type(Water), type(Box)], **kwargs):
-    instance = map_object()
-    for key, value in kwargs.items():
-        if hasattr(instance, key):
-            setattr(instance, key, value)
-    return instance
-
-
-def fill_nameless_map_object_kwargs(ET_nameless_map_object) -> dict:
-    return {
-        "x": (int(ET_nameless_map_object.get("x")) if ET_nameless_map_object.get("x") is not None else 0),
-        "y": (int(ET_nameless_map_object.get("y")) if ET_nameless_map_object.get("y") is not None else 0)
-    }
-
-
-def fill_named_map_object_kwargs(object_uid, ET_named_map_object) -> dict:
-    return {
-        **fill_nameless_map_object_kwargs(ET_named_map_object),
-        "uid": object_uid
-    }
-
-
-# Box Only
-def fill_box_object_kwargs(ET_box_object) -> dict:
-    return {
-        **fill_nameless_map_object_kwargs(ET_box_object),
-        "w": (int(ET_box_object.get("w")) if
-              ET_box_object.get("w") is not None else 0),
-        "h": (int(ET_box_object.get("h")) if
-              ET_box_object.get("h") is not None else 0),
-        "m": (int(ET_box_object.get("m")) if
-              ET_box_object.get("m") is not None else 0)
-    }
-
-
-# Water, Pusher, Door, Region Only
-def fill_named_scaleable_object_kwargs(object_uid,
-                                       ET_named_scaleable_map_object) -> dict:
-    return {
-        **fill_named_map_object_kwargs(object_uid, ET_named_scaleable_map_object),
-        "w": (int(ET_named_scaleable_map_object.get("w")) if
-              ET_named_scaleable_map_object.get("w") is not None else 0),
-        "h": (int(ET_named_scaleable_map_object.get("h")) if
-              ET_named_scaleable_map_object.get("h") is not None else 0)
-    }
-
-
-def fill_water_object_kwargs(water_uid,
-                             ET_water_object) -> dict:
-    return {
-        **fill_named_scaleable_object_kwargs(water_uid, ET_water_object),
-        "damage": (float(ET_water_object.get("damage"))
-                   if ET_water_object.get("damage") is not None else 0),
-        "friction": (ET_water_object.get("friction") == "true"
-                     if ET_water_object.get("friction") is not None else "false")
-    }
-
-
-# Pusher, Door, Region Only
-def fill_named_scaleable_attachable_object_kwargs(object_uid,
-                                                  ET_named_scaleable_attachable_map_object) -> dict:
-    return {
-        **fill_named_scaleable_object_kwargs(object_uid, ET_named_scaleable_attachable_map_object),
-        "attach": (str(ET_named_scaleable_attachable_map_object.get("attach"))
-                   if ET_named_scaleable_attachable_map_object.get("attach") is not None else "-1")
-    }
-
-
-def fill_character_kwargs(character_uid, ET_player_or_enemy_object) -> dict:
-    return {
-        **fill_named_map_object_kwargs(character_uid, ET_player_or_enemy_object),
-        "tox": (
-            float(ET_player_or_enemy_object.get("tox")) if ET_player_or_enemy_object.get("tox") is not None else 0.0),
-        "toy": (
-            float(ET_player_or_enemy_object.get("toy")) if ET_player_or_enemy_object.get("toy") is not None else 0.0),
-        "hea": (
-            float(ET_player_or_enemy_object.get("hea")) if ET_player_or_enemy_object.get("hea") is not None else 0.0),
-        "hmax": (float(ET_player_or_enemy_object.get("hmax")) if ET_player_or_enemy_object.get(
-            "hmax") is not None else 0.0),
-        "team": (
-            int(ET_player_or_enemy_object.get("team")) if ET_player_or_enemy_object.get("team") is not None else 0),
-        "side": (
-            int(ET_player_or_enemy_object.get("side")) if ET_player_or_enemy_object.get("side") is not None else 0),
-        "char": (
-            int(ET_player_or_enemy_object.get("char")) if ET_player_or_enemy_object.get("char") is not None else 0),
-        "botaction": (int(ET_player_or_enemy_object.get("botaction")) if ET_player_or_enemy_object.get(
-            "botaction") is not None else 0),
-        "ondeath": (str(ET_player_or_enemy_object.get("ondeath")) or "-1"),
-        "incar": (str(ET_player_or_enemy_object.get("incar")) or "-1")
-    }
+# Map object class -> name of the Map.parse_* method handling its element, see element_tag
+ELEMENT_PARSERS = {
+    Player: "parse_player",
+    Pushf: "parse_pusher",
+    Image: "parse_image",
+    Bg: "parse_background",
+    Water: "parse_water",
+    Box: "parse_box",
+    Door: "parse_door",
+    Decor: "parse_decoration",
+    Gun: "parse_gun",
+    Region: "parse_region",
+    Trigger: "parse_trigger",
+    Timer: "parse_timer",
+    Inf: "parse_engine_mark",
+    Vehicle: "parse_vehicle",
+    Song: "parse_song",
+    Lamp: "parse_lamp",
+    Barrel: "parse_barrel",
+    Enemy: "parse_enemy",
+}
+
+
+def element_tag(obj_type) -> str:
+    # The XML tag of a map object class is its lowercase name
+    return obj_type.__name__.lower()
+
+
+def to_number(value: str) -> Union[int, float, str]:
+    # Keeps integers as int so that dumping gives back the same text
+    try:
+        return int(value)
+    except ValueError:
+        try:
+            return float(value)
+        except ValueError:
+            return value
+
+
+def to_bool(value: str) -> bool:
+    return value == "true"
+
+
+_CHARACTER_FIELDS = {
+    "uid": ("uid", str), "x": ("x", to_number), "y": ("y", to_number),
+    "tox": ("tox", to_number), "toy": ("toy", to_number), "hea": ("hea", to_number), "hmax": ("hmax", to_number),
+    "team": ("team", to_number), "side": ("side", to_number), "char": ("char", to_number),
+    "botaction": ("botaction", to_number), "ondeath": ("ondeath", str), "incar": ("incar", str)
+}
+
+# XML attribute -> (object attribute, converter), attributes missing here are ignored while parsing
+OBJECT_FIELDS = {
+    Player: _CHARACTER_FIELDS,
+    Enemy: _CHARACTER_FIELDS,
+    Pushf: {
+        "uid": ("uid", str), "x": ("x", to_number), "y": ("y", to_number), "w": ("w", to_number),
+        "h": ("h", to_number), "tox": ("tox", to_number), "toy": ("toy", to_number), "stab": ("stab", to_number),
+        "damage": ("damage", to_number), "attach": ("attach", str)
+    },
+    Image: {"id": ("id", to_number), "width": ("width", to_number), "height": ("height", to_number)},
+    Bg: {
+        "x": ("x", to_number), "y": ("y", to_number), "w": ("w", to_number), "h": ("h", to_number),
+        "u": ("u", to_number), "v": ("v", to_number), "f": ("f", to_number), "s": ("s", to_bool), "c": ("c", str),
+        "m": ("m", str), "a": ("a", str)
+    },
+    Water: {
+        "x": ("x", to_number), "y": ("y", to_number), "w": ("w", to_number), "h": ("h", to_number),
+        "damage": ("damage", to_number), "friction": ("friction", to_bool)
+    },
+    Box: {"x": ("x", to_number), "y": ("y", to_number), "w": ("w", to_number), "h": ("h", to_number),
+          "m": ("m", to_number)},
+    Door: {
+        "uid": ("uid", str), "x": ("x", to_number), "y": ("y", to_number), "w": ("w", to_number),
+        "h": ("h", to_number), "maxspeed": ("maxspeed", to_number), "tarx": ("tarx", to_number),
+        "tary": ("tary", to_number), "vis": ("vis", to_bool), "moving": ("moving", to_bool), "attach": ("attach", str)
+    },
+    Decor: {
+        "uid": ("uid", str), "x": ("x", to_number), "y": ("y", to_number), "u": ("u", to_number),
+        "v": ("v", to_number), "addx": ("u", to_number), "addy": ("v", to_number), "r": ("r", to_number),
+        "sx": ("sx", to_number), "sy": ("sy", to_number), "f": ("f", to_number), "model": ("model", str),
+        "attach": ("attach", str), "at": ("attach", str)
+    },
+    Gun: {
+        "uid": ("uid", str), "x": ("x", to_number), "y": ("y", to_number), "model": ("model", str),
+        "upg": ("upg", to_number), "command": ("command", to_number)
+    },
+    Region: {
+        "uid": ("uid", str), "x": ("x", to_number), "y": ("y", to_number), "w": ("w", to_number),
+        "h": ("h", to_number), "use_target": ("use_target", str), "use_on": ("use_on", to_number),
+        "attach": ("attach", str)
+    },
+    Trigger: {
+        "uid": ("uid", str), "x": ("x", to_number), "y": ("y", to_number), "enabled": ("enabled", to_bool),
+        "maxcalls": ("maxcalls", to_number)
+    },
+    Timer: {
+        "uid": ("uid", str), "x": ("x", to_number), "y": ("y", to_number), "enabled": ("enabled", to_bool),
+        "maxcalls": ("maxcalls", to_number), "target": ("target", str), "delay": ("delay", to_number)
+    },
+    Inf: {"x": ("x", to_number), "y": ("y", to_number), "mark": ("mark", str), "forteam": ("forteam", str)},
+    Vehicle: {
+        "uid": ("uid", str), "x": ("x", to_number), "y": ("y", to_number), "tox": ("tox", to_number),
+        "toy": ("toy", to_number), "side": ("side", to_number), "hpp": ("hpPercent", to_number),
+        "model": ("model", str)
+    },
+    Song: {
+        "uid": ("uid", str), "x": ("x", to_number), "y": ("y", to_number), "volume": ("volume", to_number),
+        "url": ("url", str), "loop": ("loop", str), "callback": ("callback", str)
+    },
+    Lamp: {
+        "uid": ("uid", str), "x": ("x", to_number), "y": ("y", to_number), "power": ("power", to_number),
+        "flare": ("flare", str)
+    },
+    Barrel: {
+        "uid": ("uid", str), "x": ("x", to_number), "y": ("y", to_number), "tox": ("tox", to_number),
+        "toy": ("toy", to_number), "model": ("model", str)
+    },
+}
+
+# Trigger action attribute -> (action index, slot), slot 0 is the opID and 1/2 are targetA/targetB
+TRIGGER_ACTION_FIELDS = {
+    f"actions_{i}_{field}": (i - 1, slot)
+    for i in range(1, 11)
+    for slot, field in enumerate(("type", "targetA", "targetB"))
+}
+
+_converters = {}
+
+
+def compile_converter(obj_type):
+    # Builds the element -> object function of obj_type, the field table is looked up only once
+    fields = OBJECT_FIELDS[obj_type]
+
+    def convert(elem):
+        instance = obj_type()
+        for key, value in elem.attrib.items():
+            field = fields.get(key)
+            if field is not None:
+                setattr(instance, field[0], field[1](value))
+        return instance
+
+    if obj_type is not Trigger:
+        return convert
+
+    def convert_trigger(elem):
+        trigger = convert(elem)
+        slots = {}
+        for key, value in elem.attrib.items():
+            action_field = TRIGGER_ACTION_FIELDS.get(key)
+            if action_field is not None:
+                slots.setdefault(action_field[0], ["", "0", "0"])[action_field[1]] = value
+        for index in sorted(slots):
+            op_id, target_a, target_b = slots[index]
+            if op_id:
+                trigger.actions.append(TriggersActionEntity(opID=int(op_id), args=[target_a, target_b]))
+        return trigger
+
+    return convert_trigger
+
+
+def get_converter(obj_type):
+    converter = _converters.get(obj_type)
+    if converter is None:
+        converter = _converters[obj_type] = compile_converter(obj_type)
+    return converter
+
+
+def parse_named_element(obj_type, obj_type_str, elem):
+    if elem.get("uid") is None:
+        raise ValueError(f"{obj_type_str} name cannot be empty or missing!")
+    return get_converter(obj_type)(elem)
+
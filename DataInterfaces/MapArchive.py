@@ -0,0 +1,258 @@
+"""
+MapArchive Module
+
+This module packs many maps into one archive file and reads them back through mmap. Every map is stored in the
+binary format of DataInterfaces.MapBinary, one after another, followed by an index of the maps:
+
+Layout (little-endian):
+    header:     magic b'PB2A', archive format version (u16)
+    maps:       the binary form of every map
+    index:      map count (u32), then per map: id length (u16), UTF-8 id, offset (u64), size (u64),
+                one object count (u32) per type of MapBinary.BINARY_TYPES
+    footer:     offset of the index (u64), magic b'PB2A'
+
+Opening an archive only reads its index. A map is read straight from the mapped file when it is requested, and
+loading only some object types of a map only decodes their sections, the pages of the rest are never touched.
+Object counts come from the index, so scanning a whole archive for maps with a given content needs no map data.
+
+Classes:
+    ArchiveEntry:
+        Index entry of one map.
+
+    MapArchive:
+        A read-only archive opened through mmap.
+
+    ArchiveWriter:
+        Appends maps to a new archive file, the index is written on close.
+
+Usage Example:
+    from DataInterfaces.MapArchive import ArchiveWriter, MapArchive
+
+    with ArchiveWriter("maps.pb2a") as writer:
+        for map_id, map_instance in maps.items():
+            writer.add(map_id, map_instance)
+
+    with MapArchive("maps.pb2a") as archive:
+        boxes = archive.load("map_id", types=(Box,)).objects[Box]
+"""
+from mmap import ACCESS_READ, mmap
+from struct import Struct
+
+from DataInterfaces.MapBinary import BINARY_TYPES, from_binary, read_directory, to_binary
+
+ARCHIVE_MAGIC = b"PB2A"
+ARCHIVE_VERSION = 1
+
+_HEADER = Struct("<4sH")
+_FOOTER = Struct("<Q4s")
+_U16 = Struct("<H")
+_U32 = Struct("<I")
+_ENTRY = Struct(f"<QQ{len(BINARY_TYPES)}I")
+
+
+class ArchiveEntry:
+    """
+    Index entry of one map.
+
+    Attributes:
+        map_id (str): The id the map was stored under.
+        offset (int): Position of the binary map in the archive.
+        size (int): Size of the binary map in bytes.
+        counts (tuple): Number of objects of every type of MapBinary.BINARY_TYPES.
+
+    Methods:
+        count(obj_type): Number of objects of one type.
+    """
+
+    __slots__ = ("map_id", "offset", "size", "counts")
+
+    def __init__(self, map_id: str, offset: int, size: int, counts: tuple):
+        self.map_id = map_id
+        self.offset = offset
+        self.size = size
+        self.counts = counts
+
+    def __repr__(self):
+        return f"ArchiveEntry({self.map_id!r}, offset={self.offset}, size={self.size})"
+
+    def count(self, obj_type) -> int:
+        return self.counts[BINARY_TYPES.index(obj_type)]
+
+
+def type_counts(data) -> tuple:
+    # Object counts of a binary map, read from its section directory
+    directory = read_directory(data)
+    return tuple(directory[obj_type][0] if obj_type in directory else 0 for obj_type in BINARY_TYPES)
+
+
+def pack_header() -> bytes:
+    return _HEADER.pack(ARCHIVE_MAGIC, ARCHIVE_VERSION)
+
+
+def pack_index(entries, index_offset: int) -> bytes:
+    # The index followed by the footer
+    out = bytearray(_U32.pack(len(entries)))
+    for entry in entries:
+        encoded_id = entry.map_id.encode()
+        out += _U16.pack(len(encoded_id))
+        out += encoded_id
+        out += _ENTRY.pack(entry.offset, entry.size, *entry.counts)
+    out += _FOOTER.pack(index_offset, ARCHIVE_MAGIC)
+    return bytes(out)
+
+
+def unpack_index(view) -> dict:
+    if len(view) < _HEADER.size + _FOOTER.size:
+        raise ValueError("Not a map archive: file is too short.")
+    magic, version = _HEADER.unpack_from(view, 0)
+    index_offset, end_magic = _FOOTER.unpack_from(view, len(view) - _FOOTER.size)
+    if magic != ARCHIVE_MAGIC or end_magic != ARCHIVE_MAGIC:
+        raise ValueError("Not a map archive: bad magic number, the archive may not have been closed.")
+    if version != ARCHIVE_VERSION:
+        raise ValueError(f"Unsupported map archive version {version}, expected {ARCHIVE_VERSION}.")
+    if index_offset > len(view) - _FOOTER.size:
+        raise ValueError("Corrupted map archive index.")
+    entries = {}
+    count = _U32.unpack_from(view, index_offset)[0]
+    offset = index_offset + _U32.size
+    for _ in range(count):
+        id_size = _U16.unpack_from(view, offset)[0]
+        offset += _U16.size
+        map_id = str(view[offset:offset + id_size], "utf-8")
+        offset += id_size
+        map_offset, size, *counts = _ENTRY.unpack_from(view, offset)
+        offset += _ENTRY.size
+        if map_offset + size > index_offset:
+            raise ValueError(f"Corrupted map archive index entry for map '{map_id}'.")
+        entries[map_id] = ArchiveEntry(map_id, map_offset, size, tuple(counts))
+    return entries
+
+
+class MapArchive:
+    """
+    A read-only archive opened through mmap.
+
+    Attributes:
+        path (str): The archive file.
+        entries (dict): Map id -> ArchiveEntry, in the order the maps were added.
+
+    Methods:
+        entry(map_id): The index entry of a map.
+        counts(map_id): Object type -> number of objects of a map, for the types present in it.
+        map_bytes(map_id): Zero-copy view of the binary form of a map.
+        load(map_id, types): Loads a map, optionally with only some object types.
+        iter_maps(types): Yields (map id, Map) for every map in the archive.
+        total_counts(): Object type -> number of objects over the whole archive.
+        close(): Unmaps the file.
+
+    Note:
+        Views returned by map_bytes must be released before the archive is closed.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mmap = mmap(f.fileno(), 0, access=ACCESS_READ)
+        try:
+            self.entries = unpack_index(self._mmap)
+        except Exception:
+            self._mmap.close()
+            raise
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, map_id):
+        return str(map_id) in self.entries
+
+    def __iter__(self):
+        return iter(self.entries)
+
+    def entry(self, map_id) -> ArchiveEntry:
+        entry = self.entries.get(str(map_id))
+        if entry is None:
+            raise KeyError(f"Map '{map_id}' is not in the archive '{self.path}'.")
+        return entry
+
+    def counts(self, map_id) -> dict:
+        return {obj_type: count for obj_type, count in zip(BINARY_TYPES, self.entry(map_id).counts) if count}
+
+    def map_bytes(self, map_id) -> memoryview:
+        entry = self.entry(map_id)
+        return memoryview(self._mmap)[entry.offset:entry.offset + entry.size]
+
+    def load(self, map_id, types: tuple = None):
+        with self.map_bytes(map_id) as view:
+            return from_binary(view, types=types)
+
+    def iter_maps(self, types: tuple = None):
+        for map_id in self.entries:
+            yield map_id, self.load(map_id, types)
+
+    def total_counts(self) -> dict:
+        totals = [0] * len(BINARY_TYPES)
+        for entry in self.entries.values():
+            for i, count in enumerate(entry.counts):
+                totals[i] += count
+        return {obj_type: total for obj_type, total in zip(BINARY_TYPES, totals) if total}
+
+    def close(self):
+        self._mmap.close()
+
+
+class ArchiveWriter:
+    """
+    Appends maps to a new archive file, the index is written on close.
+
+    Attributes:
+        path (str): The archive file, overwritten if it exists.
+        entries (list): ArchiveEntry of every map added so far.
+
+    Methods:
+        add(map_id, map_instance): Appends a map.
+        add_binary(map_id, data): Appends a map already in the binary format of MapBinary.
+        close(): Writes the index and closes the file.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.entries = []
+        self._ids = set()
+        self._file = open(path, "wb")
+        self._file.write(pack_header())
+        self._offset = _HEADER.size
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def add(self, map_id, map_instance):
+        data = to_binary(map_instance)
+        counts = tuple(len(map_instance.objects.get(obj_type, ())) for obj_type in BINARY_TYPES)
+        self._append(str(map_id), data, counts)
+
+    def add_binary(self, map_id, data: bytes):
+        self._append(str(map_id), data, type_counts(data))
+
+    def _append(self, map_id: str, data: bytes, counts: tuple):
+        if map_id in self._ids:
+            raise ValueError(f"Map '{map_id}' is already in the archive.")
+        if self._file.closed:
+            raise ValueError("The archive is closed.")
+        self._ids.add(map_id)
+        self._file.write(data)
+        self.entries.append(ArchiveEntry(map_id, self._offset, len(data), counts))
+        self._offset += len(data)
+
+    def close(self):
+        if not self._file.closed:
+            self._file.write(pack_index(self.entries, self._offset))
+            self._file.close()
@@ -0,0 +1,365 @@
+"""
+MapBatch Module
+
+This module converts whole directories of maps on every core. Each file goes through load -> transform -> dump
+with MapIO, files are handed to a ProcessPoolExecutor in chunks, and results are streamed back in input order
+or as soon as they are done. A file that fails to load, transform or dump is reported as failed, the others are
+converted anyway.
+
+Maps are read as XML, or in the binary format of DataInterfaces.MapBinary when the file name ends with
+BINARY_SUFFIX, and written in the format asked for. Only a bounded number of chunks is in flight at a time, so
+the input may be a generator over a directory of any size.
+
+Classes:
+    FileResult:
+        The outcome of converting one file.
+
+    BatchSummary:
+        Totals and throughput of a batch.
+
+Functions:
+    find_map_files(directory, suffixes) -> list:
+        Map files under a directory, recursively, sorted.
+
+    convert_file(source, destination, transform, output_format, validate) -> FileResult:
+        Converts one file in the calling process.
+
+    convert_files(jobs, workers, chunk_size, ordered, transform, output_format, validate, progress):
+        Converts (source, destination) pairs on a process pool and yields a FileResult per file.
+
+    convert_directory(input_directory, output_directory, ...):
+        Converts every map file under a directory into another directory with the same layout.
+
+Usage Example:
+    from DataInterfaces.MapBatch import BatchSummary, convert_directory
+
+    summary = BatchSummary()
+    for result in convert_directory("maps", "converted", workers=8, transform={"translate": (100, 0)}):
+        summary.add(result)
+    print(summary.report())
+
+    # Command line
+    python -m DataInterfaces.MapBatch maps converted --workers 8 --format binary --translate 100 0
+"""
+from argparse import ArgumentParser, ArgumentTypeError
+from asyncio import run
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from math import isfinite
+from os import cpu_count, makedirs, path, walk
+from time import perf_counter
+from typing import Callable, Optional
+
+from DataInterfaces.Entity import NamedMapObjectEntity
+from DataInterfaces.MapIO import MapIO
+
+XML_SUFFIX = ".xml"
+BINARY_SUFFIX = ".pb2m"
+OUTPUT_FORMATS = {"xml": XML_SUFFIX, "binary": BINARY_SUFFIX}
+# Chunks per worker when the chunk size is not given, small enough to balance uneven files
+CHUNKS_PER_WORKER = 4
+# Chunks submitted ahead per worker, so that workers never wait for the next chunk
+CHUNKS_IN_FLIGHT_PER_WORKER = 2
+
+
+class FileResult:
+    """
+    The outcome of converting one file.
+
+    Attributes:
+        index (int): Position of the file in the input.
+        source (str): The file read.
+        destination (str): The file written, None when nothing is written.
+        objects (int): Number of map objects loaded.
+        bytes_read (int): Size of the source file.
+        bytes_written (int): Size of the destination file.
+        seconds (float): Time spent on the file in its worker.
+        error (str): Why the file failed, None on success.
+    """
+
+    __slots__ = ("index", "source", "destination", "objects", "bytes_read", "bytes_written", "seconds", "error")
+
+    def __init__(self, index: int, source: str, destination: Optional[str]):
+        self.index = index
+        self.source = source
+        self.destination = destination
+        self.objects = 0
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.seconds = 0.0
+        self.error = None
+
+    def __repr__(self):
+        state = "failed: " + self.error if self.error is not None else f"{self.objects} objects"
+        return f"FileResult({self.source!r}, {state})"
+
+
+class BatchSummary:
+    """
+    Totals and throughput of a batch.
+
+    Attributes:
+        files (int): Number of files processed.
+        failed (list): FileResult of every failed file.
+        objects (int): Number of map objects converted.
+        bytes_read (int): Total size of the sources.
+        bytes_written (int): Total size of the destinations.
+        worker_seconds (float): Time spent in workers, summed over the files.
+        started (float): perf_counter() when the summary was created.
+
+    Methods:
+        add(result): Accounts for one file.
+        report(): Multi-line text with totals and throughput.
+    """
+
+    __slots__ = ("files", "failed", "objects", "bytes_read", "bytes_written", "worker_seconds", "started")
+
+    def __init__(self):
+        self.files = 0
+        self.failed = []
+        self.objects = 0
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.worker_seconds = 0.0
+        self.started = perf_counter()
+
+    def add(self, result: FileResult):
+        self.files += 1
+        if result.error is not None:
+            self.failed.append(result)
+        self.objects += result.objects
+        self.bytes_read += result.bytes_read
+        self.bytes_written += result.bytes_written
+        self.worker_seconds += result.seconds
+
+    @property
+    def elapsed(self) -> float:
+        return perf_counter() - self.started
+
+    def report(self) -> str:
+        elapsed = max(self.elapsed, 1e-9)
+        lines = [
+            f"files:      {self.files} ({len(self.failed)} failed)",
+            f"objects:    {self.objects}",
+            f"read:       {self.bytes_read / 2 ** 20:.1f} MiB, written: {self.bytes_written / 2 ** 20:.1f} MiB",
+            f"elapsed:    {elapsed:.2f} s, {self.files / elapsed:.1f} files/s, "
+            f"{self.objects / elapsed:.0f} objects/s, {self.bytes_read / 2 ** 20 / elapsed:.1f} MiB/s read",
+            # Worker time over wall time, close to the worker count when the pool is kept busy
+            f"parallelism: {self.worker_seconds / elapsed:.2f}",
+        ]
+        lines.extend(f"failed:     {result.source}: {result.error}" for result in self.failed)
+        return "\n".join(lines)
+
+
+def find_map_files(directory: str, suffixes: tuple = (XML_SUFFIX, BINARY_SUFFIX)) -> list:
+    found = []
+    for root, _, files in walk(directory):
+        found.extend(path.join(root, name) for name in files if name.endswith(suffixes))
+    return sorted(found)
+
+
+def destination_path(source: str, input_directory: str, output_directory: str, output_format: str) -> str:
+    relative = path.relpath(source, input_directory)
+    return path.join(output_directory, path.splitext(relative)[0] + OUTPUT_FORMATS[output_format])
+
+
+def duplicate_uids(map_instance) -> list:
+    # (type name, uid) of the named objects sharing their uid with an earlier object of the same type
+    duplicates = []
+    for obj_type, items in map_instance.objects.items():
+        type_index = map_instance.uid_index[obj_type]
+        for item in items:
+            if isinstance(item, NamedMapObjectEntity) and type_index.get(item.uid) is not item:
+                duplicates.append((obj_type.__name__, item.uid))
+    return duplicates
+
+
+async def convert_file_async(result: FileResult, transform: Optional[dict], output_format: str, validate: bool):
+    source = result.source
+    result.bytes_read = path.getsize(source)
+    if source.endswith(BINARY_SUFFIX):
+        map_instance = await MapIO.load_binary(source)
+    else:
+        map_instance = await MapIO.load_map_from_file_async(source)
+    result.objects = sum(len(items) for items in map_instance.objects.values())
+    if validate:
+        duplicates = duplicate_uids(map_instance)
+        if duplicates:
+            names = ", ".join(f"{type_name} '{uid}'" for type_name, uid in duplicates[:10])
+            raise ValueError(f"{len(duplicates)} duplicate uids: {names}")
+    if transform:
+        map_instance.transform(**transform)
+    destination = result.destination
+    if destination is None:
+        return
+    directory = path.dirname(destination)
+    if directory:
+        makedirs(directory, exist_ok=True)
+    if output_format == "binary":
+        await MapIO.save_binary(map_instance, destination)
+    else:
+        await MapIO.dump_map_async(map_instance, destination)
+    result.bytes_written = path.getsize(destination)
+
+
+async def convert_chunk_async(chunk: list, transform: Optional[dict], output_format: str, validate: bool) -> list:
+    results = []
+    for index, source, destination in chunk:
+        result = FileResult(index, source, destination)
+        start = perf_counter()
+        try:
+            await convert_file_async(result, transform, output_format, validate)
+        except Exception as e:
+            # One bad file must not take its chunk down with it
+            result.error = f"{type(e).__name__}: {e}"
+        result.seconds = perf_counter() - start
+        results.append(result)
+    return results
+
+
+def convert_chunk(chunk: list, transform: Optional[dict], output_format: str, validate: bool) -> list:
+    # Runs in a worker process, one event loop per chunk
+    return run(convert_chunk_async(chunk, transform, output_format, validate))
+
+
+def convert_file(source: str, destination: Optional[str], transform: Optional[dict] = None,
+                 output_format: str = "xml", validate: bool = False) -> FileResult:
+    return convert_chunk([(0, source, destination)], transform, output_format, validate)[0]
+
+
+def iter_chunks(jobs, chunk_size: int):
+    chunk = []
+    for index, (source, destination) in enumerate(jobs):
+        chunk.append((index, source, destination))
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def failed_chunk(chunk: list, error: BaseException) -> list:
+    # The worker running the chunk died (e.g. killed out of memory), every file of it is reported failed
+    results = []
+    for index, source, destination in chunk:
+        result = FileResult(index, source, destination)
+        result.error = f"{type(error).__name__}: {error}"
+        results.append(result)
+    return results
+
+
+def convert_files(jobs, workers: Optional[int] = None, chunk_size: Optional[int] = None, ordered: bool = True,
+                  transform: Optional[dict] = None, output_format: str = "xml", validate: bool = False,
+                  progress: Optional[Callable] = None):
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"Unknown output format '{output_format}', expected one of {', '.join(OUTPUT_FORMATS)}.")
+    workers = workers or cpu_count() or 1
+    if workers < 1:
+        raise ValueError("At least one worker is needed.")
+    if chunk_size is None:
+        jobs = list(jobs)
+        chunk_size = max(1, -(-len(jobs) // (workers * CHUNKS_PER_WORKER)))
+    elif chunk_size < 1:
+        raise ValueError("Chunk size must be at least 1.")
+
+    total = len(jobs) if isinstance(jobs, list) else None
+    done_count = 0
+    # Future -> chunk, and in ordered mode the chunks done ahead of the next one to yield
+    pending = {}
+    done_ahead = {}
+    next_chunk = 0
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        chunks = enumerate(iter_chunks(jobs, chunk_size))
+        try:
+            while True:
+                for chunk_number, chunk in chunks:
+                    future = executor.submit(convert_chunk, chunk, transform, output_format, validate)
+                    pending[future] = (chunk_number, chunk)
+                    if len(pending) >= workers * CHUNKS_IN_FLIGHT_PER_WORKER:
+                        break
+                if not pending:
+                    break
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                ready = []
+                for future in done:
+                    chunk_number, chunk = pending.pop(future)
+                    try:
+                        results = future.result()
+                    except Exception as e:
+                        results = failed_chunk(chunk, e)
+                    if ordered:
+                        done_ahead[chunk_number] = results
+                    else:
+                        ready.extend(results)
+                while next_chunk in done_ahead:
+                    ready.extend(done_ahead.pop(next_chunk))
+                    next_chunk += 1
+                for result in ready:
+                    done_count += 1
+                    if progress is not None:
+                        progress(done_count, total, result)
+                    yield result
+        finally:
+            for future in pending:
+                future.cancel()
+
+
+def convert_directory(input_directory: str, output_directory: Optional[str], workers: Optional[int] = None,
+                      chunk_size: Optional[int] = None, ordered: bool = True, transform: Optional[dict] = None,
+                      output_format: str = "xml", validate: bool = False, progress: Optional[Callable] = None):
+    # With no output directory the maps are only loaded, validated and transformed
+    jobs = [(source, destination_path(source, input_directory, output_directory, output_format)
+             if output_directory is not None else None)
+            for source in find_map_files(input_directory)]
+    return convert_files(jobs, workers, chunk_size, ordered, transform, output_format, validate, progress)
+
+
+def print_progress(done: int, total: Optional[int], result: FileResult):
+    status = "ok" if result.error is None else "FAILED " + result.error
+    print(f"[{done}/{total if total is not None else '?'}] {result.source}: {status}")
+
+
+def number_argument(value: str):
+    # Integral values stay int so that untouched coordinates are dumped the same way, anything else is rejected
+    try:
+        return int(value)
+    except ValueError:
+        pass
+    try:
+        number = float(value)
+    except ValueError:
+        raise ArgumentTypeError(f"invalid number: '{value}'")
+    if not isfinite(number):
+        raise ArgumentTypeError(f"invalid number: '{value}'")
+    return number
+
+
+def main(argv: list = None):
+    parser = ArgumentParser(description="Convert, validate and re-dump every map under a directory.")
+    parser.add_argument("input", help="Directory of .xml and .pb2m maps")
+    parser.add_argument("output", nargs="?", help="Output directory, omit to only load and validate")
+    parser.add_argument("--format", choices=tuple(OUTPUT_FORMATS), default="xml", dest="output_format")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes, all cores by default")
+    parser.add_argument("--chunk-size", type=int, default=None, help="Files per task")
+    parser.add_argument("--unordered", action="store_true", help="Report files as soon as they are done")
+    parser.add_argument("--validate", action="store_true", help="Fail maps with duplicate uids")
+    parser.add_argument("--quiet", action="store_true", help="Only print the summary")
+    parser.add_argument("--translate", type=number_argument, nargs=2, metavar=("DX", "DY"))
+    parser.add_argument("--scale", type=number_argument)
+    parser.add_argument("--mirror", type=number_argument, metavar="X")
+    parser.add_argument("--crop", type=number_argument, nargs=4, metavar=("X", "Y", "W", "H"))
+    args = parser.parse_args(argv)
+
+    transform = {name: tuple(value) if isinstance(value, list) else value
+                 for name, value in (("translate", args.translate), ("scale", args.scale),
+                                     ("mirror", args.mirror), ("crop", args.crop)) if value is not None}
+    summary = BatchSummary()
+    for result in convert_directory(args.input, args.output, args.workers, args.chunk_size, not args.unordered,
+                                    transform, args.output_format, args.validate,
+                                    None if args.quiet else print_progress):
+        summary.add(result)
+    print(summary.report())
+    return 1 if summary.failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
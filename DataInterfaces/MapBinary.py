@@ -0,0 +1,454 @@
+"""
+MapBinary Module
+
+This module implements a compact, versioned binary format for Map instances. Loading it skips the text formatting
+and parsing of XML entirely: numbers are stored as packed arrays and strings once in a shared table.
+
+Layout (little-endian):
+    header:     magic b'PB2M', format version (u16), flags (u16)
+    strings:    string count (u32), UTF-8 byte count (u32), UTF-8 blob of the strings separated by NUL characters,
+                or when a string contains NUL (flag 1): the string lengths in characters before the byte count
+    directory:  section count (u16), then per section: type index (u8), row count (u32), offset (u64), size (u64)
+    sections:   one per non-empty object type, one column per field of the type
+
+Every uid, model, url or other string value is interned into the string table, columns refer to it by index.
+A column is stored as the tightest kind fitting all of its values: an integer array of the smallest width, a
+float64 array, string indexes, booleans, or a tagged column for mixed values (None, numbers and strings mixed,
+integers beyond 64 bits). Trigger actions are flattened into an action count per trigger, an opID column, an
+argument count per action and one column of all arguments. Values come back with the same Python types they
+were saved with, so the XML dump of a loaded map is identical to the dump of the saved one.
+
+The directory gives the offset of every section, so one object type can be read without decoding the others.
+
+Functions:
+    to_binary(map_instance) -> bytes:
+        Serializes a Map.
+
+    from_binary(data, map_instance, types) -> Map:
+        Fills a Map from a bytes-like object (bytes, memoryview, mmap), optionally with only some object types.
+
+    read_directory(data) -> dict:
+        Object type -> (row count, offset, size) of every section of a binary map.
+
+Usage Example:
+    from DataInterfaces.MapBinary import to_binary, from_binary
+
+    data = to_binary(map_instance)
+    copy = from_binary(data)
+    assert copy.to_xml_string() == map_instance.to_xml_string()
+"""
+from array import array
+from collections import Counter
+from gc import disable, enable, isenabled
+from itertools import accumulate, chain, repeat
+from operator import attrgetter
+from struct import Struct
+from sys import byteorder
+
+from DataInterfaces.ColumnStore import ColumnStore
+from DataInterfaces.Entity import NamedMapObjectEntity, TriggersActionEntity, field_names
+from DataInterfaces.MapObjects import Door, Region, Timer, Vehicle, Box, Water, Decor, Song, Lamp, Barrel, Gun, \
+    Pushf, Bg, Enemy, Player, Inf, Trigger, Image
+
+MAGIC = b"PB2M"
+FORMAT_VERSION = 1
+
+# Type index stored in the file -> map object class, only ever appended to
+BINARY_TYPES = (Player, Pushf, Image, Bg, Water, Box, Door, Decor, Gun, Region, Trigger, Timer, Inf, Vehicle, Song,
+                Lamp, Barrel, Enemy)
+_TYPE_INDEXES = {obj_type: index for index, obj_type in enumerate(BINARY_TYPES)}
+
+# Header flags
+FLAG_STRING_LENGTHS = 1
+
+# Column kinds
+KIND_INT = 0
+KIND_FLOAT = 1
+KIND_STR = 2
+KIND_BOOL = 3
+KIND_MIXED = 4
+KIND_ACTIONS = 5
+
+# Tags of the values of a mixed column
+TAG_NONE = 0
+TAG_FALSE = 1
+TAG_TRUE = 2
+TAG_INT = 3
+TAG_FLOAT = 4
+TAG_STR = 5
+TAG_BIG_INT = 6
+
+# Smallest integer array fitting a range, (typecode, largest value)
+INT_TYPECODES = (("b", 0x7F), ("h", 0x7FFF), ("i", 0x7FFFFFFF), ("q", 0x7FFFFFFFFFFFFFFF))
+
+_HEADER = Struct("<4sHH")
+_U8 = Struct("<B")
+_U16 = Struct("<H")
+_U32 = Struct("<I")
+_ARRAY = Struct("<cI")
+_SECTION = Struct("<BIQQ")
+
+_SWAP = byteorder == "big"
+_builders = {}
+
+
+def int_typecode(values) -> str:
+    if not values:
+        return "b"
+    low, high = min(values), max(values)
+    for typecode, limit in INT_TYPECODES:
+        if -limit - 1 <= low and high <= limit:
+            return typecode
+    return None
+
+
+class _StringTable:
+    # Interns strings in first-use order
+
+    __slots__ = ("indexes",)
+
+    def __init__(self):
+        self.indexes = {}
+
+    def intern(self, values) -> list:
+        indexes = self.indexes
+        return [indexes.setdefault(value, len(indexes)) for value in values]
+
+    def write(self, out: bytearray) -> int:
+        # Returns the header flags describing the table
+        strings = list(self.indexes)
+        out += _U32.pack(len(strings))
+        if any("\0" in string for string in strings):
+            flags = FLAG_STRING_LENGTHS
+            write_array(out, array("I", map(len, strings)))
+            blob = "".join(strings).encode()
+        else:
+            flags = 0
+            blob = "\0".join(strings).encode()
+        out += _U32.pack(len(blob))
+        out += blob
+        return flags
+
+
+def write_array(out: bytearray, values: array):
+    if _SWAP:
+        values = array(values.typecode, values)
+        values.byteswap()
+    out += _ARRAY.pack(values.typecode.encode(), len(values))
+    out += values.tobytes()
+
+
+def read_array(view: memoryview, offset: int) -> tuple:
+    typecode, count = _ARRAY.unpack_from(view, offset)
+    offset += _ARRAY.size
+    values = array(typecode.decode())
+    end = offset + count * values.itemsize
+    values.frombytes(view[offset:end])
+    if _SWAP:
+        values.byteswap()
+    return values, end
+
+
+def write_values(out: bytearray, values: list, strings: _StringTable):
+    kinds = set(map(type, values))
+    if kinds == {int}:
+        typecode = int_typecode(values)
+        if typecode is not None:
+            out += _U8.pack(KIND_INT)
+            write_array(out, array(typecode, values))
+            return
+    elif kinds == {float}:
+        out += _U8.pack(KIND_FLOAT)
+        write_array(out, array("d", values))
+        return
+    elif kinds == {str}:
+        indexes = strings.intern(values)
+        out += _U8.pack(KIND_STR)
+        write_array(out, array(int_typecode(indexes), indexes))
+        return
+    elif kinds == {bool}:
+        out += _U8.pack(KIND_BOOL)
+        write_array(out, array("B", values))
+        return
+    elif not kinds:
+        out += _U8.pack(KIND_INT)
+        write_array(out, array("b"))
+        return
+    write_mixed(out, values, strings)
+
+
+def write_mixed(out: bytearray, values: list, strings: _StringTable):
+    tags = array("B")
+    ints = array("q")
+    floats = array("d")
+    texts = []
+    for value in values:
+        if value is None:
+            tags.append(TAG_NONE)
+        elif value is True or value is False:
+            tags.append(TAG_TRUE if value else TAG_FALSE)
+        elif type(value) is int:
+            if -0x8000000000000000 <= value <= 0x7FFFFFFFFFFFFFFF:
+                tags.append(TAG_INT)
+                ints.append(value)
+            else:
+                tags.append(TAG_BIG_INT)
+                texts.append(str(value))
+        elif type(value) is float:
+            tags.append(TAG_FLOAT)
+            floats.append(value)
+        elif type(value) is str:
+            tags.append(TAG_STR)
+            texts.append(value)
+        else:
+            raise ValueError(f"Cannot store a value of type {type(value).__name__} in a binary map: {value!r}")
+    indexes = strings.intern(texts)
+    out += _U8.pack(KIND_MIXED)
+    write_array(out, tags)
+    write_array(out, ints)
+    write_array(out, floats)
+    write_array(out, array(int_typecode(indexes), indexes))
+
+
+def write_actions(out: bytearray, action_lists: list, strings: _StringTable):
+    actions = [action for action_list in action_lists for action in action_list]
+    out += _U8.pack(KIND_ACTIONS)
+    write_array(out, array("I", map(len, action_lists)))
+    write_values(out, [action.opID for action in actions], strings)
+    write_array(out, array("I", [len(action.args) for action in actions]))
+    write_values(out, [arg for action in actions for arg in action.args], strings)
+
+
+def read_values(view: memoryview, offset: int, strings: list) -> tuple:
+    kind = view[offset]
+    offset += 1
+    if kind == KIND_INT or kind == KIND_FLOAT:
+        values, offset = read_array(view, offset)
+        return values.tolist(), offset
+    if kind == KIND_STR:
+        indexes, offset = read_array(view, offset)
+        return list(map(strings.__getitem__, indexes)), offset
+    if kind == KIND_BOOL:
+        flags, offset = read_array(view, offset)
+        return list(map(bool, flags)), offset
+    if kind == KIND_MIXED:
+        tags, offset = read_array(view, offset)
+        ints, offset = read_array(view, offset)
+        floats, offset = read_array(view, offset)
+        indexes, offset = read_array(view, offset)
+        texts = map(strings.__getitem__, indexes)
+        # Big integers and strings share the string indexes, in tag order
+        sources = (repeat(None), repeat(False), repeat(True), iter(ints), iter(floats), texts, map(int, texts))
+        return [next(sources[tag]) for tag in tags], offset
+    if kind == KIND_ACTIONS:
+        return read_actions(view, offset, strings)
+    raise ValueError(f"Unknown binary map column kind {kind}.")
+
+
+def read_actions(view: memoryview, offset: int, strings: list) -> tuple:
+    counts, offset = read_array(view, offset)
+    op_ids, offset = read_values(view, offset, strings)
+    arg_counts, offset = read_array(view, offset)
+    args, offset = read_values(view, offset, strings)
+    actions = []
+    position = 0
+    for op_id, arg_count in zip(op_ids, arg_counts):
+        actions.append(TriggersActionEntity(op_id, args[position:position + arg_count]))
+        position += arg_count
+    action_lists = []
+    position = 0
+    for count in counts:
+        action_lists.append(actions[position:position + count])
+        position += count
+    return action_lists, offset
+
+
+def section_values(items, name: str) -> list:
+    if isinstance(items, ColumnStore):
+        return list(items.iter_values(name))
+    return list(map(attrgetter(name), items))
+
+
+def write_section(out: bytearray, obj_type, items, strings: _StringTable):
+    names = field_names(obj_type)
+    out += _U16.pack(len(names))
+    for name in names:
+        values = section_values(items, name)
+        out += _U32.pack(strings.intern((name,))[0])
+        if obj_type is Trigger and name == "actions":
+            write_actions(out, values, strings)
+        else:
+            write_values(out, values, strings)
+
+
+def to_binary(map_instance) -> bytes:
+    strings = _StringTable()
+    sections = []
+    for obj_type, items in map_instance.objects.items():
+        if not items:
+            continue
+        if obj_type not in _TYPE_INDEXES:
+            raise ValueError(f"{obj_type.__name__} has no binary representation.")
+        section = bytearray()
+        write_section(section, obj_type, items, strings)
+        sections.append((_TYPE_INDEXES[obj_type], len(items), section))
+
+    table = bytearray()
+    flags = strings.write(table)
+    out = bytearray(_HEADER.pack(MAGIC, FORMAT_VERSION, flags))
+    out += table
+    out += _U16.pack(len(sections))
+    offset = len(out) + len(sections) * _SECTION.size
+    for type_index, row_count, section in sections:
+        out += _SECTION.pack(type_index, row_count, offset, len(section))
+        offset += len(section)
+    for _, _, section in sections:
+        out += section
+    return bytes(out)
+
+
+def read_header(view: memoryview) -> int:
+    # Checks the header and returns its flags
+    if len(view) < _HEADER.size:
+        raise ValueError("Not a binary map: data is too short.")
+    magic, version, flags = _HEADER.unpack_from(view, 0)
+    if magic != MAGIC:
+        raise ValueError("Not a binary map: bad magic number.")
+    if version != FORMAT_VERSION:
+        raise ValueError(f"Unsupported binary map format version {version}, expected {FORMAT_VERSION}.")
+    return flags
+
+
+def read_strings(view: memoryview, offset: int, flags: int) -> tuple:
+    count = _U32.unpack_from(view, offset)[0]
+    offset += _U32.size
+    lengths = None
+    if flags & FLAG_STRING_LENGTHS:
+        lengths, offset = read_array(view, offset)
+    size = _U32.unpack_from(view, offset)[0]
+    offset += _U32.size
+    # One decode for the whole table, then a split on the separators or slices by character length
+    text = str(view[offset:offset + size], "utf-8")
+    if lengths is None:
+        strings = text.split("\0") if count else []
+    else:
+        ends = list(accumulate(lengths))
+        strings = [text[end - length:end] for end, length in zip(ends, lengths)]
+    if len(strings) != count:
+        raise ValueError("Corrupted binary map string table.")
+    return strings, offset + size
+
+
+def read_sections(view: memoryview, offset: int) -> dict:
+    count = _U16.unpack_from(view, offset)[0]
+    offset += _U16.size
+    sections = {}
+    for _ in range(count):
+        type_index, row_count, section_offset, size = _SECTION.unpack_from(view, offset)
+        offset += _SECTION.size
+        if type_index >= len(BINARY_TYPES):
+            raise ValueError(f"Unknown binary map object type index {type_index}.")
+        sections[BINARY_TYPES[type_index]] = (row_count, section_offset, size)
+    return sections
+
+
+def read_directory(data) -> dict:
+    view = memoryview(data)
+    offset = _HEADER.size + _U32.size
+    if read_header(view) & FLAG_STRING_LENGTHS:
+        _, offset = read_array(view, offset)
+    offset += _U32.size + _U32.unpack_from(view, offset)[0]
+    if offset > len(view):
+        raise ValueError("Corrupted binary map string table.")
+    return read_sections(view, offset)
+
+
+def compile_builder(obj_type, names: tuple):
+    # Returns a function taking one value per field and returning a new object. Calling obj_type() would run
+    # __init__ (and the auto-naming of some classes), so the object is allocated bare and its slots are assigned
+    # by generated code, one plain attribute store per field. names must be fields of obj_type.
+    arguments = ", ".join(f"value{i}" for i in range(len(names)))
+    stores = "".join(f"    obj.{name} = value{i}\n" for i, name in enumerate(names))
+    namespace = {"new": object.__new__, "cls": obj_type}
+    exec(f"def build({arguments}):\n    obj = new(cls)\n{stores}    return obj\n", namespace)
+    return namespace["build"]
+
+
+def get_builder(obj_type, names: tuple):
+    builder = _builders.get((obj_type, names))
+    if builder is None:
+        builder = _builders[(obj_type, names)] = compile_builder(obj_type, names)
+    return builder
+
+
+def read_objects(view: memoryview, obj_type, row_count: int, offset: int, strings: list) -> tuple:
+    # Returns the objects of a section and their uids (None for nameless types)
+    expected = field_names(obj_type)
+    field_count = _U16.unpack_from(view, offset)[0]
+    offset += _U16.size
+    names = []
+    columns = []
+    for _ in range(field_count):
+        name_index, = _U32.unpack_from(view, offset)
+        name = strings[name_index]
+        values, offset = read_values(view, offset + _U32.size, strings)
+        if name not in expected or name in names:
+            raise ValueError(f"{obj_type.__name__} has no field '{name}' or it is stored twice.")
+        if len(values) != row_count:
+            raise ValueError(f"Corrupted binary map column {obj_type.__name__}.{name}.")
+        names.append(name)
+        columns.append(values)
+    if len(names) != len(expected):
+        missing = ", ".join(name for name in expected if name not in names)
+        raise ValueError(f"Binary map section of {obj_type.__name__} misses the fields {missing}.")
+    objects = list(map(get_builder(obj_type, tuple(names)), *columns))
+    return objects, columns[names.index("uid")] if "uid" in names else None
+
+
+def add_objects(map_instance, obj_type, objects: list, uids: list):
+    items = map_instance.objects[obj_type]
+    if type(items) is not list or map_instance.check_duplicate_uids or map_instance._spatial_index is not None:
+        for obj in objects:
+            map_instance.add_object(obj)
+        return
+    items.extend(objects)
+    if uids is None or not issubclass(obj_type, NamedMapObjectEntity):
+        return
+    # The first object with a uid wins, as in add_object
+    type_index = map_instance.uid_index[obj_type]
+    first = dict(zip(reversed(uids), reversed(objects)))
+    first.update(type_index)
+    duplicated = map_instance.duplicated_uids
+    if len(first) < len(type_index) + len(uids):
+        duplicated.update(uid for uid, count in Counter(chain(type_index, uids)).items() if count > 1)
+    map_instance.uid_index[obj_type] = first
+    global_index = map_instance.global_uid_index
+    for uid, obj in first.items():
+        if global_index.setdefault(uid, obj) is not obj:
+            duplicated.add(uid)
+
+
+def from_binary(data, map_instance=None, types: tuple = None):
+    if map_instance is None:
+        from DataInterfaces.Map import Map
+        map_instance = Map()
+    view = memoryview(data)
+    strings, offset = read_strings(view, _HEADER.size, read_header(view))
+    sections = read_sections(view, offset)
+    # The objects built here hold no reference cycles, collecting while they pile up would only slow loading down
+    collecting = isenabled()
+    disable()
+    try:
+        for obj_type in BINARY_TYPES:
+            section = sections.get(obj_type)
+            if section is None or (types is not None and obj_type not in types):
+                continue
+            row_count, section_offset, size = section
+            if section_offset + size > len(view):
+                raise ValueError(f"Binary map section of {obj_type.__name__} is truncated.")
+            objects, uids = read_objects(view, obj_type, row_count, section_offset, strings)
+            add_objects(map_instance, obj_type, objects, uids)
+    finally:
+        if collecting:
+            enable()
+    return map_instance
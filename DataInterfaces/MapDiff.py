@@ -0,0 +1,271 @@
+"""
+MapDiff Module
+
+This module computes structural differences between two Maps and replays them as patches. Objects of named types
+are matched by uid (the n-th object carrying a duplicated uid is matched with the n-th one of the other map), objects
+of nameless types (Box, Bg, Water, Inf, Image) by their content, i.e. their XML fragment. Both maps are indexed once
+in hash tables, so a diff takes linear time in the number of objects.
+
+A diff holds per object type:
+    added:    Rows of field values of the objects only found in the new map, in field_names order.
+    removed:  Keys of the objects only found in the old map.
+    modified: (key, {field: new value}) of named objects found in both maps with different field values.
+
+Nameless objects are never modified, a changed box is removed and added. Trigger actions are stored as
+[opID, args] rows. The order of objects is not part of a diff, applied patches append added objects at the end.
+
+Classes:
+    MapDiff:
+        The differences between two maps, with a compact serialization.
+
+Functions:
+    diff_maps(old, new) -> MapDiff:
+        The changes turning the objects of old into those of new.
+
+    apply_patch(map_instance, patch):
+        Applies a MapDiff to a map in place.
+
+Usage Example:
+    from DataInterfaces.MapDiff import MapDiff
+
+    patch = old_map.diff(new_map)
+    print(patch.summary())
+    data = patch.to_bytes()
+
+    old_map.apply_patch(MapDiff.from_bytes(data))
+"""
+from json import dumps, loads
+from operator import attrgetter
+from zlib import compress, decompress
+
+from DataInterfaces.ColumnStore import ColumnStore
+from DataInterfaces.Entity import NamedMapObjectEntity, TriggersActionEntity, field_names
+from DataInterfaces.MapBinary import BINARY_TYPES, get_builder
+from DataInterfaces.MapSerializer import get_serializer
+
+PATCH_VERSION = 1
+_TYPES_BY_NAME = {obj_type.__name__: obj_type for obj_type in BINARY_TYPES}
+
+
+def is_named(obj_type) -> bool:
+    return issubclass(obj_type, NamedMapObjectEntity)
+
+
+def action_rows(actions) -> list:
+    return [[action.opID, list(action.args)] for action in actions]
+
+
+def action_entities(rows) -> list:
+    return [TriggersActionEntity(op_id, list(args)) for op_id, args in rows]
+
+
+def plain_value(name: str, value):
+    # Field value as stored in a diff, trigger actions become rows
+    return action_rows(value) if name == "actions" else value
+
+
+def same_value(old, new) -> bool:
+    # 1, 1.0 and True are equal in Python but dumped differently
+    return old == new and type(old) is type(new)
+
+
+def index_objects(obj_type, items) -> dict:
+    # Key -> object, keys are (uid, occurrence) for named types and XML fragments for nameless ones
+    if is_named(obj_type):
+        index = {}
+        occurrences = {}
+        for obj in items:
+            uid = obj.uid
+            occurrence = occurrences.get(uid, 0)
+            occurrences[uid] = occurrence + 1
+            index[(uid, occurrence)] = obj
+        return index
+    serialize = get_serializer(obj_type)
+    index = {}
+    for obj in items:
+        index.setdefault(serialize(obj), []).append(obj)
+    return index
+
+
+class MapDiff:
+    """
+    The differences between two maps, with a compact serialization.
+
+    Attributes:
+        added (dict): Object type -> rows of field values of the added objects.
+        removed (dict): Object type -> keys of the removed objects, a key being (uid, occurrence) for named
+                        types and the XML fragment for nameless ones.
+        modified (dict): Object type -> list of (key, {field: new value}).
+
+    Methods:
+        summary(): Object type name -> (added, removed, modified) counts of the types with changes.
+        to_dict(), from_dict(data): Conversion from and to JSON-compatible data.
+        to_bytes(), from_bytes(data): Compact serialization, zlib-compressed JSON.
+    """
+
+    __slots__ = ("added", "removed", "modified")
+
+    def __init__(self):
+        self.added = {}
+        self.removed = {}
+        self.modified = {}
+
+    def __bool__(self):
+        return bool(self.added or self.removed or self.modified)
+
+    def types(self) -> list:
+        # Object types with changes, in dump order
+        return [obj_type for obj_type in BINARY_TYPES
+                if obj_type in self.added or obj_type in self.removed or obj_type in self.modified]
+
+    def summary(self) -> dict:
+        return {obj_type.__name__: (len(self.added.get(obj_type, ())), len(self.removed.get(obj_type, ())),
+                                    len(self.modified.get(obj_type, ())))
+                for obj_type in self.types()}
+
+    def to_dict(self) -> dict:
+        types = {}
+        for obj_type in self.types():
+            entry = {}
+            if obj_type in self.added:
+                entry["fields"] = field_names(obj_type)
+                entry["added"] = self.added[obj_type]
+            if obj_type in self.removed:
+                entry["removed"] = self.removed[obj_type]
+            if obj_type in self.modified:
+                entry["modified"] = [[key, changes] for key, changes in self.modified[obj_type]]
+            types[obj_type.__name__] = entry
+        return {"version": PATCH_VERSION, "types": types}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "MapDiff":
+        if data.get("version") != PATCH_VERSION:
+            raise ValueError(f"Unsupported map patch version {data.get('version')}.")
+        patch = cls()
+        for type_name, entry in data["types"].items():
+            obj_type = _TYPES_BY_NAME.get(type_name)
+            if obj_type is None:
+                raise ValueError(f"Unknown object type '{type_name}' in map patch.")
+            named = is_named(obj_type)
+            if "added" in entry:
+                if tuple(entry["fields"]) != field_names(obj_type):
+                    raise ValueError(f"Map patch fields of {type_name} do not match the current class.")
+                patch.added[obj_type] = [list(row) for row in entry["added"]]
+            if "removed" in entry:
+                patch.removed[obj_type] = [tuple(key) if named else key for key in entry["removed"]]
+            if "modified" in entry:
+                patch.modified[obj_type] = [(tuple(key), changes) for key, changes in entry["modified"]]
+        return patch
+
+    def to_bytes(self) -> bytes:
+        return compress(dumps(self.to_dict(), separators=(",", ":")).encode(), 9)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "MapDiff":
+        return cls.from_dict(loads(decompress(data)))
+
+
+def diff_type(patch: MapDiff, obj_type, old_items, new_items):
+    names = field_names(obj_type)
+    get_values = attrgetter(*names)
+    old_index = index_objects(obj_type, old_items)
+    new_index = index_objects(obj_type, new_items)
+    added = []
+    removed = []
+    modified = []
+
+    if is_named(obj_type):
+        for key, new in new_index.items():
+            old = old_index.get(key)
+            if old is None:
+                added.append(new)
+                continue
+            old_values = get_values(old)
+            new_values = get_values(new)
+            if old_values == new_values and list(map(type, old_values)) == list(map(type, new_values)):
+                continue
+            # Trigger actions never compare equal as objects, so they end up here and are compared as rows
+            changes = {}
+            for name, old_value, new_value in zip(names, old_values, new_values):
+                old_value = plain_value(name, old_value)
+                new_value = plain_value(name, new_value)
+                if not same_value(old_value, new_value):
+                    changes[name] = new_value
+            if changes:
+                modified.append((key, changes))
+        removed = [key for key in old_index if key not in new_index]
+    else:
+        for key, new_objects in new_index.items():
+            old_count = len(old_index.get(key, ()))
+            added.extend(new_objects[old_count:])
+        for key, old_objects in old_index.items():
+            removed.extend([key] * (len(old_objects) - len(new_index.get(key, ()))))
+
+    if added:
+        patch.added[obj_type] = [[plain_value(name, value) for name, value in zip(names, get_values(obj))]
+                                 for obj in added]
+    if removed:
+        patch.removed[obj_type] = removed
+    if modified:
+        patch.modified[obj_type] = modified
+
+
+def diff_maps(old, new) -> MapDiff:
+    patch = MapDiff()
+    for obj_type, old_items in old.objects.items():
+        diff_type(patch, obj_type, old_items, new.objects[obj_type])
+    return patch
+
+
+def build_objects(obj_type, rows: list) -> list:
+    names = field_names(obj_type)
+    build = get_builder(obj_type, names)
+    if "actions" not in names:
+        return [build(*row) for row in rows]
+    position = names.index("actions")
+    return [build(*row[:position], action_entities(row[position]), *row[position + 1:]) for row in rows]
+
+
+def apply_patch(map_instance, patch: MapDiff):
+    # Every key is resolved before the map is changed, so a patch that does not fit raises without applying anything
+    removals = {}
+    updates = []
+    for obj_type in patch.types():
+        removed = patch.removed.get(obj_type, ())
+        modified = patch.modified.get(obj_type, ())
+        if not removed and not modified:
+            continue
+        index = index_objects(obj_type, map_instance.objects[obj_type])
+        named = is_named(obj_type)
+        objects = removals[obj_type] = []
+        for key in removed:
+            # Nameless keys map to every object with that content, each removal takes one of them
+            found = index.get(key) if named else index.get(key) and index[key].pop()
+            if not found:
+                raise KeyError(f"Map patch does not fit the map: {obj_type.__name__} {key!r} not found.")
+            objects.append(found)
+        for key, changes in modified:
+            if key not in index:
+                raise KeyError(f"Map patch does not fit the map: {obj_type.__name__} {key!r} not found.")
+            updates.append((index[key], changes))
+
+    for obj_type, objects in removals.items():
+        items = map_instance.objects[obj_type]
+        if isinstance(items, ColumnStore):
+            for obj in objects:
+                items.remove(obj)
+        elif objects:
+            removed_ids = {id(obj) for obj in objects}
+            items[:] = [obj for obj in items if id(obj) not in removed_ids]
+    if any(removals.values()):
+        map_instance.rebuild_uid_index()
+        map_instance.rebuild_spatial_index()
+
+    for obj, changes in updates:
+        for name, value in changes.items():
+            setattr(obj, name, action_entities(value) if name == "actions" else value)
+        map_instance.update_object_bounds(obj)
+
+    for obj_type, rows in patch.added.items():
+        for obj in build_objects(obj_type, rows):
+            map_instance.add_object(obj)
@@ -24,13 +24,23 @@ Usage Example:
     # Dump the Map instance back to the file asynchronously
     await MapIO.dump_map_async(map_instance, 'modified_map.xml')
 """
+from asyncio import create_task, sleep
+from contextlib import suppress
 from typing import Optional
+from xml.etree.ElementTree import XMLPullParser
 
 from aiofiles import open
 
+from DataInterfaces import Instrumentation
 from DataInterfaces.Map import Map
+from DataInterfaces.MapArchive import ArchiveWriter, MapArchive
 from os import path
 
+# Size of the chunks fed to the incremental parser by the streaming loader
+STREAM_CHUNK_SIZE = 64 * 1024
+# Number of characters of serialized objects collected before each write of the streaming dump
+DUMP_BUFFER_SIZE = 256 * 1024
+
 class MapIO:
     """
     A utility class for reading and writing map files.
@@ -42,11 +52,26 @@ class MapIO:
         load_map_from_file_async(file_location: str) -> Optional[Map]:
             Loads a Map instance from a file asynchronously.
 
+        stream_map_from_file_async(file_location: str, chunk_size: int) -> Optional[Map]:
+            Loads a Map instance from a file with incremental parsing and bounded memory.
+
         write_to_file_async(file_location: str, content: str):
             Writes content to a file asynchronously.
 
-        dump_map_async(map_instance: Map, file_location: str):
-            Dumps a Map instance to a file asynchronously.
+        dump_map_async(map_instance: Map, file_location: str, buffer_size: int):
+            Dumps a Map instance to a file asynchronously, in batches of bounded size.
+
+        save_binary(map_instance: Map, file_location: str):
+            Saves a Map instance to a file in the binary map format.
+
+        load_binary(file_location: str, types: tuple) -> Map:
+            Loads a Map instance from a file in the binary map format.
+
+        save_archive(maps, file_location: str):
+            Packs many Map instances into one archive file.
+
+        open_archive(file_location: str) -> MapArchive:
+            Opens an archive file for random access to its maps through mmap.
     """
 
     @staticmethod
@@ -69,8 +94,11 @@ class MapIO:
         """
 
         try:
-            async with open(file_location, 'r') as f:
-                return await f.read()
+            with Instrumentation.span("MapIO.read_file", file=file_location):
+                async with open(file_location, 'r') as f:
+                    content = await f.read()
+            count_file_bytes("bytes_read", file_location)
+            return content
         except FileNotFoundError as e:
             raise FileNotFoundError(f"Could not find the file '{file_location}'. Error: {e}")
         except PermissionError as e:
@@ -122,6 +150,87 @@ class MapIO:
         except Exception as e:
             raise Exception(f"An error occurred while loading the map: {e}")
 
+    @staticmethod
+    async def stream_map_from_file_async(file_location: str, chunk_size: int = STREAM_CHUNK_SIZE) -> Optional[Map]:
+        """
+        Load a Map instance from a file asynchronously with incremental parsing.
+
+        The file is read in chunks which are fed to an XMLPullParser. Every element is turned into
+        a map object as soon as it is closed and then dropped from the tree, so the whole document
+        is never held in memory, neither as a string nor as an ElementTree.
+
+        Args:
+            file_location (str): The path to the file containing the map data.
+            chunk_size (int): The number of characters read from the file per chunk.
+
+        Returns:
+            Optional[Map]: A Map instance loaded from the file, or None if loading fails.
+
+        Raises:
+            FileNotFoundError: If the file is not found at the specified location.
+            PermissionError: If permission is denied to read the file.
+            IsADirectoryError: If the specified location points to a directory instead of a file.
+            UnicodeDecodeError: If there is an error decoding the file as UTF-8.
+            Exception: If any other error occurs while loading the map.
+        """
+
+        try:
+            map_instance = Map()
+            parsers = map_instance.element_parsers()
+            parser = XMLPullParser(events=("start", "end"))
+            parser.feed("<root>")
+            root = None
+            # Start of the file, kept until it is known whether it begins with an XML declaration
+            head = ""
+            with Instrumentation.span("MapIO.stream_map", file=file_location):
+                async with open(file_location, 'r') as f:
+                    while True:
+                        chunk = await f.read(chunk_size)
+                        if not chunk:
+                            break
+                        if head is not None:
+                            head += chunk
+                            declaration_end = xml_declaration_end(head)
+                            if declaration_end is None:
+                                continue
+                            chunk = head[declaration_end:]
+                            head = None
+                        parser.feed(chunk)
+                        root = MapIO._consume_events(parser, parsers, root)
+                if head:
+                    parser.feed(head)
+                parser.feed("</root>")
+                MapIO._consume_events(parser, parsers, root)
+                parser.close()
+            count_file_bytes("bytes_read", file_location)
+            return map_instance
+        except FileNotFoundError as e:
+            raise FileNotFoundError(f"Could not find the file '{file_location}': {e}")
+        except PermissionError as e:
+            raise PermissionError(f"Permission denied to read the file '{file_location}': {e}")
+        except IsADirectoryError as e:
+            raise IsADirectoryError(f"'{file_location}' is a directory, not a file: {e}")
+        except UnicodeDecodeError as e:
+            raise UnicodeDecodeError(e.encoding, e.object, e.start, e.end,
+                                     f"Error decoding file '{file_location}' as UTF-8: {e}")
+        except Exception as e:
+            raise Exception(f"An error occurred while loading the map: {e}")
+
+    @staticmethod
+    def _consume_events(parser: XMLPullParser, parsers: dict, root):
+        # Builds objects from the closed elements, then drops everything parsed so far from the tree
+        for event, elem in parser.read_events():
+            if event == "end":
+                element_parser = parsers.get(elem.tag)
+                if element_parser is not None:
+                    element_parser(elem)
+                    elem.clear()
+            elif root is None:
+                root = elem
+        if root is not None:
+            root.clear()
+        return root
+
     @staticmethod
     async def write_to_file_async(file_location: str, content: str):
         """
@@ -138,8 +247,10 @@ class MapIO:
             Exception: If any other error occurs while writing to the file.
         """
         try:
-            async with open(file_location, 'w') as f:
-                await f.write(content)
+            with Instrumentation.span("MapIO.write_file", file=file_location):
+                async with open(file_location, 'w') as f:
+                    await f.write(content)
+            count_file_bytes("bytes_written", file_location)
         except FileNotFoundError as e:
             raise FileNotFoundError(f"Could not find the file '{file_location}': {e}")
         except PermissionError as e:
@@ -150,13 +261,18 @@ class MapIO:
             raise Exception(f"An error occurred while writing to the file: {e}")
 
     @staticmethod
-    async def dump_map_async(map_instance: Map, file_location: str):
+    async def dump_map_async(map_instance: Map, file_location: str, buffer_size: int = DUMP_BUFFER_SIZE):
         """
         Dump a Map instance to a file asynchronously.
 
+        Objects are serialized into batches of about buffer_size characters, so at most two batches of the
+        output are in memory at once. Each batch is handed to the write thread of aiofiles before the next one
+        is serialized, so the disk write overlaps the serialization.
+
         Args:
             map_instance (Map): The Map instance to be dumped.
             file_location (str): The path to the file where the map data will be written.
+            buffer_size (int): The number of characters collected before a batch is written.
 
         Raises:
             FileNotFoundError: If the file is not found.
@@ -165,7 +281,34 @@ class MapIO:
             Exception: If any other error occurs while dumping the map.
         """
         try:
-            await MapIO.write_to_file_async(file_location, await map_instance.to_xml())
+            with Instrumentation.span("MapIO.write_file", file=file_location):
+                async with open(file_location, 'w') as f:
+                    pending_write = None
+                    batch = []
+                    batch_size = 0
+                    try:
+                        for fragment in map_instance.iter_xml():
+                            batch.append(fragment)
+                            batch_size += len(fragment)
+                            if batch_size >= buffer_size:
+                                if pending_write is not None:
+                                    await pending_write
+                                pending_write = create_task(f.write(''.join(batch)))
+                                # Let the task start, it hands the batch to the write thread and waits there
+                                await sleep(0)
+                                batch = []
+                                batch_size = 0
+                        if pending_write is not None:
+                            await pending_write
+                        if batch:
+                            await f.write(''.join(batch))
+                    finally:
+                        # When serialization fails the write in flight still ends before the file is closed, its
+                        # own error gives way to the one already raised
+                        if pending_write is not None:
+                            with suppress(Exception):
+                                await pending_write
+            count_file_bytes("bytes_written", file_location)
         except FileNotFoundError as e:
             raise Exception(f"Could not find the file '{file_location}' to write the map: {e}")
         except PermissionError as e:
@@ -174,3 +317,147 @@ class MapIO:
             raise IsADirectoryError(f"'{file_location}' is a directory, cannot write: {e}")
         except Exception as e:
             raise Exception(f"An error occurred while dumping the map: {e}")
+
+    @staticmethod
+    async def save_binary(map_instance: Map, file_location: str):
+        """
+        Save a Map instance to a file in the binary map format of DataInterfaces.MapBinary.
+
+        Args:
+            map_instance (Map): The Map instance to be saved.
+            file_location (str): The path to the file where the map data will be written.
+
+        Raises:
+            FileNotFoundError: If the file is not found.
+            PermissionError: If permission is denied to write to the file.
+            IsADirectoryError: If the given path points to a directory.
+            Exception: If any other error occurs while saving the map.
+        """
+        try:
+            with Instrumentation.span("MapIO.save_binary", file=file_location):
+                data = map_instance.to_binary()
+                async with open(file_location, 'wb') as f:
+                    await f.write(data)
+            Instrumentation.count("bytes_written", len(data), file=file_location)
+        except FileNotFoundError as e:
+            raise FileNotFoundError(f"Could not find the file '{file_location}': {e}")
+        except PermissionError as e:
+            raise PermissionError(f"Permission denied to write to the file '{file_location}': {e}")
+        except IsADirectoryError as e:
+            raise IsADirectoryError(f"'{file_location}' is a directory, cannot write: {e}")
+        except Exception as e:
+            raise Exception(f"An error occurred while saving the map: {e}")
+
+    @staticmethod
+    async def load_binary(file_location: str, types: Optional[tuple] = None) -> Map:
+        """
+        Load a Map instance from a file in the binary map format of DataInterfaces.MapBinary.
+
+        The loaded map converts back to the same XML as the map that was saved.
+
+        Args:
+            file_location (str): The path to the file containing the map data.
+            types (Optional[tuple]): The map object classes to load, None for all of them.
+
+        Returns:
+            Map: A Map instance loaded from the file.
+
+        Raises:
+            FileNotFoundError: If the file is not found at the specified location.
+            PermissionError: If permission is denied to read the file.
+            IsADirectoryError: If the specified location points to a directory instead of a file.
+            Exception: If the file is not a binary map or any other error occurs while loading the map.
+        """
+        try:
+            with Instrumentation.span("MapIO.load_binary", file=file_location):
+                async with open(file_location, 'rb') as f:
+                    data = await f.read()
+                map_instance = Map()
+                map_instance.from_binary(data, types)
+            Instrumentation.count("bytes_read", len(data), file=file_location)
+            return map_instance
+        except FileNotFoundError as e:
+            raise FileNotFoundError(f"Could not find the file '{file_location}': {e}")
+        except PermissionError as e:
+            raise PermissionError(f"Permission denied to read the file '{file_location}': {e}")
+        except IsADirectoryError as e:
+            raise IsADirectoryError(f"'{file_location}' is a directory, not a file: {e}")
+        except Exception as e:
+            raise Exception(f"An error occurred while loading the map: {e}")
+
+    @staticmethod
+    def save_archive(maps, file_location: str):
+        """
+        Pack many Map instances into one archive file of DataInterfaces.MapArchive.
+
+        Archives are written and read synchronously: maps are appended one at a time and read back through mmap.
+
+        Args:
+            maps: A dict of map id -> Map, or an iterable of (map id, Map) pairs. Maps are serialized one at a
+                time, so a generator keeps only one of them in memory.
+            file_location (str): The path to the archive file, overwritten if it exists.
+
+        Raises:
+            FileNotFoundError: If the directory of the file does not exist.
+            PermissionError: If permission is denied to write to the file.
+            IsADirectoryError: If the given path points to a directory.
+            Exception: If a map id is used twice or any other error occurs while saving the maps.
+        """
+        try:
+            with ArchiveWriter(file_location) as writer:
+                for map_id, map_instance in (maps.items() if isinstance(maps, dict) else maps):
+                    writer.add(map_id, map_instance)
+        except FileNotFoundError as e:
+            raise FileNotFoundError(f"Could not find the file '{file_location}': {e}")
+        except PermissionError as e:
+            raise PermissionError(f"Permission denied to write to the file '{file_location}': {e}")
+        except IsADirectoryError as e:
+            raise IsADirectoryError(f"'{file_location}' is a directory, cannot write: {e}")
+        except Exception as e:
+            raise Exception(f"An error occurred while saving the map archive: {e}")
+
+    @staticmethod
+    def open_archive(file_location: str) -> MapArchive:
+        """
+        Open an archive file of DataInterfaces.MapArchive.
+
+        Only the index is read, maps are read from the mapped file when they are loaded.
+
+        Args:
+            file_location (str): The path to the archive file.
+
+        Returns:
+            MapArchive: The opened archive, to be closed (or used as a context manager).
+
+        Raises:
+            FileNotFoundError: If the file is not found at the specified location.
+            PermissionError: If permission is denied to read the file.
+            IsADirectoryError: If the specified location points to a directory instead of a file.
+            Exception: If the file is not a map archive or any other error occurs while opening it.
+        """
+        try:
+            return MapArchive(file_location)
+        except FileNotFoundError as e:
+            raise FileNotFoundError(f"Could not find the file '{file_location}': {e}")
+        except PermissionError as e:
+            raise PermissionError(f"Permission denied to read the file '{file_location}': {e}")
+        except IsADirectoryError as e:
+            raise IsADirectoryError(f"'{file_location}' is a directory, not a file: {e}")
+        except Exception as e:
+            raise Exception(f"An error occurred while opening the map archive: {e}")
+
+
+def count_file_bytes(name: str, file_location: str):
+    # Text files are counted by their size on disk, which is what was read or written
+    if Instrumentation.is_enabled():
+        Instrumentation.count(name, path.getsize(file_location), file=file_location)
+
+
+def xml_declaration_end(text: str) -> Optional[int]:
+    # The map is wrapped into a synthetic root, so a leading declaration would be misplaced. Returns the position
+    # right after the declaration, 0 without one, None while the text is too short to tell.
+    stripped = text.lstrip()
+    if not stripped.startswith("<?xml"):
+        return None if "<?xml".startswith(stripped) else 0
+    end = stripped.find("?>")
+    return None if end < 0 else len(text) - len(stripped) + end + 2
@@ -1,12 +1,21 @@
+from re import compile as compile_regex
 from typing import Union
-from xml.etree.ElementTree import Element, tostring
 
 from DataInterfaces.Entity import NamedMapObjectEntity, NamelessMapObjectEntity, TriggersActionEntity, DO_NOTHING, \
     ImageEntity
 from DataInterfaces.MapObjectSpecials import RegionActivationType
 
 
+def dump(obj_type, obj) -> str:
+    # The XML of an object is defined once, by the template of its class in DataInterfaces.MapSerializer. That
+    # module imports this one, so it is imported on first use. The class is explicit: the serializer of a class
+    # without template falls back to to_xml.
+    from DataInterfaces.MapSerializer import get_serializer
+    return get_serializer(obj_type)(obj)
+
+
 class Timer(NamedMapObjectEntity):
+    __slots__ = ("enabled", "target", "delay", "maxcalls")
     name_counter = 0  # Static counter for naming timers
 
     def __init__(self, uid=None, x=0, y=0, enabled=False, target=None, delay=0, maxcalls=0):
@@ -23,15 +32,11 @@ class Timer(NamedMapObjectEntity):
     @property
     def to_xml(self) -> str:
         # Dumps timer.
-        callback = "-1"
-        if self.target is not None:
-            callback = self.target
-
-        return f'<timer uid="{self.uid}" x="{self.x}" y="{self.y}" enabled="{str(self.enabled).lower()}" ' \
-               f'maxcalls="{self.maxcalls}" target="{callback}" delay="{self.delay}" />'
+        return dump(Timer, self)
 
 
 class Door(NamedMapObjectEntity):
+    __slots__ = ("w", "h", "maxspeed", "tarx", "tary", "vis", "moving", "attach")
     name_counter = 0  # Static counter for naming doors
 
     def __init__(self, uid=None, x=0, y=0, w=0, h=0, maxspeed=0, tarx=0, tary=0, vis=False, moving=False,
@@ -54,16 +59,11 @@ class Door(NamedMapObjectEntity):
     @property
     def to_xml(self) -> str:
         # Dumps movable.
-        attach_to = "-1"
-        if self.attach is not None:
-            attach_to = self.attach
-
-        return f'<door uid="{self.uid}" vis="{str(self.vis).lower()}" x="{self.x}" y="{self.y}" w="{self.w}" h="{self.h}" ' \
-               f'moving="{str(self.moving).lower()}" tarx="{self.tarx}" tary="{self.tary}" ' \
-               f'attach="{attach_to}" maxspeed="{self.maxspeed}" />'
+        return dump(Door, self)
 
 
 class Region(NamedMapObjectEntity):
+    __slots__ = ("w", "h", "use_target", "use_on", "attach")
     name_counter = 0  # Static counter for naming regions
 
     def __init__(self, uid=None, x=0, y=0, w=0, h=0, use_target=None, use_on=RegionActivationType.NOTHING, attach=None):
@@ -82,18 +82,12 @@ class Region(NamedMapObjectEntity):
     @property
     def to_xml(self) -> str:
         # Dumps region.
-        attach_to = "-1"
-        if self.attach is not None:
-            attach_to = self.attach
-        use_target = "-1"
-        if self.use_target is not None:
-            use_target = self.use_target
-
-        return f'<region uid="{self.uid}" x="{self.x}" y="{self.y}" w="{self.w}" h="{self.h}" ' \
-               f'use_target="{use_target}" use_on="{self.use_on}" attach="{attach_to}" />'
+        return dump(Region, self)
 
 
 class Box(NamelessMapObjectEntity):
+    __slots__ = ("w", "h", "m")
+
     def __init__(self, x=0, y=0, w=0, h=0, m=0):
         super().__init__(x, y)
         self.w = w
@@ -103,10 +97,12 @@ class Box(NamelessMapObjectEntity):
     @property
     def to_xml(self) -> str:
         # Dumps wall.
-        return f'<box x="{self.x}" y="{self.y}" w="{self.w}" h="{self.h}" m="{self.m}" />'
+        return dump(Box, self)
 
 
 class Water(NamelessMapObjectEntity):
+    __slots__ = ("w", "h", "damage", "friction")
+
     def __init__(self, x=0, y=0, w=0, h=0, damage=0, friction=False):
         super().__init__(x, y)
         self.w = w
@@ -117,11 +113,11 @@ class Water(NamelessMapObjectEntity):
     @property
     def to_xml(self) -> str:
         # Dumps water.
-        return f'<water x="{self.x}" y="{self.y}" w="{self.w}" h="{self.h}" ' \
-               f'damage="{self.damage}" friction="{str(self.friction).lower()}" />'
+        return dump(Water, self)
 
 
 class Decor(NamedMapObjectEntity):
+    __slots__ = ("model", "f", "u", "v", "attach", "r", "sx", "sy")
     name_counter = 0  # Static counter for naming decorations
 
     def __init__(self, x=0, y=0, uid=None, model="", f=0, u=0, v=0, attach=None,
@@ -144,14 +140,11 @@ class Decor(NamedMapObjectEntity):
     @property
     def to_xml(self) -> str:
         # Dumps decoration.
-        attach_to = "-1"
-        if self.attach is not None:
-            attach_to = self.attach
-        return f'<decor uid="{self.uid}" x="{self.x}" y="{self.y}" u="{self.u}" v="{self.v}" r="{self.r}" ' \
-               f'sx="{self.sx}" sy="{self.sy}" f="{self.f}" model="{self.model}" attach="{attach_to}" />'
+        return dump(Decor, self)
 
 
 class Vehicle(NamedMapObjectEntity):
+    __slots__ = ("side", "tox", "toy", "hpPercent", "model")
     LEFT = -1
     RIGHT = 1
     name_counter = 0  # Static counter for naming vehicles
@@ -176,11 +169,11 @@ class Vehicle(NamedMapObjectEntity):
     @property
     def to_xml(self) -> str:
         # Dumps vehicle.
-        return f'<vehicle uid="{self.uid}" x="{self.x}" y="{self.y}" tox="{self.tox}" toy="{self.toy}" ' \
-               f'side="{self.side}" hpp="{self.hpPercent}" />'
+        return dump(Vehicle, self)
 
 
 class Enemy(NamedMapObjectEntity):
+    __slots__ = ("tox", "toy", "hea", "hmax", "team", "side", "char", "botaction", "ondeath", "incar")
     LEFT = -1
     RIGHT = 1
 
@@ -209,20 +202,11 @@ class Enemy(NamedMapObjectEntity):
     @property
     def to_xml(self):
         # Dumps character.
-        on_death = "-1"
-        if self.ondeath is not None:
-            on_death = self.ondeath
-        incar = "-1"
-        if self.incar is not None:
-            incar = self.incar
-        a = f'<enemy uid="{self.uid}" x="{self.x}" y="{self.y}" tox="{self.tox}" toy="{self.toy}" hea="{self.hea}" ' \
-            f'hmax="{self.hmax}" team="{self.team}" side="{self.side}" char="{self.char}" ' \
-            f'incar="{incar}" botaction="{self.botaction}" ' \
-            f'ondeath="{on_death}" />'
-        return a
+        return dump(Enemy, self)
 
 
 class Player(NamedMapObjectEntity):
+    __slots__ = ("tox", "toy", "hea", "hmax", "team", "side", "char", "botaction", "ondeath", "incar")
     LEFT = -1
     RIGHT = 1
 
@@ -251,20 +235,11 @@ class Player(NamedMapObjectEntity):
     @property
     def to_xml(self):
         # Dumps character.
-        on_death = "-1"
-        if self.ondeath is not None:
-            on_death = self.ondeath
-        incar = "-1"
-        if self.incar is not None:
-            incar = self.incar
-        a = f'<player uid="{self.uid}" x="{self.x}" y="{self.y}" tox="{self.tox}" toy="{self.toy}" hea="{self.hea}" ' \
-            f'hmax="{self.hmax}" team="{self.team}" side="{self.side}" char="{self.char}" ' \
-            f'incar="{incar}" botaction="{self.botaction}" ' \
-            f'ondeath="{on_death}" />'
-        return a
+        return dump(Player, self)
 
 
 class Song(NamedMapObjectEntity):
+    __slots__ = ("url", "volume", "loop", "callback")
     song_name_counter = 0  # Static counter for naming songs
 
     def __init__(self, x=0, y=0, uid=None, url="", volume=0, loop=False, callback=None):
@@ -281,14 +256,12 @@ class Song(NamedMapObjectEntity):
     @property
     def to_xml(self) -> str:
         # Dumps song.
-        callback = "-1"
-        if self.callback is not None:
-            callback = self.callback
-        return f'<song uid="{self.uid}" x="{self.x}" y="{self.y}" volume="{self.volume}" ' \
-               f'url="{self.url}" loop="{self.loop}" callback="{callback}" />'
+        return dump(Song, self)
 
 
 class Inf(NamelessMapObjectEntity):
+    __slots__ = ("mark", "forteam")
+
     def __init__(self, x=0, y=0, mark="", forteam=""):
         super().__init__(x, y)
         self.mark = mark
@@ -297,10 +270,11 @@ class Inf(NamelessMapObjectEntity):
     @property
     def to_xml(self) -> str:
         # Dumps engine mark.
-        return f'<inf x="{self.x}" y="{self.y}" mark="{self.mark}" forteam="{self.forteam}" />'
+        return dump(Inf, self)
 
 
 class Lamp(NamedMapObjectEntity):
+    __slots__ = ("power", "flare")
     lamp_name_counter = 0  # Static counter for naming lamps
 
     def __init__(self, x=0, y=0, uid=None, power=0.0, flare=False):
@@ -316,10 +290,11 @@ class Lamp(NamedMapObjectEntity):
     @property
     def to_xml(self) -> str:
         # Dumps lamp.
-        return f'<lamp uid="{self.uid}" x="{self.x}" y="{self.y}" power="{self.power}" flare="{self.flare}" />'
+        return dump(Lamp, self)
 
 
 class Barrel(NamedMapObjectEntity):
+    __slots__ = ("model", "tox", "toy")
     barrel_name_counter = 0  # Static counter for naming barrels
 
     def __init__(self, x=0, y=0, uid=None, model=None, tox=0, toy=0):
@@ -339,11 +314,11 @@ class Barrel(NamedMapObjectEntity):
     @property
     def to_xml(self) -> str:
         # Dumps barrel.
-        return f'<barrel uid="{self.uid}" x="{self.x}" y="{self.y}" ' \
-               f'tox="{self.tox}" toy="{self.toy}" model="{self.model}" />'
+        return dump(Barrel, self)
 
 
 class Gun(NamedMapObjectEntity):
+    __slots__ = ("model", "command", "upg")
     gun_name_counter = 0  # Static counter for naming guns
 
     def __init__(self, x=0, y=0, uid=None, model="", command=0, upg=0):
@@ -359,11 +334,11 @@ class Gun(NamedMapObjectEntity):
     @property
     def to_xml(self) -> str:
         # Dumps weapon.
-        return f'<gun uid="{self.uid}" x="{self.x}" y="{self.y}" ' \
-               f'model="{self.model}" upg="{self.upg}" command="{self.command}"/>'
+        return dump(Gun, self)
 
 
 class Image(ImageEntity):
+    __slots__ = ()
 
     def __init__(self, width=0, height=0, id=0):
         super().__init__(width, height, id)
@@ -371,10 +346,11 @@ class Image(ImageEntity):
     @property
     def to_xml(self) -> str:
         # Dumps image.
-        return f'<image id="{self.id}" width="{self.width}" height="{self.height}" />'
+        return dump(Image, self)
 
 
 class Pushf(NamedMapObjectEntity):
+    __slots__ = ("w", "h", "tox", "toy", "stab", "damage", "attach")
     pusher_name_counter = 0  # Static counter for naming pushers
 
     def __init__(self, x=0, y=0, uid=None, w=0, h=0, tox=0, toy=0, stab=0, damage=0, attach=None):
@@ -394,14 +370,12 @@ class Pushf(NamedMapObjectEntity):
     @property
     def to_xml(self) -> str:
         # Dumps pusher.
-        # attach_to = "-1"
-        # if self.attach is not None:
-        # attach_to = self.attach
-        return f'<pushf uid="{self.uid}" x="{self.x}" y="{self.y}" w="{self.w}" h="{self.h}" tox="{self.tox}" ' \
-               f'toy="{self.toy}" stab="{self.stab}" damage="{self.damage}" attach="{self.attach}"/>'
+        return dump(Pushf, self)
 
 
 class Bg(NamelessMapObjectEntity):
+    __slots__ = ("w", "h", "u", "v", "f", "s", "c", "m", "a")
+
     def __init__(self, x=0, y=0, w=0, h=0, texX=0, texY=0, f=0, s=False, c="", m="",
                  a=None):
         super().__init__(x, y)
@@ -418,14 +392,12 @@ class Bg(NamelessMapObjectEntity):
     @property
     def to_xml(self) -> str:
         # Dumps background.
-        attach_to = "-1"
-        if self.a is not None:
-            attach_to = self.a
-        return f'<bg x="{self.x}" y="{self.y}" w="{self.w}" h="{self.h}" c="{self.c}" ' \
-               f'm="{self.m}" u="{self.u}" v="{self.v}" f="{self.f}" a="{attach_to}" s="{str(self.s).lower()}" />'
+        return dump(Bg, self)
 
 
 class Trigger(NamedMapObjectEntity):
+    __slots__ = ("implicitSplitting", "enabled", "maxcalls", "actions")
+
     def __init__(self, x=0, y=0, uid="", enabled=False, maxcalls=0, actions=None, implicitSplitting=True, **kwargs):
         super().__init__(x, y, uid)
         if actions is None:
@@ -642,59 +614,141 @@ class Trigger(NamedMapObjectEntity):
     async def generate_trigger(self):
         return self.to_xml
 
+    def split(self) -> list:
+        # The chained triggers this trigger is dumped as, itself when it has at most 10 actions
+        parts = split_trigger_parts(self.uid, self.enabled, self.maxcalls, self.actions, self.implicitSplitting)
+        if len(parts) == 1:
+            return [self]
+        return [Trigger(x=self.x, y=self.y, uid=uid, enabled=enabled, maxcalls=maxcalls, actions=actions)
+                for uid, enabled, maxcalls, actions in parts]
+
     @property
     def to_xml(self) -> str:
-        if len(self.actions) < 11:
-            element = Element("trigger")
-            attribs = {
-                "uid": self.uid,
-                "x": str(self.x),
-                "y": str(self.y),
-                "enabled": str(self.enabled).lower(),
-                "maxcalls": str(self.maxcalls)
-            }
-            for i in range(10):
-                action = DO_NOTHING
-                if i < len(self.actions):
-                    action = self.actions[i]
-                args = action.args
-                attribs[f"actions_{i + 1}_type"] = str(action.opID)
-                if len(args) > 0:
-                    attribs[f"actions_{i + 1}_targetA"] = args[0]
-                if len(args) > 1:
-                    attribs[f"actions_{i + 1}_targetB"] = args[1]
-            element.attrib = attribs
-            return tostring(element, encoding="unicode")
-
-        # Handle more actions and splitting triggers
-        triggers = []
-        action_groups = chunk(self.actions)
-        for group in action_groups:
-            if len(group) == 0:
-                continue
-            if group[-1].opID == 123:
-                raise Exception(
-                    f"An 'Skip next trigger' action is at the end of trigger {self.uid}. Please fix this yourself.")
-            triggers.append(Trigger(
-                uid=self.uid,
-                x=self.x,
-                y=self.y,
-                enabled=self.enabled,
-                maxcalls=self.maxcalls,
-                actions=group
-            ))
-
-        result = ""
-
-        for trigger in triggers:
-            trigger_result = trigger.to_xml
-            result += trigger_result + "\n"
-
-        return result
-
-
-def chunk(actions):
-    return [actions[i:i + 9] for i in range(0, len(actions), 9)] + [actions[(len(actions) % 9):]]
+        return split_trigger_xml(self.uid, self.x, self.y, self.enabled, self.maxcalls, self.actions,
+                                 self.implicitSplitting)
+
+
+# Action slots of a trigger element
+MAX_TRIGGER_ACTIONS = 10
+# opIDs the splitting of long triggers depends on
+EXECUTE_TRIGGER = 99
+SKIP_NEXT = 123
+# uid of the index-th trigger a long trigger is continued in
+SPLIT_UID_FORMAT = "{uid}_part{index}"
+
+# Format templates of the trigger element: the head, every action slot with 0, 1 and 2 arguments, and per number
+# of actions the remaining DO_NOTHING slots and the end of the element
+TRIGGER_HEAD = '<trigger uid="{}" x="{}" y="{}" enabled="{}" maxcalls="{}"'
+ACTION_TEMPLATES = tuple((f' actions_{i}_type="{{}}"',
+                          f' actions_{i}_type="{{}}" actions_{i}_targetA="{{}}"',
+                          f' actions_{i}_type="{{}}" actions_{i}_targetA="{{}}" actions_{i}_targetB="{{}}"')
+                         for i in range(1, 11))
+TRIGGER_TAILS = tuple("".join(f' actions_{i}_type="{DO_NOTHING.opID}"' for i in range(count + 1, 11)) + " />"
+                      for count in range(11))
+# The escapes of ElementTree for attribute values
+ATTRIBUTE_ESCAPES = str.maketrans({"&": "&amp;", "<": "&lt;", ">": "&gt;", '"': "&quot;", "\r": "&#13;",
+                                   "\n": "&#10;", "\t": "&#09;"})
+_needs_escape = compile_regex('[&<>"\r\n\t]').search
+
+
+def attribute_value(value) -> str:
+    # Objects given as action arguments are written as their uid, other non-strings as str()
+    if type(value) is not str:
+        value = value.uid if isinstance(value, NamedMapObjectEntity) else str(value)
+    return value.translate(ATTRIBUTE_ESCAPES) if _needs_escape(value) else value
+
+
+def trigger_xml(uid, x, y, enabled, maxcalls, actions) -> str:
+    # One trigger element of at most 10 actions, the free action slots are filled with DO_NOTHING
+    values = [uid, x, y, str(enabled).lower(), maxcalls]
+    pieces = [TRIGGER_HEAD]
+    for templates, action in zip(ACTION_TEMPLATES, actions):
+        args = action.args
+        if len(args) > 2:
+            args = args[:2]
+        pieces.append(templates[len(args)])
+        values.append(action.opID)
+        values.extend(args)
+    pieces.append(TRIGGER_TAILS[len(actions)])
+    template = "".join(pieces)
+    xml = template.format(*values)
+    # Values are formatted as they are, which is right unless one of them holds a character to escape (an extra
+    # quote or a special character) or is an object, whose default str() starts with "<". Plain substring tests
+    # are much faster than one regular expression search over the element.
+    if xml.count('"') != template.count('"') or xml.find("<", 1) != -1 or xml.find(">", 0, -1) != -1 or \
+            "&" in xml or "\n" in xml or "\r" in xml or "\t" in xml:
+        xml = template.format(*map(attribute_value, values))
+    return xml
+
+
+def action_blocks(actions) -> list:
+    # (start, end) of runs of actions that must stay in one trigger: a skip-next action and the action it skips
+    blocks = []
+    start = 0
+    last = len(actions) - 1
+    for i, action in enumerate(actions):
+        if action.opID != SKIP_NEXT or i == last:
+            blocks.append((start, i + 1))
+            start = i + 1
+    return blocks
+
+
+def split_actions(actions) -> list:
+    # Packs actions into the fewest groups fitting into chained triggers, every group but the last keeps a slot
+    # for the execute action linking it to the next one. A skip-next action never ends a group but the last, it
+    # would skip the link instead of its own next action. Continue-if actions need no care: stopping their trigger
+    # stops the link too, and so the rest of the actions as before. Filling every group as far as possible gives
+    # the fewest groups, no other packing covers more actions with the same number of groups.
+    if len(actions) <= MAX_TRIGGER_ACTIONS:
+        return [actions]
+    groups = []
+    start = 0
+    for block_start, block_end in action_blocks(actions):
+        if len(actions) - start <= MAX_TRIGGER_ACTIONS:
+            # The rest fits into the last trigger, which needs no link
+            break
+        if block_end - start < MAX_TRIGGER_ACTIONS:
+            continue
+        if block_start > start:
+            groups.append(actions[start:block_start])
+            start = block_start
+        if block_end - start >= MAX_TRIGGER_ACTIONS and len(actions) - start > MAX_TRIGGER_ACTIONS:
+            raise ValueError(f"{block_end - block_start} actions chained by skip-next actions do not fit into "
+                             f"one trigger with a link to the next one.")
+    groups.append(actions[start:])
+    return groups
+
+
+def split_uid(uid, index: int) -> str:
+    return SPLIT_UID_FORMAT.format(uid=uid, index=index)
+
+
+def split_trigger_parts(uid, enabled, maxcalls, actions, implicit_splitting: bool = True) -> list:
+    # (uid, enabled, maxcalls, actions) of the chained triggers of a trigger. The first one keeps the uid, enabled
+    # and maxcalls of the trigger, the others are only ever executed by the link of the previous one.
+    groups = split_actions(actions)
+    if len(groups) == 1:
+        return [(uid, enabled, maxcalls, actions)]
+    if not implicit_splitting:
+        raise ValueError(f"Trigger {uid} has {len(actions)} actions, more than {MAX_TRIGGER_ACTIONS}, "
+                         f"and implicit splitting is disabled.")
+    parts = []
+    for index, group in enumerate(groups):
+        if index + 1 < len(groups):
+            group = group + [TriggersActionEntity(EXECUTE_TRIGGER, [split_uid(uid, index + 1)])]
+        if index == 0:
+            parts.append((uid, enabled, maxcalls, group))
+        else:
+            parts.append((split_uid(uid, index), True, -1, group))
+    return parts
+
+
+def split_trigger_xml(uid, x, y, enabled, maxcalls, actions, implicit_splitting: bool = True) -> str:
+    if len(actions) <= MAX_TRIGGER_ACTIONS:
+        return trigger_xml(uid, x, y, enabled, maxcalls, actions)
+    return "".join(trigger_xml(part_uid, x, y, part_enabled, part_maxcalls, group)
+                   for part_uid, part_enabled, part_maxcalls, group in
+                   split_trigger_parts(uid, enabled, maxcalls, actions, implicit_splitting))
 
 
 def variable_check(var1):
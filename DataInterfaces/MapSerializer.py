@@ -0,0 +1,199 @@
+"""
+MapSerializer Module
+
+This module provides a synchronous XML serialization engine for Map instances. Every map object class
+gets an attribute template compiled once into a str.format call fed by an attrgetter, and a whole map
+is produced by a single ''.join over a generator, without scheduling one coroutine per object.
+XML_TEMPLATES is the only definition of the XML of these classes: their to_xml properties dump through it.
+
+Functions:
+    get_serializer(obj_type) -> Callable:
+        Returns the compiled object -> XML function of a map object class.
+
+    iter_objects_xml(objects: dict, cache: bool) -> Iterator[str]:
+        Yields the XML fragment of every object of a Map.objects dict, in dump order.
+        Values stored in a ColumnStore are serialized by the store itself.
+
+    objects_to_xml(objects: dict, cache: bool) -> str:
+        Serializes a whole Map.objects dict into one string.
+
+    get_cached_class(obj_type) -> type:
+        Returns the dirty-tracking subclass of a map object class, e.g. CachedBox for Box.
+
+While DataInterfaces.Instrumentation has a hook registered, every type is serialized in one timed step and
+reported as a Map.to_xml span with an objects_dumped counter.
+
+With cache=True, the objects of the classes of XML_TEMPLATES keep their XML fragment in their _xml slot and
+later dumps reuse it. The first cached dump of an object switches its class to the dirty-tracking subclass of
+its class, whose __setattr__ drops the fragment on every assignment, so objects that are never dumped with
+the cache pay nothing for it. Triggers are not cached, their actions are changed in place.
+
+Usage Example:
+    # Import the function
+    from DataInterfaces.MapSerializer import objects_to_xml
+
+    xml_content = objects_to_xml(map_instance.objects)
+"""
+from operator import attrgetter
+from typing import Callable, Iterator
+
+from DataInterfaces import Instrumentation
+from DataInterfaces.MapObjects import Door, Region, Timer, Vehicle, Box, Water, Decor, Song, Lamp, Barrel, Gun, \
+    Pushf, Bg, Enemy, Player, Inf, Image
+
+
+def reference(value):
+    # Object references are dumped as -1 when unset
+    return "-1" if value is None else value
+
+
+def lower_bool(value) -> str:
+    return str(value).lower()
+
+
+_CHARACTER_FIELDS = ("uid", "x", "y", "tox", "toy", "hea", "hmax", "team", "side", "char",
+                     ("incar", reference), "botaction", ("ondeath", reference))
+
+# Map object class -> (format template, fields), a field is an attribute name or (attribute name, transform)
+XML_TEMPLATES = {
+    Player: ('<player uid="{}" x="{}" y="{}" tox="{}" toy="{}" hea="{}" hmax="{}" team="{}" side="{}" char="{}" '
+             'incar="{}" botaction="{}" ondeath="{}" />', _CHARACTER_FIELDS),
+    Enemy: ('<enemy uid="{}" x="{}" y="{}" tox="{}" toy="{}" hea="{}" hmax="{}" team="{}" side="{}" char="{}" '
+            'incar="{}" botaction="{}" ondeath="{}" />', _CHARACTER_FIELDS),
+    Pushf: ('<pushf uid="{}" x="{}" y="{}" w="{}" h="{}" tox="{}" toy="{}" stab="{}" damage="{}" attach="{}"/>',
+            ("uid", "x", "y", "w", "h", "tox", "toy", "stab", "damage", "attach")),
+    Image: ('<image id="{}" width="{}" height="{}" />', ("id", "width", "height")),
+    Bg: ('<bg x="{}" y="{}" w="{}" h="{}" c="{}" m="{}" u="{}" v="{}" f="{}" a="{}" s="{}" />',
+         ("x", "y", "w", "h", "c", "m", "u", "v", "f", ("a", reference), ("s", lower_bool))),
+    Water: ('<water x="{}" y="{}" w="{}" h="{}" damage="{}" friction="{}" />',
+            ("x", "y", "w", "h", "damage", ("friction", lower_bool))),
+    Box: ('<box x="{}" y="{}" w="{}" h="{}" m="{}" />', ("x", "y", "w", "h", "m")),
+    Door: ('<door uid="{}" vis="{}" x="{}" y="{}" w="{}" h="{}" moving="{}" tarx="{}" tary="{}" '
+           'attach="{}" maxspeed="{}" />',
+           ("uid", ("vis", lower_bool), "x", "y", "w", "h", ("moving", lower_bool), "tarx", "tary",
+            ("attach", reference), "maxspeed")),
+    Decor: ('<decor uid="{}" x="{}" y="{}" u="{}" v="{}" r="{}" sx="{}" sy="{}" f="{}" model="{}" attach="{}" />',
+            ("uid", "x", "y", "u", "v", "r", "sx", "sy", "f", "model", ("attach", reference))),
+    Gun: ('<gun uid="{}" x="{}" y="{}" model="{}" upg="{}" command="{}"/>',
+          ("uid", "x", "y", "model", "upg", "command")),
+    Region: ('<region uid="{}" x="{}" y="{}" w="{}" h="{}" use_target="{}" use_on="{}" attach="{}" />',
+             ("uid", "x", "y", "w", "h", ("use_target", reference), "use_on", ("attach", reference))),
+    Timer: ('<timer uid="{}" x="{}" y="{}" enabled="{}" maxcalls="{}" target="{}" delay="{}" />',
+            ("uid", "x", "y", ("enabled", lower_bool), "maxcalls", ("target", reference), "delay")),
+    Inf: ('<inf x="{}" y="{}" mark="{}" forteam="{}" />', ("x", "y", "mark", "forteam")),
+    Vehicle: ('<vehicle uid="{}" x="{}" y="{}" tox="{}" toy="{}" side="{}" hpp="{}" />',
+              ("uid", "x", "y", "tox", "toy", "side", "hpPercent")),
+    Song: ('<song uid="{}" x="{}" y="{}" volume="{}" url="{}" loop="{}" callback="{}" />',
+           ("uid", "x", "y", "volume", "url", "loop", ("callback", reference))),
+    Lamp: ('<lamp uid="{}" x="{}" y="{}" power="{}" flare="{}" />', ("uid", "x", "y", "power", "flare")),
+    Barrel: ('<barrel uid="{}" x="{}" y="{}" tox="{}" toy="{}" model="{}" />',
+             ("uid", "x", "y", "tox", "toy", "model")),
+}
+
+_serializers = {}
+_cached_classes = {}
+_set_field = object.__setattr__
+
+
+def compile_serializer(obj_type) -> Callable:
+    template = XML_TEMPLATES.get(obj_type)
+    if template is None:
+        # No template (e.g. Trigger), use the class' own to_xml
+        return attrgetter("to_xml")
+
+    template, fields = template
+    fill = template.format
+    names = tuple(field if isinstance(field, str) else field[0] for field in fields)
+    transforms = tuple((i, field[1]) for i, field in enumerate(fields) if not isinstance(field, str))
+    get_values = attrgetter(*names)
+
+    if not transforms:
+        def serialize(obj):
+            return fill(*get_values(obj))
+        return serialize
+
+    def serialize_transformed(obj):
+        values = list(get_values(obj))
+        for i, transform in transforms:
+            values[i] = transform(values[i])
+        return fill(*values)
+
+    return serialize_transformed
+
+
+def get_serializer(obj_type) -> Callable:
+    serializer = _serializers.get(obj_type)
+    if serializer is None:
+        serializer = _serializers[obj_type] = compile_serializer(obj_type)
+    return serializer
+
+
+def _set_and_mark_dirty(self, name, value):
+    _set_field(self, name, value)
+    _set_field(self, "_xml", None)
+
+
+def get_cached_class(obj_type) -> type:
+    cached_class = _cached_classes.get(obj_type)
+    if cached_class is None:
+        # No new slots, so that objects can switch between obj_type and cached_class through __class__
+        cached_class = _cached_classes[obj_type] = type(f"Cached{obj_type.__name__}", (obj_type,), {
+            "__slots__": (),
+            "__module__": __name__,
+            "map_object_type": obj_type,
+            "__setattr__": _set_and_mark_dirty,
+        })
+        # Module attribute, so that cached objects can be pickled
+        globals()[cached_class.__name__] = cached_class
+    return cached_class
+
+
+def cached_type_xml(obj_type, items) -> list:
+    # Fragments of one type, taken from the _xml slots and serialized again only for dirty or new objects
+    serialize = get_serializer(obj_type)
+    cached_class = get_cached_class(obj_type)
+
+    def refresh(obj):
+        xml = serialize(obj)
+        obj_class = type(obj)
+        if obj_class is obj_type:
+            obj.__class__ = cached_class
+        elif obj_class is not cached_class:
+            # Subclasses of unknown classes cannot track assignments
+            return xml
+        _set_field(obj, "_xml", xml)
+        return xml
+
+    return [getattr(obj, "_xml", None) or refresh(obj) for obj in items]
+
+
+def iter_type_xml(obj_type, items, cache: bool = False) -> Iterator[str]:
+    iter_xml = getattr(items, "iter_xml", None)
+    if iter_xml is not None:
+        # Column stores serialize straight from their columns
+        return iter_xml()
+    if cache and obj_type in XML_TEMPLATES:
+        return iter(cached_type_xml(obj_type, items))
+    return map(get_serializer(obj_type), items)
+
+
+def instrumented_type_xml(obj_type, items, cache: bool = False) -> list:
+    # The fragments of one type, built eagerly so that the span does not time the consumer
+    with Instrumentation.span("Map.to_xml", type=obj_type.__name__, objects=len(items)):
+        fragments = list(iter_type_xml(obj_type, items, cache))
+    Instrumentation.count("objects_dumped", len(items), type=obj_type.__name__)
+    return fragments
+
+
+def iter_objects_xml(objects: dict, cache: bool = False) -> Iterator[str]:
+    for obj_type, items in objects.items():
+        if not items:
+            continue
+        if Instrumentation.is_enabled():
+            yield from instrumented_type_xml(obj_type, items, cache)
+        else:
+            yield from iter_type_xml(obj_type, items, cache)
+
+
+def objects_to_xml(objects: dict, cache: bool = False) -> str:
+    return ''.join(iter_objects_xml(objects, cache))
@@ -0,0 +1,248 @@
+"""
+MapTransform Module
+
+This module implements bulk geometry transforms over a Map: translation, scaling, horizontal mirroring and
+rectangle cropping. Translate, scale and mirror are folded into one affine map (value * a + b) per field role,
+which is then applied field by field over all objects of a type. Only column stores (Box, Bg and Decor, see
+DataInterfaces.ColumnStore) are vectorized: their columns are updated and cropped through NumPy views when
+NumPy is installed. Objects kept in lists have their values gathered and transformed in one pass, then written back one
+object at a time.
+
+Results keep the kind of their value, whatever the storage: floats stay floats, and ints stay ints unless the
+result is not integral. The same transform therefore dumps the same XML from lists and from column stores.
+
+Field roles:
+    x, y: Positions (x, y and door targets tarx, tary).
+    w, h: Extents of rectangular objects.
+    vx, vy: Velocities and offsets (tox, toy, decoration u, v), scaled but never translated.
+    sx, sy: Decoration scales.
+    side, angle: Facing side of characters and vehicles and decoration rotation, negated by mirroring.
+
+Functions:
+    transform_map(map_instance, translate, scale, origin, mirror, crop, types):
+        Applies the transforms in the order translate, scale, mirror, crop.
+
+Usage Example:
+    # Shift everything 100 units right, double its size and mirror it around x = 0
+    map_instance.transform(translate=(100, 0), scale=2, mirror=0)
+
+    # Keep only what lies in a rectangle
+    map_instance.transform(crop=(0, 0, 2000, 1000))
+"""
+from operator import attrgetter
+from typing import Optional, Union
+
+from DataInterfaces.ColumnStore import ColumnStore
+from DataInterfaces.MapObjects import Door, Region, Timer, Vehicle, Box, Water, Decor, Song, Lamp, Barrel, Gun, \
+    Pushf, Bg, Enemy, Player, Inf, Trigger, Image
+
+_POINT = {"x": ("x",), "y": ("y",)}
+_RECT = {"x": ("x",), "y": ("y",), "w": ("w",), "h": ("h",)}
+_CHARACTER = {"x": ("x",), "y": ("y",), "vx": ("tox",), "vy": ("toy",), "side": ("side",)}
+
+# Map object class -> role -> fields
+TRANSFORM_FIELDS = {
+    Player: _CHARACTER,
+    Enemy: _CHARACTER,
+    Vehicle: _CHARACTER,
+    Pushf: {**_RECT, "vx": ("tox",), "vy": ("toy",)},
+    Bg: _RECT,
+    Water: _RECT,
+    Box: _RECT,
+    Region: _RECT,
+    Door: {"x": ("x", "tarx"), "y": ("y", "tary"), "w": ("w",), "h": ("h",)},
+    Decor: {"x": ("x",), "y": ("y",), "vx": ("u",), "vy": ("v",), "sx": ("sx",), "sy": ("sy",), "angle": ("r",)},
+    Barrel: {"x": ("x",), "y": ("y",), "vx": ("tox",), "vy": ("toy",)},
+    Gun: _POINT,
+    Lamp: _POINT,
+    Song: _POINT,
+    Inf: _POINT,
+    Trigger: _POINT,
+    Timer: _POINT,
+    Image: {},
+}
+
+# Types left untouched by cropping: map logic, global marks and images
+CROP_EXEMPT = (Trigger, Timer, Inf, Song, Image)
+
+
+def same_kind(value, result):
+    # The kind column stores keep for a row: a float stays a float, an int stays an int while the result is
+    # integral
+    if type(value) is float:
+        return float(result)
+    if type(result) is float and result.is_integer():
+        return int(result)
+    return result
+
+
+def is_number(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def role_affines(translate=(0, 0), scale=(1, 1), origin=(0, 0), mirror: Optional[float] = None) -> dict:
+    # role -> (a, b) such that the transformed value is value * a + b
+    dx, dy = translate
+    kx, ky = scale
+    ox, oy = origin
+    affines = {
+        "x": (kx, kx * (dx - ox) + ox),
+        "y": (ky, ky * (dy - oy) + oy),
+        "w": (kx, 0), "h": (ky, 0),
+        "vx": (kx, 0), "vy": (ky, 0),
+        "sx": (kx, 0), "sy": (ky, 0),
+        "side": (1, 0), "angle": (1, 0),
+    }
+    if mirror is not None:
+        a, b = affines["x"]
+        affines["x"] = (-a, 2 * mirror - b)
+        for role in ("vx", "sx", "side", "angle"):
+            affines[role] = (-affines[role][0], 0)
+    return affines
+
+
+def apply_affine_to_list(items: list, field: str, a, b):
+    values = list(map(attrgetter(field), items))
+    results = [same_kind(value, value * a + b) if is_number(value) else value for value in values]
+    for obj, value, result in zip(items, values, results):
+        if result is not value:
+            setattr(obj, field, result)
+
+
+def apply_affine_to_store(store: ColumnStore, field: str, a, b):
+    try:
+        column = store.numpy_column(field)
+    except ImportError:
+        column = store.column(field)
+        for row in range(len(column)):
+            column[row] = column[row] * a + b
+    else:
+        # NaN placeholders of values kept aside stay NaN
+        column *= a
+        column += b
+    store.mark_floats(field)
+
+
+def transform_items(items, fields: dict, affines: dict, mirrored: bool):
+    is_store = isinstance(items, ColumnStore)
+    for role, role_fields in fields.items():
+        a, b = affines[role]
+        if a == 1 and b == 0:
+            continue
+        for field in role_fields:
+            if is_store and field in items.numeric:
+                apply_affine_to_store(items, field, a, b)
+            else:
+                apply_affine_to_list(items, field, a, b)
+
+    if mirrored and "w" in fields:
+        # The mirrored right edge becomes the new left edge
+        for field in fields["x"]:
+            if is_store and field in items.numeric:
+                try:
+                    items.numpy_column(field)[:] -= items.numpy_column("w")
+                    items.mark_floats(field)
+                    continue
+                except ImportError:
+                    pass
+            for obj in items:
+                value, width = getattr(obj, field), obj.w
+                if is_number(value) and is_number(width):
+                    setattr(obj, field, same_kind(value, value - width))
+
+
+def crop_bounds(obj, left, top, right, bottom) -> Optional[tuple]:
+    # Clipped (x, y, w, h) of a rectangle, None when it lies outside
+    x1, y1 = max(obj.x, left), max(obj.y, top)
+    x2, y2 = min(obj.x + obj.w, right), min(obj.y + obj.h, bottom)
+    if x1 >= x2 or y1 >= y2:
+        return None
+    return x1, y1, x2 - x1, y2 - y1
+
+
+def crop_items(items, left, top, right, bottom) -> list:
+    # Clips rectangles in place and returns the objects to drop
+    dropped = []
+    is_rect = None
+    for obj in items:
+        if is_rect is None:
+            is_rect = hasattr(obj, "w")
+        if is_rect:
+            bounds = crop_bounds(obj, left, top, right, bottom)
+            if bounds is None:
+                dropped.append(obj)
+            elif bounds != (obj.x, obj.y, obj.w, obj.h):
+                old = (obj.x, obj.y, obj.w, obj.h)
+                obj.x, obj.y, obj.w, obj.h = (same_kind(value, result) for value, result in zip(old, bounds))
+        elif not (left <= obj.x <= right and top <= obj.y <= bottom):
+            dropped.append(obj)
+    return dropped
+
+
+def crop_store(store: ColumnStore, left, top, right, bottom) -> bool:
+    # Vectorized crop_items of a column store, False when NumPy is missing or a field holds a value kept aside
+    rect = "w" in store.numeric
+    fields = ("x", "y", "w", "h") if rect else ("x", "y")
+    if any(store.overrides[field] for field in fields):
+        return False
+    try:
+        from numpy import flatnonzero, maximum, minimum
+    except ImportError:
+        return False
+    x, y = store.numpy_column("x"), store.numpy_column("y")
+    if rect:
+        w, h = store.numpy_column("w"), store.numpy_column("h")
+        x1, y1 = maximum(x, left), maximum(y, top)
+        x2, y2 = minimum(x + w, right), minimum(y + h, bottom)
+        keep = (x1 < x2) & (y1 < y2)
+        x[:], y[:], w[:], h[:] = x1, y1, x2 - x1, y2 - y1
+        del w, h
+        for field in fields:
+            store.mark_floats(field)
+    else:
+        keep = (left <= x) & (x <= right) & (top <= y) & (y <= bottom)
+    del x, y
+    store.remove_rows(flatnonzero(~keep).tolist())
+    store.compact()
+    return True
+
+
+def transform_map(map_instance, translate: Optional[tuple] = None, scale: Union[float, tuple, None] = None,
+                  origin: tuple = (0, 0), mirror: Optional[float] = None, crop: Optional[tuple] = None,
+                  types: Optional[tuple] = None):
+    if scale is None:
+        scale = (1, 1)
+    elif not isinstance(scale, tuple):
+        scale = (scale, scale)
+    if scale[0] <= 0 or scale[1] <= 0:
+        raise ValueError("Scale factors must be positive, use mirror to flip the map.")
+
+    selected = [obj_type for obj_type in map_instance.objects if types is None or obj_type in types]
+    affines = role_affines(translate or (0, 0), scale, origin, mirror)
+    for obj_type in selected:
+        items = map_instance.objects[obj_type]
+        if items:
+            transform_items(items, TRANSFORM_FIELDS[obj_type], affines, mirror is not None)
+
+    if crop is not None:
+        x, y, w, h = crop
+        left, top, right, bottom = min(x, x + w), min(y, y + h), max(x, x + w), max(y, y + h)
+        for obj_type in selected:
+            items = map_instance.objects[obj_type]
+            if obj_type in CROP_EXEMPT or not items:
+                continue
+            if isinstance(items, ColumnStore) and crop_store(items, left, top, right, bottom):
+                continue
+            dropped = crop_items(items, left, top, right, bottom)
+            if not dropped:
+                continue
+            if isinstance(items, ColumnStore):
+                for obj in dropped:
+                    items.remove(obj)
+                items.compact()
+            else:
+                dropped_ids = {id(obj) for obj in dropped}
+                map_instance.objects[obj_type] = [obj for obj in items if id(obj) not in dropped_ids]
+        map_instance.rebuild_uid_index()
+
+    map_instance.rebuild_spatial_index()
@@ -0,0 +1,281 @@
+"""
+SpatialIndex Module
+
+This module provides a uniform grid index over the rectangular map objects (objects with x, y, w and h
+fields such as Box, Region, Door, Water, Pushf and Bg), answering rectangle, point and nearest-object
+queries without scanning every object of the map.
+
+Note:
+    Objects are bucketed by their bounds at insertion. Queries check the current bounds of the candidates they
+    find, so an object moved without update() is never returned for an area it has left, and it is re-bucketed
+    when a query comes across it. It is still missed by queries of the area it moved to until then: call
+    update(obj) (Map.move_object or Map.update_object_bounds for maps) after every change of x, y, w or h.
+
+Classes:
+    SpatialGrid:
+        A uniform grid bucketing rectangles by the cells they cover.
+
+Usage Example:
+    # Import the class
+    from DataInterfaces.SpatialIndex import SpatialGrid
+
+    grid = SpatialGrid(cell_size=256)
+    grid.insert(box)
+
+    # Objects overlapping a rectangle, containing a point, and closest to a point
+    walls = grid.query_rect(0, 0, 500, 100)
+    under_cursor = grid.query_point(120, 40)
+    closest = grid.nearest(120, 40)
+
+    # After changing the geometry of an indexed object
+    box.x += 100
+    grid.update(box)
+"""
+from math import floor, inf
+from typing import Iterable, Optional
+
+# Objects covering more cells than this are kept aside and checked on every query
+MAX_CELLS_PER_OBJECT = 64
+
+
+def bounds_of(obj) -> tuple:
+    # (left, top, right, bottom) of a map object, negative sizes are normalized
+    x1 = obj.x
+    y1 = obj.y
+    x2 = x1 + obj.w
+    y2 = y1 + obj.h
+    if x2 < x1:
+        x1, x2 = x2, x1
+    if y2 < y1:
+        y1, y2 = y2, y1
+    return x1, y1, x2, y2
+
+
+def distance_to_bounds(x, y, bounds: tuple) -> float:
+    x1, y1, x2, y2 = bounds
+    dx = x1 - x if x < x1 else (x - x2 if x > x2 else 0)
+    dy = y1 - y if y < y1 else (y - y2 if y > y2 else 0)
+    return (dx * dx + dy * dy) ** 0.5
+
+
+class SpatialGrid:
+    """
+    A uniform grid bucketing rectangles by the cells they cover.
+
+    Attributes:
+        cell_size (float): The width and height of a grid cell in map units.
+        cells (dict): (column, row) -> set of objects overlapping that cell.
+        oversized (set): Objects spanning more than MAX_CELLS_PER_OBJECT cells.
+        entries (dict): object -> (bounds, cell range) of every indexed object.
+        extent (list): [min column, min row, max column, max row] ever occupied, None while empty.
+
+    Methods:
+        insert(obj): Adds an object to the index.
+        remove(obj): Removes an object from the index.
+        update(obj): Re-buckets an object whose x, y, w or h changed.
+        query_rect(x, y, w, h, types): Objects overlapping the rectangle.
+        query_point(x, y, types): Objects containing the point.
+        nearest(x, y, types, max_distance): The object closest to the point.
+    """
+
+    def __init__(self, cell_size: float = 256, objects: Iterable = ()):
+        if cell_size <= 0:
+            raise ValueError("Cell size must be positive.")
+        self.cell_size = cell_size
+        self.cells = {}
+        self.oversized = set()
+        self.entries = {}
+        self.extent = None
+        for obj in objects:
+            self.insert(obj)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, obj):
+        return obj in self.entries
+
+    def _cell_range(self, bounds: tuple) -> tuple:
+        size = self.cell_size
+        return (floor(bounds[0] / size), floor(bounds[1] / size),
+                floor(bounds[2] / size), floor(bounds[3] / size))
+
+    def insert(self, obj):
+        if obj in self.entries:
+            self.update(obj)
+            return
+        bounds = bounds_of(obj)
+        cell_range = self._cell_range(bounds)
+        column1, row1, column2, row2 = cell_range
+        if (column2 - column1 + 1) * (row2 - row1 + 1) > MAX_CELLS_PER_OBJECT:
+            self.oversized.add(obj)
+            cell_range = None
+        else:
+            extent = self.extent
+            if extent is None:
+                self.extent = [column1, row1, column2, row2]
+            else:
+                extent[0] = min(extent[0], column1)
+                extent[1] = min(extent[1], row1)
+                extent[2] = max(extent[2], column2)
+                extent[3] = max(extent[3], row2)
+            cells = self.cells
+            for column in range(column1, column2 + 1):
+                for row in range(row1, row2 + 1):
+                    bucket = cells.get((column, row))
+                    if bucket is None:
+                        bucket = cells[(column, row)] = set()
+                    bucket.add(obj)
+        self.entries[obj] = (bounds, cell_range)
+
+    def remove(self, obj):
+        entry = self.entries.pop(obj, None)
+        if entry is None:
+            raise KeyError(f"{type(obj).__name__} is not in the spatial index.")
+        cell_range = entry[1]
+        if cell_range is None:
+            self.oversized.discard(obj)
+            return
+        column1, row1, column2, row2 = cell_range
+        cells = self.cells
+        for column in range(column1, column2 + 1):
+            for row in range(row1, row2 + 1):
+                bucket = cells[(column, row)]
+                bucket.discard(obj)
+                if not bucket:
+                    del cells[(column, row)]
+
+    def update(self, obj):
+        entry = self.entries.get(obj)
+        if entry is not None:
+            if entry[0] == bounds_of(obj):
+                return
+            self.remove(obj)
+        self.insert(obj)
+
+    def _refresh(self, stale: list):
+        # Re-buckets objects found with bounds other than the indexed ones
+        for obj in stale:
+            self.update(obj)
+
+    def _candidates(self, column1, row1, column2, row2):
+        cells = self.cells
+        found = set(self.oversized)
+        if (column2 - column1 + 1) * (row2 - row1 + 1) > len(cells):
+            # Query larger than the occupied part of the grid, walk the buckets instead of the area
+            for (column, row), bucket in cells.items():
+                if column1 <= column <= column2 and row1 <= row <= row2:
+                    found.update(bucket)
+            return found
+        for column in range(column1, column2 + 1):
+            for row in range(row1, row2 + 1):
+                bucket = cells.get((column, row))
+                if bucket is not None:
+                    found.update(bucket)
+        return found
+
+    def query_rect(self, x, y, w, h, types: Optional[tuple] = None) -> list:
+        query = bounds_of_rect(x, y, w, h)
+        qx1, qy1, qx2, qy2 = query
+        entries = self.entries
+        result = []
+        stale = []
+        for obj in self._candidates(*self._cell_range(query)):
+            if types is not None and not isinstance(obj, types):
+                continue
+            bounds = bounds_of(obj)
+            if bounds != entries[obj][0]:
+                stale.append(obj)
+            x1, y1, x2, y2 = bounds
+            if x1 < qx2 and qx1 < x2 and y1 < qy2 and qy1 < y2:
+                result.append(obj)
+        self._refresh(stale)
+        return result
+
+    def query_point(self, x, y, types: Optional[tuple] = None) -> list:
+        size = self.cell_size
+        bucket = self.cells.get((floor(x / size), floor(y / size)), ())
+        entries = self.entries
+        result = []
+        stale = []
+        for candidates in (bucket, self.oversized):
+            for obj in candidates:
+                if types is not None and not isinstance(obj, types):
+                    continue
+                bounds = bounds_of(obj)
+                if bounds != entries[obj][0]:
+                    stale.append(obj)
+                x1, y1, x2, y2 = bounds
+                if x1 <= x <= x2 and y1 <= y <= y2:
+                    result.append(obj)
+        self._refresh(stale)
+        return result
+
+    def nearest(self, x, y, types: Optional[tuple] = None, max_distance: float = inf):
+        # Searches rings of cells around the point until no closer object can exist
+        entries = self.entries
+        best = None
+        best_distance = max_distance
+        stale = []
+        for obj in self.oversized:
+            if types is None or isinstance(obj, types):
+                bounds = bounds_of(obj)
+                if bounds != entries[obj][0]:
+                    stale.append(obj)
+                distance = distance_to_bounds(x, y, bounds)
+                if distance <= best_distance:
+                    best, best_distance = obj, distance
+
+        if not self.cells:
+            self._refresh(stale)
+            return best
+        size = self.cell_size
+        column, row = floor(x / size), floor(y / size)
+        min_column, min_row, max_column, max_row = self.extent
+        max_radius = max(abs(column - min_column), abs(column - max_column),
+                         abs(row - min_row), abs(row - max_row))
+        seen = set()
+        radius = 0
+        while radius <= max_radius:
+            # Everything outside the rings searched so far is at least this far from the point
+            if best is not None and best_distance <= (radius - 1) * size:
+                break
+            if (radius - 1) * size > max_distance:
+                break
+            for ring_column, ring_row in ring_cells(column, row, radius):
+                bucket = self.cells.get((ring_column, ring_row))
+                if bucket is None:
+                    continue
+                for obj in bucket:
+                    if obj in seen:
+                        continue
+                    seen.add(obj)
+                    if types is not None and not isinstance(obj, types):
+                        continue
+                    bounds = bounds_of(obj)
+                    if bounds != entries[obj][0]:
+                        stale.append(obj)
+                    distance = distance_to_bounds(x, y, bounds)
+                    if distance <= best_distance:
+                        best, best_distance = obj, distance
+            radius += 1
+        self._refresh(stale)
+        return best
+
+
+def bounds_of_rect(x, y, w, h) -> tuple:
+    x2 = x + w
+    y2 = y + h
+    return min(x, x2), min(y, y2), max(x, x2), max(y, y2)
+
+
+def ring_cells(column, row, radius):
+    if radius == 0:
+        yield column, row
+        return
+    for offset in range(-radius, radius + 1):
+        yield column + offset, row - radius
+        yield column + offset, row + radius
+    for offset in range(-radius + 1, radius):
+        yield column - radius, row + offset
+        yield column + radius, row + offset
@@ -0,0 +1,185 @@
+"""
+TriggerOptimizer Module
+
+This module shrinks the trigger logic of a Map without changing what it does in game. The reference graph of
+triggers and timers is built once, then the pass:
+    - removes the triggers and timers that can never run,
+    - strips the do-nothing actions (opID -1) that are not the target of a skip-next action,
+    - merges a trigger into the one executing it when that execute is its only reference and the last action
+      of the caller, so that both always run together.
+
+Triggers run when referenced by a region use_target, a character ondeath, a song callback or the target of a
+running timer, and timers run when enabled. Everything referenced from the actions of a trigger that runs runs
+as well. Any action argument equal to the uid of a trigger or a timer counts as a reference, whatever its opID
+(execute, activate timer, register chat listener...), so unknown actions keep their targets. Triggers found
+through variables cannot be seen and must be given as roots.
+
+Merged triggers may exceed 10 actions, they are split again into chained triggers when dumped (see
+Trigger.split), so the pass also packs the chained triggers of maps loaded from XML.
+
+Classes:
+    TriggerOptimizationReport:
+        What the pass removed and the size of the trigger and timer XML before and after.
+
+Functions:
+    optimize_triggers(map_instance, roots) -> TriggerOptimizationReport:
+        Runs the pass on a map in place.
+
+Usage Example:
+    report = map_instance.optimize_triggers(roots=["#dynamic_target"])
+    print(report)
+"""
+from collections import Counter
+
+from DataInterfaces.Entity import DO_NOTHING, referenced_uid
+from DataInterfaces.MapObjects import EXECUTE_TRIGGER, MAX_TRIGGER_ACTIONS, SKIP_NEXT, Enemy, Player, Region, Song, \
+    Timer, Trigger
+from DataInterfaces.MapSerializer import objects_to_xml
+
+
+class TriggerOptimizationReport:
+    """
+    What the trigger optimization pass removed and the size of the trigger and timer XML before and after.
+
+    Attributes:
+        triggers_removed (int): Unreachable triggers removed.
+        timers_removed (int): Unreachable timers removed.
+        no_ops_removed (int): Do-nothing actions stripped.
+        triggers_merged (int): Triggers merged into the trigger executing them.
+        triggers_before, triggers_after (int): <trigger> elements dumped, chained triggers included.
+        size_before, size_after (int): Bytes of the trigger and timer XML, i.e. of the map size saved.
+    """
+
+    __slots__ = ("triggers_removed", "timers_removed", "no_ops_removed", "triggers_merged", "triggers_before",
+                 "triggers_after", "size_before", "size_after")
+
+    def __init__(self):
+        for name in self.__slots__:
+            setattr(self, name, 0)
+
+    def __repr__(self):
+        return (f"{self.triggers_removed} unreachable triggers, {self.timers_removed} unreachable timers, "
+                f"{self.no_ops_removed} no-ops and {self.triggers_merged} chained triggers removed: "
+                f"{self.triggers_before} -> {self.triggers_after} dumped triggers, "
+                f"{self.size_before} -> {self.size_after} bytes ({self.size_before - self.size_after} saved)")
+
+
+def measure_xml(map_instance) -> tuple:
+    # (<trigger> elements, bytes) of the triggers and timers dumped
+    xml = objects_to_xml({Trigger: map_instance.objects[Trigger], Timer: map_instance.objects[Timer]})
+    return xml.count("<trigger "), len(xml.encode())
+
+
+def action_references(trigger, uids) -> list:
+    return [referenced_uid(arg) for action in trigger.actions for arg in action.args if referenced_uid(arg) in uids]
+
+
+def reachable_uids(map_instance, roots) -> set:
+    # Uids of the triggers and timers that may run, found by a walk over the reference graph
+    objects = map_instance.objects
+    uids = {obj.uid for obj_type in (Trigger, Timer) for obj in objects[obj_type]}
+    edges = {}
+    for trigger in objects[Trigger]:
+        edges.setdefault(trigger.uid, []).extend(action_references(trigger, uids))
+    for timer in objects[Timer]:
+        edges.setdefault(timer.uid, []).append(referenced_uid(timer.target))
+
+    pending = [referenced_uid(region.use_target) for region in objects[Region]]
+    pending += [referenced_uid(character.ondeath) for obj_type in (Player, Enemy) for character in objects[obj_type]]
+    pending += [referenced_uid(song.callback) for song in objects[Song]]
+    pending += [timer.uid for timer in objects[Timer] if timer.enabled]
+    pending += list(roots)
+    reachable = set()
+    while pending:
+        uid = pending.pop()
+        if uid in uids and uid not in reachable:
+            reachable.add(uid)
+            pending.extend(edges.get(uid, ()))
+    return reachable
+
+
+def strip_no_ops(actions) -> list:
+    # A do-nothing action right after a skip-next action is what it skips, it stays
+    stripped = []
+    for action in actions:
+        if action.opID != DO_NOTHING.opID or (stripped and stripped[-1].opID == SKIP_NEXT):
+            stripped.append(action)
+    return stripped
+
+
+def merge_chains(map_instance, roots) -> set:
+    # The triggers merged into their caller. A callee is merged when the caller ends with the only
+    # reference to it, not behind a skip-next, and the callee runs every time the caller does.
+    objects = map_instance.objects
+    triggers = {}
+    duplicated = set()
+    for trigger in objects[Trigger]:
+        if trigger.uid in triggers:
+            duplicated.add(trigger.uid)
+        triggers[trigger.uid] = trigger
+    references = Counter()
+    for trigger in objects[Trigger]:
+        references.update(action_references(trigger, triggers))
+    references.update(referenced_uid(region.use_target) for region in objects[Region])
+    references.update(referenced_uid(character.ondeath)
+                      for obj_type in (Player, Enemy) for character in objects[obj_type])
+    references.update(referenced_uid(song.callback) for song in objects[Song])
+    references.update(referenced_uid(timer.target) for timer in objects[Timer])
+
+    merged = set()
+    for trigger in objects[Trigger]:
+        if trigger in merged or trigger.uid in duplicated:
+            continue
+        actions = trigger.actions
+        while actions and actions[-1].opID == EXECUTE_TRIGGER and actions[-1].args:
+            callee = triggers.get(referenced_uid(actions[-1].args[0]))
+            if (callee is None or callee is trigger or callee in merged or callee.uid in duplicated
+                    or callee.uid in roots or references[callee.uid] != 1 or not callee.enabled
+                    or not (callee.maxcalls == -1 or 0 < trigger.maxcalls <= callee.maxcalls)
+                    or (len(actions) > 1 and actions[-2].opID == SKIP_NEXT)
+                    or (not trigger.implicitSplitting
+                        and len(actions) - 1 + len(callee.actions) > MAX_TRIGGER_ACTIONS)):
+                break
+            actions = actions[:-1] + callee.actions
+            merged.add(callee)
+        if actions is not trigger.actions:
+            trigger.actions = actions
+    return merged
+
+
+def remove_objects(map_instance, obj_type, removed: set):
+    # Triggers and timers have no columnar storage, their lists are filtered in one pass
+    if removed:
+        items = map_instance.objects[obj_type]
+        items[:] = [obj for obj in items if obj not in removed]
+
+
+def optimize_triggers(map_instance, roots=()) -> TriggerOptimizationReport:
+    report = TriggerOptimizationReport()
+    roots = {referenced_uid(root) for root in roots}
+    report.triggers_before, report.size_before = measure_xml(map_instance)
+    objects = map_instance.objects
+
+    reachable = reachable_uids(map_instance, roots)
+    unreachable = {obj_type: {obj for obj in objects[obj_type] if obj.uid not in reachable}
+                   for obj_type in (Trigger, Timer)}
+    for obj_type, removed in unreachable.items():
+        remove_objects(map_instance, obj_type, removed)
+    report.triggers_removed = len(unreachable[Trigger])
+    report.timers_removed = len(unreachable[Timer])
+
+    for trigger in objects[Trigger]:
+        stripped = strip_no_ops(trigger.actions)
+        if len(stripped) != len(trigger.actions):
+            report.no_ops_removed += len(trigger.actions) - len(stripped)
+            trigger.actions = stripped
+
+    merged = merge_chains(map_instance, roots)
+    remove_objects(map_instance, Trigger, merged)
+    report.triggers_merged = len(merged)
+
+    if report.triggers_removed or report.timers_removed or merged:
+        map_instance.rebuild_uid_index()
+        map_instance.rebuild_spatial_index()
+    report.triggers_after, report.size_after = measure_xml(map_instance)
+    return report
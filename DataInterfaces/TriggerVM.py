@@ -0,0 +1,465 @@
+"""
+TriggerVM Module
+
+This module runs the trigger logic of a Map offline, without the game. Every trigger is compiled once into a tuple
+of (handler, argument A, argument B) steps through a dispatch table keyed by opID, with literal arguments converted
+ahead of time. Variables live in a dict, timers are scheduled on a heap of due ticks, so idle ticks cost nothing
+and a run takes time in proportion to the actions executed, not to the ticks simulated.
+
+Semantics:
+    Triggers run only while enabled, at most maxcalls times (-1 for no limit). "Execute trigger" runs its target
+    at once, nested in the running trigger.
+    Timers with enabled="true" start at tick 0. A running timer executes its target every delay ticks (at least
+    one) until it was fired maxcalls times (-1 for no limit) or is deactivated. Activating a timer that is not
+    running starts it again from the current tick.
+    Variable values are numbers or strings. Numeric strings are stored as numbers, so "5" equals 5, and undefined
+    variables read as 0.
+    Continue-if actions (112/113/116/117) stop the running trigger when their condition fails, skip-next (123)
+    skips the next action when variable A does not equal value B.
+    Actions on the game world (moving doors and regions, chat messages, level switches, web requests) are recorded
+    in TriggerVM.effects, sync actions do nothing. Other opIDs are counted in TriggerVM.unsupported and skipped,
+    or raise TriggerVMError in strict mode.
+
+Classes:
+    TriggerVM:
+        The interpreter of the triggers and timers of one map.
+
+    TriggerVMError:
+        Raised on unsupported actions in strict mode and on runaway execute recursion.
+
+Usage Example:
+    from DataInterfaces.TriggerVM import TriggerVM
+
+    vm = TriggerVM(map_instance, seed=1)
+    vm.enter_region("#start_region")
+    vm.run(30 * 60)
+    assert vm.variables["score"] == 100
+"""
+from collections import Counter
+from heapq import heappop, heappush
+from itertools import count
+from random import Random
+from typing import Union
+
+from DataInterfaces.Entity import referenced_uid
+from DataInterfaces.Map import Map, to_number
+from DataInterfaces.MapObjects import Enemy, Player, Region, Timer, Trigger
+
+# Nested executes allowed before a run is considered endless
+MAX_EXECUTE_DEPTH = 256
+# Control codes returned by handlers
+STOP = 1
+SKIP = 2
+# How a handler takes argument B: as written (a variable name or text) or as a value
+RAW = 0
+VALUE = 1
+
+
+class TriggerVMError(Exception):
+    pass
+
+
+def to_value(value) -> Union[int, float, str]:
+    # Numeric strings become numbers, everything else is kept
+    return to_number(value) if isinstance(value, str) else value
+
+
+def to_text(value) -> str:
+    return value if isinstance(value, str) else str(value)
+
+
+def to_float(value) -> float:
+    return value if isinstance(value, (int, float)) else 0
+
+
+class _TriggerState:
+    __slots__ = ("uid", "program", "enabled", "calls_left")
+
+    def __init__(self, uid, program: tuple, enabled: bool, calls_left: int):
+        self.uid = uid
+        self.program = program
+        self.enabled = enabled
+        self.calls_left = calls_left
+
+
+class _TimerState:
+    __slots__ = ("uid", "target", "delay", "calls_left", "running", "generation")
+
+    def __init__(self, uid, target, delay: int, calls_left: int):
+        self.uid = uid
+        self.target = target
+        self.delay = delay
+        self.calls_left = calls_left
+        self.running = False
+        # Bumped whenever the timer stops, so that its entries still on the heap are skipped
+        self.generation = 0
+
+
+# Handlers, called as handler(vm, argument A, argument B)
+
+def op_nothing(vm, a, b):
+    return None
+
+
+def op_effect(vm, a, b):
+    # Actions on the game world, recorded with their opID by the step compiled for them
+    vm.effects.append((vm.tick, a, b))
+
+
+def op_chat(vm, a, b):
+    vm.chat.append((vm.tick, a, b))
+
+
+def op_activate_timer(vm, a, b):
+    vm.start_timer(a)
+
+
+def op_deactivate_timer(vm, a, b):
+    vm.stop_timer(a)
+
+
+def op_execute(vm, a, b):
+    vm.execute(a)
+
+
+def op_set_value(vm, a, b):
+    vm.variables[a] = b
+
+
+def op_set_value_if_undefined(vm, a, b):
+    vm.variables.setdefault(a, b)
+
+
+def op_add_value(vm, a, b):
+    variables = vm.variables
+    variables[a] = to_float(variables.get(a, 0)) + to_float(b)
+
+
+def op_add_variable(vm, a, b):
+    variables = vm.variables
+    variables[a] = to_float(variables.get(a, 0)) + to_float(variables.get(b, 0))
+
+
+def op_set_variable(vm, a, b):
+    vm.variables[a] = vm.variables.get(b, 0)
+
+
+def op_random_float(vm, a, b):
+    vm.variables[a] = vm.random.random() * to_float(b)
+
+
+def op_random_int(vm, a, b):
+    limit = int(to_float(b))
+    vm.variables[a] = vm.random.randrange(limit) if limit > 0 else 0
+
+
+def op_random_float_variable(vm, a, b):
+    op_random_float(vm, a, vm.variables.get(b, 0))
+
+
+def op_random_int_variable(vm, a, b):
+    op_random_int(vm, a, vm.variables.get(b, 0))
+
+
+def op_continue_if_equal_variable(vm, a, b):
+    variables = vm.variables
+    return None if variables.get(a, 0) == variables.get(b, 0) else STOP
+
+
+def op_continue_if_not_equal_variable(vm, a, b):
+    variables = vm.variables
+    return None if variables.get(a, 0) != variables.get(b, 0) else STOP
+
+
+def op_continue_if_equal_value(vm, a, b):
+    return None if vm.variables.get(a, 0) == b else STOP
+
+
+def op_continue_if_not_equal_value(vm, a, b):
+    return None if vm.variables.get(a, 0) != b else STOP
+
+
+def op_skip_if_not_equal_value(vm, a, b):
+    return SKIP if vm.variables.get(a, 0) != b else None
+
+
+def op_contains_value(vm, a, b):
+    variables = vm.variables
+    variables[a] = 1 if to_text(b) in to_text(variables.get(a, 0)) else 0
+
+
+def op_contains_variable(vm, a, b):
+    variables = vm.variables
+    variables[a] = 1 if to_text(variables.get(b, 0)) in to_text(variables.get(a, 0)) else 0
+
+
+def op_concatenate(vm, a, b):
+    variables = vm.variables
+    variables[a] = to_value(to_text(variables.get(a, 0)) + to_text(variables.get(b, 0)))
+
+
+def op_current_player(vm, a, b):
+    vm.variables[a] = vm.current_player
+
+
+def op_initiator(vm, a, b):
+    vm.variables[a] = vm.initiator
+
+
+def op_killer(vm, a, b):
+    vm.variables[a] = vm.killer
+
+
+def op_talker(vm, a, b):
+    vm.variables[a] = vm.talker
+
+
+def op_message(vm, a, b):
+    vm.variables[a] = vm.message
+
+
+def op_register_chat_listener(vm, a, b):
+    vm.chat_listener = a
+
+
+def op_login_value(vm, a, b):
+    vm.variables[a] = vm.players.get(b, ("", ""))[0]
+
+
+def op_display_value(vm, a, b):
+    vm.variables[a] = vm.players.get(b, ("", ""))[1]
+
+
+def op_login_variable(vm, a, b):
+    vm.variables[a] = vm.players.get(vm.variables.get(b, 0), ("", ""))[0]
+
+
+def op_display_variable(vm, a, b):
+    vm.variables[a] = vm.players.get(vm.variables.get(b, 0), ("", ""))[1]
+
+
+# opID -> (handler, how argument B is taken)
+OPERATIONS = {
+    -1: (op_nothing, RAW),
+    0: (op_effect, RAW),
+    1: (op_effect, RAW),
+    2: (op_effect, RAW),
+    25: (op_activate_timer, RAW),
+    26: (op_deactivate_timer, RAW),
+    42: (op_chat, RAW),
+    50: (op_effect, RAW),
+    99: (op_execute, RAW),
+    100: (op_set_value, VALUE),
+    101: (op_set_value_if_undefined, VALUE),
+    102: (op_add_value, VALUE),
+    104: (op_add_variable, RAW),
+    106: (op_random_float, VALUE),
+    107: (op_random_int, VALUE),
+    112: (op_continue_if_equal_variable, RAW),
+    113: (op_continue_if_not_equal_variable, RAW),
+    116: (op_continue_if_equal_value, VALUE),
+    117: (op_continue_if_not_equal_value, VALUE),
+    123: (op_skip_if_not_equal_value, VALUE),
+    125: (op_set_variable, RAW),
+    137: (op_current_player, RAW),
+    149: (op_contains_value, RAW),
+    150: (op_contains_variable, RAW),
+    152: (op_concatenate, RAW),
+    156: (op_register_chat_listener, RAW),
+    159: (op_talker, RAW),
+    160: (op_message, RAW),
+    169: (op_effect, RAW),
+    180: (op_initiator, RAW),
+    181: (op_killer, RAW),
+    184: (op_login_value, VALUE),
+    185: (op_display_value, VALUE),
+    187: (op_login_variable, RAW),
+    188: (op_display_variable, RAW),
+    223: (op_nothing, RAW),
+    224: (op_nothing, RAW),
+    225: (op_nothing, RAW),
+    226: (op_nothing, RAW),
+    227: (op_nothing, RAW),
+    327: (op_random_float_variable, RAW),
+    328: (op_random_int_variable, RAW),
+}
+# Handlers that record their opID with the arguments
+_RECORDING = (op_effect,)
+
+
+class TriggerVM:
+    """
+    The interpreter of the triggers and timers of one map.
+
+    Attributes:
+        tick (int): The current tick.
+        variables (dict): Variable name -> value.
+        effects (list): (tick, opID, (argument A, argument B)) of every action on the game world.
+        chat (list): (tick, text, color) of every chat message.
+        unsupported (Counter): opID -> number of skipped actions with that opID.
+        missing (Counter): uid -> number of executes and timer activations of objects that do not exist.
+        executions (int): Number of trigger runs.
+        actions_run (int): Number of actions executed.
+        current_player, initiator, killer, talker: Player slots returned by the player actions.
+        message (str): Text returned by the get message action.
+        players (dict): Player slot -> (login, display name).
+        chat_listener: uid of the trigger receiving chat messages.
+
+    Methods:
+        execute(uid): Runs a trigger, as the execute action does.
+        enter_region(uid, player): Runs the use_target of a region, with player as initiator.
+        kill(uid, killer): Runs the ondeath trigger of a player or an enemy.
+        say(player, message): Sends a chat message to the chat listener.
+        start_timer(uid), stop_timer(uid): Activates or deactivates a timer.
+        run(ticks): Advances the simulation, firing the timers due.
+    """
+
+    def __init__(self, map_instance: Map, seed=None, strict: bool = False, max_depth: int = MAX_EXECUTE_DEPTH):
+        self.tick = 0
+        self.variables = {}
+        self.effects = []
+        self.chat = []
+        self.unsupported = Counter()
+        self.missing = Counter()
+        self.executions = 0
+        self.actions_run = 0
+        self.random = Random(seed)
+        self.strict = strict
+        self.max_depth = max_depth
+        self.depth = 0
+        self.current_player = 0
+        self.initiator = 0
+        self.killer = -1
+        self.talker = -1
+        self.message = ""
+        self.players = {}
+        self.chat_listener = None
+        self._queue = []
+        self._sequence = count()
+
+        self.triggers = {}
+        for trigger in map_instance.objects[Trigger]:
+            if trigger.uid not in self.triggers:
+                self.triggers[trigger.uid] = _TriggerState(trigger.uid, self.compile(trigger.actions),
+                                                           trigger.enabled, int(trigger.maxcalls))
+        self.regions = {region.uid: referenced_uid(region.use_target) for region in map_instance.objects[Region]}
+        self.characters = {character.uid: referenced_uid(character.ondeath)
+                           for obj_type in (Player, Enemy) for character in map_instance.objects[obj_type]}
+        self.timers = {}
+        for timer in map_instance.objects[Timer]:
+            if timer.uid not in self.timers:
+                self.timers[timer.uid] = _TimerState(timer.uid, referenced_uid(timer.target), max(1, int(timer.delay)),
+                                                     int(timer.maxcalls))
+                if timer.enabled:
+                    self.start_timer(timer.uid)
+
+    def compile(self, actions) -> tuple:
+        steps = []
+        for action in actions:
+            args = action.args
+            a = getattr(args[0], "uid", args[0]) if len(args) > 0 else None
+            b = getattr(args[1], "uid", args[1]) if len(args) > 1 else None
+            operation = OPERATIONS.get(action.opID)
+            if operation is None:
+                if self.strict:
+                    raise TriggerVMError(f"Unsupported trigger action opID {action.opID}.")
+                steps.append((self._unsupported, action.opID, None))
+                continue
+            handler, b_kind = operation
+            if handler in _RECORDING:
+                steps.append((handler, action.opID, (a, b)))
+            else:
+                steps.append((handler, a, to_value(b) if b_kind == VALUE else b))
+        return tuple(steps)
+
+    @staticmethod
+    def _unsupported(vm, op_id, b):
+        vm.unsupported[op_id] += 1
+
+    def execute(self, uid) -> bool:
+        # Returns whether the trigger ran
+        state = self.triggers.get(uid)
+        if state is None:
+            self.missing[uid] += 1
+            return False
+        if not state.enabled or state.calls_left == 0:
+            return False
+        if state.calls_left > 0:
+            state.calls_left -= 1
+        if self.depth >= self.max_depth:
+            raise TriggerVMError(f"Executes nested more than {self.max_depth} deep at trigger {uid}.")
+        self.depth += 1
+        self.executions += 1
+        try:
+            program = state.program
+            length = len(program)
+            i = 0
+            while i < length:
+                handler, a, b = program[i]
+                control = handler(self, a, b)
+                if control is None:
+                    i += 1
+                elif control == STOP:
+                    i += 1
+                    break
+                else:
+                    i += 2
+            self.actions_run += min(i, length)
+        finally:
+            self.depth -= 1
+        return True
+
+    def enter_region(self, uid, player: int = 0) -> bool:
+        self.initiator = player
+        target = self.regions.get(uid)
+        return target is not None and self.execute(target)
+
+    def kill(self, uid, killer: int = -1) -> bool:
+        self.killer = killer
+        target = self.characters.get(uid)
+        return target is not None and self.execute(target)
+
+    def say(self, player: int, message: str) -> bool:
+        self.talker = player
+        self.message = message
+        return self.chat_listener is not None and self.execute(self.chat_listener)
+
+    def start_timer(self, uid):
+        timer = self.timers.get(uid)
+        if timer is None:
+            self.missing[uid] += 1
+            return
+        if timer.running or timer.calls_left == 0:
+            return
+        timer.running = True
+        heappush(self._queue, (self.tick + timer.delay, next(self._sequence), timer, timer.generation))
+
+    def stop_timer(self, uid):
+        timer = self.timers.get(uid)
+        if timer is None:
+            self.missing[uid] += 1
+            return
+        if timer.running:
+            timer.running = False
+            timer.generation += 1
+
+    def run(self, ticks: int):
+        end = self.tick + ticks
+        queue = self._queue
+        while queue and queue[0][0] <= end:
+            due, _, timer, generation = heappop(queue)
+            if generation != timer.generation:
+                continue
+            self.tick = due
+            if timer.calls_left > 0:
+                timer.calls_left -= 1
+            if timer.target is not None:
+                self.execute(timer.target)
+            # The target may have stopped or restarted the timer itself
+            if generation == timer.generation:
+                if timer.calls_left == 0:
+                    timer.running = False
+                    timer.generation += 1
+                else:
+                    heappush(queue, (due + timer.delay, next(self._sequence), timer, generation))
+        self.tick = end
@@ -0,0 +1,284 @@
+"""
+cache Module
+
+This module keeps downloaded maps on disk so that popular maps are not fetched again and again. Entries are keyed
+by map id and qpack version and point to content-addressed blobs (the SHA-256 of the payload) holding the raw
+qpack payload and its parsed form, both zlib-compressed. Maps sharing a payload share a blob, and a payload
+already known is never parsed twice.
+
+The cache is one SQLite database in WAL mode: every process opens its own connection and writes go through
+immediate transactions, so concurrent readers and writers do not corrupt it. A blob is deleted as soon as no entry
+points to it anymore. When the blobs outgrow `max_bytes`, the least recently read entries are dropped first. Reads
+take no write lock: the read time of an entry is only written back once it is ACCESS_RESOLUTION seconds old, so the
+LRU order has that resolution. Entries older than `ttl` seconds are stale: they are still returned, flagged as such,
+so that callers refetch them and fall back to them when the server is unreachable.
+
+Classes:
+	MapCache:
+		A persistent cache of downloaded maps with LRU eviction.
+
+	CachedMap:
+		One map read from the cache.
+
+Usage Example:
+	from Utils.cache import MapCache
+	from Utils.mapTools import MapTools
+
+	tools = MapTools(cache=MapCache("maps.sqlite3", max_bytes=256 * 1024 * 1024, ttl=24 * 3600))
+	objects = tools.getMapByIdOnline("map_id")  # Network
+	objects = tools.getMapByIdOnline("map_id")  # Disk
+"""
+from hashlib import sha256
+from json import dumps, loads
+from sqlite3 import connect
+from threading import Lock
+from time import time
+from zlib import compress, decompress
+
+from Utils.fetch import QPACK_VERSION
+
+# Bumped whenever the stored forms change, older databases are emptied
+SCHEMA_VERSION = 1
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+DEFAULT_TTL = 24 * 3600
+# Seconds a read time is kept before get() writes a newer one
+ACCESS_RESOLUTION = 60
+
+_SCHEMA = (
+	"CREATE TABLE IF NOT EXISTS blobs (hash TEXT PRIMARY KEY, payload BLOB NOT NULL, parsed BLOB, size INTEGER NOT NULL)",
+	"CREATE TABLE IF NOT EXISTS entries (mapid TEXT NOT NULL, qpack TEXT NOT NULL, hash TEXT NOT NULL, "
+	"fetched_at REAL NOT NULL, accessed_at REAL NOT NULL, PRIMARY KEY (mapid, qpack))",
+	"CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed_at)",
+	"CREATE INDEX IF NOT EXISTS entries_hash ON entries (hash)",
+)
+
+
+def payload_hash(payload: str) -> str:
+	return sha256(payload.encode()).hexdigest()
+
+
+class CachedMap:
+	"""
+	One map read from the cache.
+
+	Attributes:
+		mapid: The map id.
+		hash (str): SHA-256 of the payload.
+		payload (str): The raw qpack payload.
+		fetched_at (float): When the payload was last downloaded or revalidated (time.time()).
+		fresh (bool): False once the entry is older than the cache TTL.
+
+	Properties:
+		objects (list): The parsed form of the payload, None when none was stored.
+	"""
+
+	__slots__ = ("mapid", "hash", "payload", "fetched_at", "fresh", "_parsed")
+
+	def __init__(self, mapid, hash: str, payload: str, parsed, fetched_at: float, fresh: bool):
+		self.mapid = mapid
+		self.hash = hash
+		self.payload = payload
+		self.fetched_at = fetched_at
+		self.fresh = fresh
+		self._parsed = parsed
+
+	@property
+	def objects(self):
+		# Decoded on first use, the raw payload alone is often enough
+		if isinstance(self._parsed, bytes):
+			self._parsed = loads(decompress(self._parsed))
+		return self._parsed
+
+
+class MapCache:
+	"""
+	A persistent cache of downloaded maps with LRU eviction.
+
+	Attributes:
+		path (str): The SQLite database file.
+		max_bytes (int): Cap on the compressed size of the stored blobs.
+		ttl (float): Seconds after which an entry is stale, None to never revalidate.
+		qpack_version (str): The qpack version entries are stored and looked up under.
+
+	Methods:
+		get(mapid): The cached map, fresh or stale, or None.
+		store(mapid, payload, parse): Stores a downloaded payload and returns its CachedMap.
+		remove(mapid): Forgets a map.
+		evict(): Drops least recently read entries until the blobs fit in max_bytes.
+		clear(): Empties the cache.
+		close(): Closes the database connection.
+	"""
+
+	def __init__(self, path: str, max_bytes: int = DEFAULT_MAX_BYTES, ttl: float = DEFAULT_TTL,
+				 qpack_version: str = QPACK_VERSION):
+		if max_bytes <= 0:
+			raise ValueError("Cache size cap must be positive.")
+		self.path = path
+		self.max_bytes = max_bytes
+		self.ttl = ttl
+		self.qpack_version = qpack_version
+		self._lock = Lock()
+		# Transactions are opened explicitly, see _write
+		self._connection = connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+		self._connection.execute("PRAGMA journal_mode=WAL")
+		with self._write() as cursor:
+			if cursor.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+				cursor.execute("DROP TABLE IF EXISTS entries")
+				cursor.execute("DROP TABLE IF EXISTS blobs")
+				cursor.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+			for statement in _SCHEMA:
+				cursor.execute(statement)
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc_info):
+		self.close()
+
+	def __len__(self):
+		with self._lock:
+			return self._connection.execute("SELECT COUNT(*) FROM entries WHERE qpack = ?",
+											(self.qpack_version,)).fetchone()[0]
+
+	def __contains__(self, mapid):
+		with self._lock:
+			return self._connection.execute("SELECT 1 FROM entries WHERE mapid = ? AND qpack = ?",
+											(str(mapid), self.qpack_version)).fetchone() is not None
+
+	def _write(self):
+		return _Transaction(self._connection, self._lock)
+
+	@property
+	def total_bytes(self) -> int:
+		with self._lock:
+			return self._connection.execute("SELECT COALESCE(SUM(size), 0) FROM blobs").fetchone()[0]
+
+	def is_fresh(self, fetched_at: float, now: float = None) -> bool:
+		return self.ttl is None or (now or time()) - fetched_at < self.ttl
+
+	def get(self, mapid):
+		key = (str(mapid), self.qpack_version)
+		now = time()
+		# A single statement reads a consistent snapshot without a transaction
+		with self._lock:
+			row = self._connection.execute(
+				"SELECT entries.hash, payload, parsed, fetched_at, accessed_at FROM entries "
+				"JOIN blobs ON blobs.hash = entries.hash WHERE mapid = ? AND qpack = ?", key).fetchone()
+		if row is None:
+			return None
+		content_hash, payload, parsed, fetched_at, accessed_at = row
+		if now - accessed_at >= ACCESS_RESOLUTION:
+			# Does nothing if the entry was removed or read by another process since
+			with self._write() as cursor:
+				cursor.execute("UPDATE entries SET accessed_at = ? WHERE mapid = ? AND qpack = ? AND accessed_at < ?",
+							   (now, *key, now))
+		return CachedMap(mapid, content_hash, decompress(payload).decode(), parsed, fetched_at,
+						 self.is_fresh(fetched_at, now))
+
+	def store(self, mapid, payload: str, parse=None):
+		# parse(payload) is only called when this content has no parsed form yet. Parsing runs outside the write
+		# transaction so other processes are not blocked, what gets written is decided inside it.
+		content_hash = payload_hash(payload)
+		key = (str(mapid), self.qpack_version)
+		with self._lock:
+			known = self._connection.execute("SELECT parsed FROM blobs WHERE hash = ?", (content_hash,)).fetchone()
+		parsed = known[0] if known is not None else None
+		new_parsed = None
+		if parsed is None and parse is not None:
+			new_parsed = parse(payload)
+			parsed = compress(dumps(new_parsed, separators=(',', ':')).encode(), 1)
+
+		now = time()
+		with self._write() as cursor:
+			# The blob may have been added, given a parsed form or evicted by another process since
+			row = cursor.execute("SELECT parsed FROM blobs WHERE hash = ?", (content_hash,)).fetchone()
+			if row is None:
+				packed = compress(payload.encode(), 1)
+				cursor.execute("INSERT INTO blobs (hash, payload, parsed, size) VALUES (?, ?, ?, ?)",
+							   (content_hash, packed, parsed, len(packed) + len(parsed or b'')))
+			elif row[0] is None and parsed is not None:
+				cursor.execute("UPDATE blobs SET parsed = ?, size = size + ? WHERE hash = ?",
+							   (parsed, len(parsed), content_hash))
+			else:
+				parsed = row[0]
+				new_parsed = None
+			old = cursor.execute("SELECT hash FROM entries WHERE mapid = ? AND qpack = ?", key).fetchone()
+			cursor.execute("INSERT OR REPLACE INTO entries (mapid, qpack, hash, fetched_at, accessed_at) "
+						   "VALUES (?, ?, ?, ?, ?)", (*key, content_hash, now, now))
+			if old is not None and old[0] != content_hash:
+				self._drop_orphan(cursor, old[0])
+			self._evict(cursor)
+		return CachedMap(mapid, content_hash, payload, new_parsed if new_parsed is not None else parsed, now, True)
+
+	def remove(self, mapid):
+		with self._write() as cursor:
+			row = cursor.execute("SELECT hash FROM entries WHERE mapid = ? AND qpack = ?",
+								 (str(mapid), self.qpack_version)).fetchone()
+			if row is not None:
+				cursor.execute("DELETE FROM entries WHERE mapid = ? AND qpack = ?", (str(mapid), self.qpack_version))
+				self._drop_orphan(cursor, row[0])
+
+	def evict(self):
+		with self._write() as cursor:
+			self._evict(cursor)
+
+	def clear(self):
+		with self._write() as cursor:
+			cursor.execute("DELETE FROM entries")
+			cursor.execute("DELETE FROM blobs")
+
+	def close(self):
+		with self._lock:
+			self._connection.close()
+
+	def _drop_orphan(self, cursor, content_hash: str) -> int:
+		# Deletes a blob no entry points to anymore and returns the bytes freed
+		if cursor.execute("SELECT 1 FROM entries WHERE hash = ? LIMIT 1", (content_hash,)).fetchone() is not None:
+			return 0
+		row = cursor.execute("SELECT size FROM blobs WHERE hash = ?", (content_hash,)).fetchone()
+		if row is None:
+			return 0
+		cursor.execute("DELETE FROM blobs WHERE hash = ?", (content_hash,))
+		return row[0]
+
+	def _evict(self, cursor):
+		total = cursor.execute("SELECT COALESCE(SUM(size), 0) FROM blobs").fetchone()[0]
+		if total <= self.max_bytes:
+			return
+		# Blobs no entry points to go first, then the least recently read entries
+		cursor.execute("DELETE FROM blobs WHERE NOT EXISTS (SELECT 1 FROM entries WHERE entries.hash = blobs.hash)")
+		total = cursor.execute("SELECT COALESCE(SUM(size), 0) FROM blobs").fetchone()[0]
+		if total <= self.max_bytes:
+			return
+		# Entries of every qpack version compete for the same space
+		victims = cursor.execute("SELECT mapid, qpack, hash FROM entries ORDER BY accessed_at").fetchall()
+		for mapid, qpack, content_hash in victims:
+			cursor.execute("DELETE FROM entries WHERE mapid = ? AND qpack = ?", (mapid, qpack))
+			total -= self._drop_orphan(cursor, content_hash)
+			if total <= self.max_bytes:
+				break
+
+
+class _Transaction:
+	# BEGIN IMMEDIATE takes the database write lock up front, other processes wait for it (up to the timeout)
+
+	__slots__ = ("connection", "lock")
+
+	def __init__(self, connection, lock: Lock):
+		self.connection = connection
+		self.lock = lock
+
+	def __enter__(self):
+		self.lock.acquire()
+		try:
+			self.connection.execute("BEGIN IMMEDIATE")
+		except BaseException:
+			self.lock.release()
+			raise
+		return self.connection.cursor()
+
+	def __exit__(self, exc_type, exc, traceback):
+		try:
+			self.connection.execute("COMMIT" if exc_type is None else "ROLLBACK")
+		finally:
+			self.lock.release()
@@ -0,0 +1,209 @@
+"""
+fetch Module
+
+This module downloads many maps from the PB2 server at once. Both backends keep at most `concurrency` requests
+in flight over a pool of reused connections, retry failed requests with exponential backoff and yield results
+in completion order, as soon as each map arrives.
+
+Backends:
+	fetch_maps_threaded: A thread pool sharing one requests.Session whose connection pool holds `concurrency`
+		connections.
+	fetch_maps_async: Tasks on the running event loop sharing one aiohttp.ClientSession limited to `concurrency`
+		connections. aiohttp is only imported when this backend is used.
+
+Classes:
+	FetchResult:
+		The outcome of downloading one map.
+
+Functions:
+	cmap_post_data(mapid) -> dict:
+		The form posted to server.php to request a map (rq=cmap).
+
+	retry_delay(attempt, backoff) -> float:
+		Seconds to wait before retrying after the given failed attempt.
+
+Usage Example:
+	from Utils.fetch import fetch_maps_threaded
+
+	for result in fetch_maps_threaded(map_ids, concurrency=16):
+		if result.error is None:
+			print(result.mapid, len(result.payload))
+"""
+from asyncio import FIRST_COMPLETED as ASYNC_FIRST_COMPLETED, create_task, sleep as async_sleep, wait as async_wait
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from random import random
+from time import sleep
+
+from requests import RequestException, Session as RequestSession
+from requests.adapters import HTTPAdapter
+
+SERVER_URL = 'http://www.plazmaburst2.com/pb2/server.php'
+QPACK_VERSION = '1.0'
+REQUEST_HEADERS = {
+	'Accept' : 'text/xml, application/xml, application/xhtml+xml, text/html;q=0.9, text/plain;q=0.8, text/css, image/png, image/jpeg, image/gif;q=0.8, application/x-shockwave-flash, video/mp4;q=0.9, flv-application/octet-stream;q=0.8, video/x-flv;q=0.7, audio/mp4, application/futuresplash, */*;q=0.5',
+	'User-Agent' : 'Shockwave Flash',
+	'x-flash-version' : '11,7,700,224',
+	'Host' : 'www.plazmaburst2.com'
+}
+# Responses worth asking again for, other error statuses fail at once
+RETRY_STATUSES = frozenset((429, 500, 502, 503, 504))
+DEFAULT_CONCURRENCY = 8
+DEFAULT_RETRIES = 3
+DEFAULT_BACKOFF = 0.5
+DEFAULT_TIMEOUT = 30
+
+
+class FetchResult:
+	"""
+	The outcome of downloading one map.
+
+	Attributes:
+		mapid: The requested map id.
+		payload (str): The qpack response of the server, None when the download failed.
+		error (str): Why the download failed, None on success.
+		attempts (int): Number of requests sent for the map.
+	"""
+
+	__slots__ = ("mapid", "payload", "error", "attempts")
+
+	def __init__(self, mapid, payload=None, error=None, attempts=0):
+		self.mapid = mapid
+		self.payload = payload
+		self.error = error
+		self.attempts = attempts
+
+	def __repr__(self):
+		state = "failed: " + self.error if self.error is not None else f"{len(self.payload)} characters"
+		return f"FetchResult({self.mapid!r}, {state}, attempts={self.attempts})"
+
+
+class _RetryableError(Exception):
+	pass
+
+
+def cmap_post_data(mapid) -> dict:
+	return {
+		'p' : 'undefined',
+		'cmap' : mapid,
+		'l' : 'undefined',
+		'qpack' : QPACK_VERSION,
+		'rq' : 'cmap'
+	}
+
+
+def retry_delay(attempt: int, backoff: float) -> float:
+	# Exponential backoff with jitter, so that retries of a failed burst do not arrive together
+	return backoff * (2 ** (attempt - 1)) * (0.5 + random())
+
+
+def make_session(concurrency: int = DEFAULT_CONCURRENCY) -> RequestSession:
+	session = RequestSession()
+	session.headers.update(REQUEST_HEADERS)
+	adapter = HTTPAdapter(pool_connections=1, pool_maxsize=concurrency)
+	session.mount('http://', adapter)
+	session.mount('https://', adapter)
+	return session
+
+
+def check_status(status: int):
+	if status in RETRY_STATUSES:
+		raise _RetryableError(f"HTTP {status}")
+	if status >= 400:
+		raise ValueError(f"HTTP {status}")
+
+
+def fetch_map_blocking(session: RequestSession, mapid, url: str = SERVER_URL, retries: int = DEFAULT_RETRIES,
+					   backoff: float = DEFAULT_BACKOFF, timeout: float = DEFAULT_TIMEOUT) -> FetchResult:
+	result = FetchResult(mapid)
+	while True:
+		result.attempts += 1
+		try:
+			resp = session.post(url=url, data=cmap_post_data(mapid), timeout=timeout)
+			check_status(resp.status_code)
+			result.payload = resp.text
+			return result
+		except (_RetryableError, RequestException) as e:
+			if result.attempts > retries:
+				result.error = str(e) or type(e).__name__
+				return result
+		except ValueError as e:
+			result.error = str(e)
+			return result
+		sleep(retry_delay(result.attempts, backoff))
+
+
+def fetch_maps_threaded(ids, concurrency: int = DEFAULT_CONCURRENCY, url: str = SERVER_URL,
+						retries: int = DEFAULT_RETRIES, backoff: float = DEFAULT_BACKOFF,
+						timeout: float = DEFAULT_TIMEOUT, session: RequestSession = None):
+	if concurrency < 1:
+		raise ValueError("Concurrency must be at least 1.")
+	session = session or make_session(concurrency)
+	ids = iter(ids)
+	pending = set()
+	with ThreadPoolExecutor(max_workers=concurrency) as executor:
+		try:
+			# Only `concurrency` ids are taken from the iterable at a time
+			for mapid in ids:
+				pending.add(executor.submit(fetch_map_blocking, session, mapid, url, retries, backoff, timeout))
+				if len(pending) < concurrency:
+					continue
+				done, pending = wait(pending, return_when=FIRST_COMPLETED)
+				for future in done:
+					yield future.result()
+			while pending:
+				done, pending = wait(pending, return_when=FIRST_COMPLETED)
+				for future in done:
+					yield future.result()
+		finally:
+			for future in pending:
+				future.cancel()
+
+
+async def fetch_map_async(session, mapid, url: str = SERVER_URL, retries: int = DEFAULT_RETRIES,
+						  backoff: float = DEFAULT_BACKOFF) -> FetchResult:
+	from aiohttp import ClientError
+
+	result = FetchResult(mapid)
+	while True:
+		result.attempts += 1
+		try:
+			async with session.post(url, data=cmap_post_data(mapid)) as resp:
+				check_status(resp.status)
+				result.payload = await resp.text()
+				return result
+		except (_RetryableError, ClientError, TimeoutError) as e:
+			if result.attempts > retries:
+				result.error = str(e) or type(e).__name__
+				return result
+		except ValueError as e:
+			result.error = str(e)
+			return result
+		await async_sleep(retry_delay(result.attempts, backoff))
+
+
+async def fetch_maps_async(ids, concurrency: int = DEFAULT_CONCURRENCY, url: str = SERVER_URL,
+						   retries: int = DEFAULT_RETRIES, backoff: float = DEFAULT_BACKOFF,
+						   timeout: float = DEFAULT_TIMEOUT):
+	from aiohttp import ClientSession, ClientTimeout, TCPConnector
+
+	if concurrency < 1:
+		raise ValueError("Concurrency must be at least 1.")
+	connector = TCPConnector(limit=concurrency)
+	async with ClientSession(connector=connector, headers=REQUEST_HEADERS,
+							 timeout=ClientTimeout(total=timeout)) as session:
+		pending = set()
+		try:
+			for mapid in ids:
+				pending.add(create_task(fetch_map_async(session, mapid, url, retries, backoff)))
+				if len(pending) < concurrency:
+					continue
+				done, pending = await async_wait(pending, return_when=ASYNC_FIRST_COMPLETED)
+				for task in done:
+					yield task.result()
+			while pending:
+				done, pending = await async_wait(pending, return_when=ASYNC_FIRST_COMPLETED)
+				for task in done:
+					yield task.result()
+		finally:
+			for task in pending:
+				task.cancel()
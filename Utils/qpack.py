@@ -0,0 +1,297 @@
+"""
+qpack Module
+
+This module implements the qpack wire format used by the PB2 server for map data.
+
+un_qpack historically ran every replacement of the pattern table over the whole payload, from the last pattern
+to the first. QpackDecoder gives the same result in a few linear passes: the '<q.' padding is stripped, every
+'^X' code is expanded by a single left-to-right scan, and '[^]' is turned back into '^'.
+
+A code expanded by pattern i can only be further expanded by patterns applied after it (lower indices), and
+the text a pattern inserts can form new codes with its neighbours (for example '" upg="0^' ends with a caret
+that pairs with the next character). Every character therefore carries the step it was inserted at, and a caret
+pairs with the next character into code j only when j is lower than the steps both characters appeared at.
+The expansion of every code in isolation is computed once and reused whenever no such neighbour pairing occurs.
+
+QpackEncoder goes the other way. Each code stands for the fully expanded text of its pattern, and a code whose
+expansion ends with a caret (such as '^L' for '" upg="0^') stands, together with the code character that follows
+it, for both expansions. The encoder cuts the text into literal characters and such codes, so that no code
+interacts with its neighbours and decoding gives the text back exactly. Literal carets are escaped as '[^]' and
+a literal '<q.' is written '<<q.q.'. The greedy mode takes the longest code at every position with one regular
+expression, the optimal mode finds the cut giving the shortest output by dynamic programming.
+
+Classes:
+	QpackDecoder:
+		A decoder compiled once from a qpack pattern table.
+
+	QpackEncoder:
+		An encoder compiled once from a qpack pattern table.
+
+Functions:
+	un_qpack_sequential(pattern, pattern_length, data) -> str:
+		The reference decoder applying the replacements one after another.
+
+	compression_ratio(data, packed) -> float:
+		Size of the text divided by the size of its packed form.
+"""
+
+from re import compile as compile_regex, escape
+
+# Steps of the special patterns of the table
+ESCAPE_STEP = 0
+ORIGINAL_STEP = 82
+
+
+def un_qpack_sequential(pattern: dict, pattern_length: int, data: str) -> str:
+	i = pattern_length - 1
+	while i >= 0:
+		data = data.replace(pattern[i][1], pattern[i][0])
+		i -= 1
+	return data
+
+
+def tokenize(text: str) -> list:
+	# Splits text into literal runs and carets, a caret is stored as None
+	tokens = []
+	pieces = text.split('^')
+	if pieces[0]:
+		tokens.append(pieces[0])
+	for piece in pieces[1:]:
+		tokens.append(None)
+		if piece:
+			tokens.append(piece)
+	return tokens
+
+
+class _Output:
+	# Output being built, carets are kept as separate items so that they can still be paired
+
+	__slots__ = ("parts", "carets", "last_caret")
+
+	def __init__(self):
+		self.parts = []
+		self.carets = []
+		# Step of the trailing caret of the output, None when the output does not end with one
+		self.last_caret = None
+
+	def append_text(self, text: str):
+		self.parts.append(text)
+		self.last_caret = None
+
+	def append_caret(self, step: int):
+		self.parts.append('^')
+		self.carets.append((len(self.parts) - 1, step))
+		self.last_caret = step
+
+	def pop_caret(self):
+		self.parts.pop()
+		self.carets.pop()
+		carets = self.carets
+		if carets and carets[-1][0] == len(self.parts) - 1:
+			self.last_caret = carets[-1][1]
+		else:
+			self.last_caret = None
+
+
+class QpackDecoder:
+	"""
+	A decoder compiled once from a qpack pattern table.
+
+	Attributes:
+		code_steps (dict): Character following the caret -> step (pattern index) of the code.
+		expansions (dict): Step -> tokenized text inserted by the code.
+		expanded (dict): Step -> (fully expanded text, step of its trailing caret or None).
+
+	Methods:
+		decode(data): Decodes a qpack payload.
+	"""
+
+	def __init__(self, pattern: dict, pattern_length: int):
+		if pattern_length != ORIGINAL_STEP + 1 or pattern[ESCAPE_STEP][1] != '[^]' \
+				or pattern[ORIGINAL_STEP] != {0: '', 1: '<q.'}:
+			raise ValueError("Unsupported qpack pattern table.")
+		self.code_steps = {}
+		self.expansions = {}
+		for step in range(ESCAPE_STEP + 1, ORIGINAL_STEP):
+			code = pattern[step][1]
+			if len(code) != 2 or code[0] != '^' or code[1] == '^' or code[1] in self.code_steps:
+				raise ValueError(f"Unsupported qpack code '{code}'.")
+			self.code_steps[code[1]] = step
+			self.expansions[step] = tokenize(pattern[step][0])
+		self.expanded = {}
+		for step in range(ESCAPE_STEP + 1, ORIGINAL_STEP):
+			output = _Output()
+			self._feed(output, self.expansions[step], step)
+			if output.last_caret is None:
+				self.expanded[step] = (''.join(output.parts), None)
+			else:
+				self.expanded[step] = (''.join(output.parts[:-1]), output.last_caret)
+
+	def _feed(self, output: _Output, tokens: list, step: int):
+		for token in tokens:
+			if token is None:
+				output.append_caret(step)
+			else:
+				self._feed_text(output, token, step)
+
+	def _feed_text(self, output: _Output, text: str, step: int):
+		while output.last_caret is not None:
+			code_step = self.code_steps.get(text[0])
+			if code_step is None or code_step >= output.last_caret or code_step >= step:
+				break
+			output.pop_caret()
+			self._expand(output, code_step)
+			text = text[1:]
+			if not text:
+				return
+		output.append_text(text)
+
+	def _expand(self, output: _Output, code_step: int):
+		tokens = self.expansions[code_step]
+		head = tokens[0]
+		if output.last_caret is not None and head is not None:
+			head_step = self.code_steps.get(head[0])
+			if head_step is not None and head_step < output.last_caret and head_step < code_step:
+				# The inserted text pairs with the caret before it, expand it token by token
+				self._feed(output, tokens, code_step)
+				return
+		text, tail_caret = self.expanded[code_step]
+		if text:
+			output.append_text(text)
+		if tail_caret is not None:
+			output.append_caret(tail_caret)
+
+	def decode(self, data: str) -> str:
+		data = data.replace('<q.', '')
+		output = _Output()
+		parts = output.parts
+		code_steps = self.code_steps
+		expanded = self.expanded
+		pieces = data.split('^')
+		if pieces[0]:
+			output.append_text(pieces[0])
+		for piece in pieces[1:]:
+			if output.last_caret is None and piece:
+				# Common case: a code with nothing to pair with on its left and no trailing caret
+				code_step = code_steps.get(piece[0])
+				if code_step is not None:
+					text, tail_caret = expanded[code_step]
+					if tail_caret is None:
+						parts.append(text)
+						if len(piece) > 1:
+							parts.append(piece[1:])
+						continue
+			output.append_caret(ORIGINAL_STEP)
+			if piece:
+				self._feed_text(output, piece, ORIGINAL_STEP)
+		return ''.join(parts).replace('[^]', '^')
+
+
+def trie_pattern(texts) -> str:
+	# Regular expression matching the longest of the texts, with shared prefixes factored out
+	trie = {}
+	for text in texts:
+		node = trie
+		for char in text:
+			node = node.setdefault(char, {})
+		node[''] = {}
+	return _trie_node_pattern(trie)
+
+
+def _trie_node_pattern(node: dict) -> str:
+	prefix = []
+	# Chains without branches are written out without recursing
+	while len(node) == 1 and '' not in node:
+		char, node = next(iter(node.items()))
+		prefix.append(escape(char))
+	branches = [escape(char) + _trie_node_pattern(child) for char, child in node.items() if char]
+	if not branches:
+		return ''.join(prefix)
+	body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+	if '' in node:
+		# Greedy optional group, longer matches are tried first
+		body = '(?:' + body + ')?'
+	return ''.join(prefix) + body
+
+
+def compression_ratio(data: str, packed: str) -> float:
+	return len(data) / len(packed) if packed else 1.0
+
+
+class QpackEncoder:
+	"""
+	An encoder compiled once from a qpack pattern table.
+
+	Attributes:
+		codes (dict): Fully expanded text -> shortest code producing it.
+
+	Methods:
+		encode(data, optimal): Packs a text, greedily or with the shortest possible output.
+	"""
+
+	def __init__(self, pattern: dict, pattern_length: int):
+		decoder = QpackDecoder(pattern, pattern_length)
+		self.codes = {}
+		for code_char, step in decoder.code_steps.items():
+			text, tail_caret = decoder.expanded[step]
+			if tail_caret is None:
+				self._add_code(text, '^' + code_char)
+				continue
+			# The trailing caret pairs with the code character written after the code
+			for next_char, next_step in decoder.code_steps.items():
+				next_text, next_tail = decoder.expanded[next_step]
+				if next_step < tail_caret and next_tail is None:
+					self._add_code(text + next_text, '^' + code_char + next_char)
+		self._greedy_regex = compile_regex(trie_pattern(self.codes) + r'|\^')
+
+	def _add_code(self, text: str, code: str):
+		if text and '^' not in text and len(text) > len(code):
+			known = self.codes.get(text)
+			if known is None or len(code) < len(known):
+				self.codes[text] = code
+
+	def _encode_greedy(self, data: str) -> str:
+		codes = self.codes
+		return self._greedy_regex.sub(lambda match: codes.get(match.group(), '[^]'), data)
+
+	def _encode_optimal(self, data: str) -> str:
+		size = len(data)
+		matches = {}
+		for text, code in self.codes.items():
+			saving = len(text) - len(code)
+			position = data.find(text)
+			while position != -1:
+				matches.setdefault(position, []).append((position + len(text), saving, code))
+				position = data.find(text, position + 1)
+
+		# saved[i] is the most characters codes can save on data[i:], choices[i] the code starting there
+		saved = [0] * (size + 1)
+		choices = {}
+		for position in range(size - 1, -1, -1):
+			best = saved[position + 1]
+			candidates = matches.get(position)
+			if candidates is not None:
+				for end, saving, code in candidates:
+					if saved[end] + saving > best:
+						best = saved[end] + saving
+						choices[position] = (end, code)
+			saved[position] = best
+
+		parts = []
+		literal_start = position = 0
+		while position < size:
+			choice = choices.get(position)
+			if choice is None:
+				position += 1
+				continue
+			if literal_start < position:
+				parts.append(data[literal_start:position].replace('^', '[^]'))
+			position, code = choice
+			parts.append(code)
+			literal_start = position
+		parts.append(data[literal_start:].replace('^', '[^]'))
+		return ''.join(parts)
+
+	def encode(self, data: str, optimal: bool = False) -> str:
+		packed = self._encode_optimal(data) if optimal else self._encode_greedy(data)
+		return packed.replace('<q.', '<<q.q.')